@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_file, render_template
+from flask import Flask, Response, request, jsonify, send_file, render_template, make_response
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
 import os
@@ -13,30 +13,298 @@ from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 import io
+import shutil
+import hashlib
+from scheduler import JobScheduler, QueueFullError, SharedJobQueue
+from job_store import JobStore, TERMINAL_STATUSES
+from job_watch import JobWatch
+from chunked_upload import ChunkedUploadManager, UploadError
+from progress import ProgressPublisher
+from preview import PreviewPublisher
+from cancellation import CANCELLED, PREEMPTED, CancellationRegistry, JobCancelled
+from content_hash import HashingWriter, save_stream
+from ply_writer import point_cloud_dtype, read_ply, write_ply
+from ingest import ArchiveError, IngestLimits, dataset_format, iter_frames
+from features import FeatureExtractor, FeatureSet
+from matching import PairMatcher, select_pairs
+from postprocess import clean_point_cloud
+from compression import choose_variant, create_sidecars, existing_sidecars
+from storage import StorageManager
+from metrics import CONTENT_TYPE, THROUGHPUT_BUCKETS, Registry
+from tracing import Trace
+from tiles import TileCache, build_tiles, tile_files
+from splat_export import EXPORT_FORMATS, export_path, export_splats
+import numpy as np
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'outputs'
 app.config['GDRIVE_FOLDER'] = 'gdrive_downloads'
-app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max
+app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max per request
+app.config['MAX_UPLOAD_SIZE'] = 20 * 1024 * 1024 * 1024  # 20GB max for chunked uploads
+app.config['UPLOAD_CHUNK_SIZE'] = 8 * 1024 * 1024  # Suggested chunk size for clients
+app.config['JOB_DB_PATH'] = 'jobs.db'
+# Dataset ingestion limits (archives are streamed, never extracted to disk)
+app.config['MAX_EXTRACTED_SIZE'] = 8 * 1024 * 1024 * 1024  # Total decompressed image bytes
+app.config['MAX_IMAGE_SIZE'] = 256 * 1024 * 1024  # Per image
+app.config['MAX_COMPRESSION_RATIO'] = 100
+app.config['MAX_ARCHIVE_MEMBERS'] = 50000
+app.config['DECODE_WORKERS'] = 4
+# Feature extraction (cached per image content hash + detector parameters)
+app.config['FEATURE_CACHE_FOLDER'] = 'feature_cache'
+app.config['FEATURE_DETECTOR'] = 'orb'  # 'orb' or 'sift'
+app.config['FEATURE_MAX_KEYPOINTS'] = 4000
+app.config['FEATURE_WORKERS'] = None  # Defaults to the number of CPUs
+# Long side images are decoded at for feature detection, None for full size
+app.config['PREPROCESS_MAX_DIMENSION'] = 2000
+# Pair selection: retrieval top-k plus neighbours in capture order
+app.config['MATCH_TOP_K'] = 10
+app.config['MATCH_SEQUENTIAL_WINDOW'] = 2
+app.config['MATCH_VOCABULARY_SIZE'] = 256
+# Point cloud clean-up defaults; jobs can override them per upload
+app.config['DEFAULT_VOXEL_SIZE'] = None  # Voxel edge length, None to skip downsampling
+app.config['DEFAULT_OUTLIER_NEIGHBORS'] = 0  # KD-tree neighbours, 0 to skip outlier removal
+app.config['DEFAULT_OUTLIER_STD_RATIO'] = 2.0
+app.config['PLY_BINARY'] = True  # binary_little_endian output; False for ASCII
+app.config['PRECOMPRESS_OUTPUTS'] = True  # Write .zst/.gz download sidecars on completion
+app.config['BUILD_LOD_TILES'] = True  # Octree tiles for progressive viewing
+app.config['LOD_POINTS_PER_TILE'] = 20000
+app.config['LOD_MAX_DEPTH'] = 8
+app.config['SPLAT_EXPORT_FORMATS'] = ['splat', 'ksplat']  # Alternate downloads, [] to skip
+app.config['SPLAT_SH_DEGREE'] = 0  # Spherical-harmonics degree kept in exports (0-2)
+app.config['KSPLAT_COMPRESSION_LEVEL'] = 1  # 0 = float32, 1 = half floats, 2 = 8-bit SH
+app.config['JOB_FLUSH_INTERVAL'] = 1.0  # Seconds between batched progress writes
+app.config['PROGRESS_EMIT_RATE'] = 2.0  # Max job_update events per second per job
+app.config['PREVIEW_EMIT_RATE'] = 1.0  # Max preview_chunk events per second per job
+app.config['PREVIEW_MAX_POINTS'] = 20000  # Points per preview chunk
+app.config['PREVIEW_KEPT_POINTS'] = 200000  # Preview points kept for late viewers, per job
+app.config['JOBS_PAGE_SIZE'] = 50
+app.config['STATUS_BATCH_MAX_JOBS'] = 500  # Jobs one /api/status/batch request may ask for
+app.config['LONG_POLL_MAX_WAIT'] = 60  # Longest ?wait= a status request may block for
+app.config['EVENT_STREAM_MAX_JOBS'] = 100  # Jobs one /api/events stream may watch
+app.config['EVENT_STREAM_KEEPALIVE'] = 15  # Seconds between comments on an idle stream
+app.config['JOB_CHANGE_POLL_INTERVAL'] = 0.5  # Seconds between checks for workers' job writes
+# Disk budgets in bytes (None for no limit). Least recently downloaded
+# outputs, and inputs of finished jobs, are deleted above them.
+app.config['OUTPUT_STORAGE_BUDGET'] = 50 * 1024 * 1024 * 1024
+app.config['UPLOAD_STORAGE_BUDGET'] = 20 * 1024 * 1024 * 1024
+app.config['GDRIVE_STORAGE_BUDGET'] = 20 * 1024 * 1024 * 1024
+app.config['DELETE_CONSUMED_INPUTS'] = True  # Delete a job's input once it completes
+app.config['STORAGE_CHECK_INTERVAL'] = 30  # Seconds between budget checks
+app.config['STORAGE_RESCAN_INTERVAL'] = 3600  # Seconds between recounts of the folders
+app.config['JOBS_MAX_PAGE_SIZE'] = 500
 
 # Google Drive config
 app.config['GDRIVE_CREDENTIALS_FILE'] = 'credentials.json'
 app.config['GDRIVE_WATCH_FOLDER_ID'] = None  # Will be set from config
 app.config['GDRIVE_POLL_INTERVAL'] = 30  # Check every 30 seconds
 
+# Processing queue config
+app.config['MAX_WORKERS'] = 2  # Reconstructions running at the same time
+app.config['MAX_QUEUE_SIZE'] = 20  # Jobs allowed to wait for a worker
+app.config['QUEUE_RETRY_AFTER'] = 30  # Seconds clients should wait when the queue is full
+
+# Scale-out: run several web processes behind a sticky load balancer and
+# reconstruction in worker.py processes, sharing the job database
+app.config['RUN_JOBS_IN_PROCESS'] = True  # False when worker.py processes run the jobs
+app.config['SOCKETIO_MESSAGE_QUEUE'] = None  # e.g. 'redis://localhost:6379/0' for multi-process
+app.config['WORKER_LEASE_SECONDS'] = 60  # A job is requeued if its worker is silent this long
+app.config['WORKER_POLL_INTERVAL'] = 1.0  # Seconds an idle worker waits between queue checks
+app.config['WORKER_METRICS_PORT'] = None  # Port for worker.py to serve /metrics on
+app.config['DEBUG'] = True
+
+def load_config(config_file='config.json'):
+    """Load optional overrides from config.json (see config.example.json)"""
+    if not os.path.exists(config_file):
+        return
+
+    try:
+        with open(config_file) as f:
+            config = json.load(f)
+    except Exception as e:
+        print(f"Failed to load config file {config_file}: {e}")
+        return
+
+    mapping = {
+        'secret_key': 'SECRET_KEY',
+        'gdrive_folder_id': 'GDRIVE_WATCH_FOLDER_ID',
+        'gdrive_poll_interval': 'GDRIVE_POLL_INTERVAL',
+        'max_workers': 'MAX_WORKERS',
+        'max_queue_size': 'MAX_QUEUE_SIZE',
+        'long_poll_max_wait': 'LONG_POLL_MAX_WAIT',
+        'run_jobs_in_process': 'RUN_JOBS_IN_PROCESS',
+        'message_queue': 'SOCKETIO_MESSAGE_QUEUE',
+        'worker_lease_seconds': 'WORKER_LEASE_SECONDS',
+        'worker_metrics_port': 'WORKER_METRICS_PORT',
+        'debug': 'DEBUG',
+        'job_db_path': 'JOB_DB_PATH',
+        'max_upload_size': 'MAX_UPLOAD_SIZE',
+        'output_storage_budget': 'OUTPUT_STORAGE_BUDGET',
+        'upload_storage_budget': 'UPLOAD_STORAGE_BUDGET',
+        'gdrive_storage_budget': 'GDRIVE_STORAGE_BUDGET',
+        'delete_consumed_inputs': 'DELETE_CONSUMED_INPUTS',
+        'feature_detector': 'FEATURE_DETECTOR',
+        'feature_workers': 'FEATURE_WORKERS',
+        'preprocess_max_dimension': 'PREPROCESS_MAX_DIMENSION',
+    }
+    for key, config_key in mapping.items():
+        if key in config:
+            app.config[config_key] = config[key]
+
+load_config()
+
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# With a message queue, emits from any web or worker process reach clients
+# connected to every other web process
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    message_queue=app.config['SOCKETIO_MESSAGE_QUEUE']
+)
 
 # Ensure folders exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 os.makedirs(app.config['GDRIVE_FOLDER'], exist_ok=True)
-
-# Store processing jobs
-processing_jobs = {}
-ALLOWED_EXTENSIONS = {'zip', 'rar', 'tar', 'gz', '7z', 'jpg', 'png', 'jpeg'}
+os.makedirs(app.config['FEATURE_CACHE_FOLDER'], exist_ok=True)
+
+# Store processing jobs; every change wakes status long-polls and event streams
+job_watch = JobWatch()
+job_store = JobStore(
+    app.config['JOB_DB_PATH'],
+    flush_interval=app.config['JOB_FLUSH_INTERVAL'],
+    on_change=job_watch.notify
+)
+# Forget finished jobs' versions after a while; workers write to the
+# database directly, so with workers also watch it for their changes
+job_watch.start(
+    job_store,
+    feed=not app.config['RUN_JOBS_IN_PROCESS'],
+    interval=app.config['JOB_CHANGE_POLL_INTERVAL'],
+    retention=app.config['LONG_POLL_MAX_WAIT']
+)
+if app.config['RUN_JOBS_IN_PROCESS']:
+    # Jobs of other processes are recovered through their leases instead
+    interrupted_jobs = job_store.fail_interrupted()
+    if interrupted_jobs:
+        print(f"⚠️ Marked {interrupted_jobs} interrupted job(s) as failed")
+# Formats ingest.py can read; .gz must also be a tar archive (see dataset_format)
+ALLOWED_EXTENSIONS = {'zip', 'tar', 'gz', 'jpg', 'png', 'jpeg'}
+
+# Progress events: coalesced per job and sent as deltas
+progress_publisher = ProgressPublisher(
+    lambda job_id, delta: socketio.emit('job_update', delta, room=job_id),
+    max_rate=app.config['PROGRESS_EMIT_RATE'],
+    terminal_statuses=TERMINAL_STATUSES
+)
+progress_publisher.start()
+
+# Growing point-cloud previews of running jobs, as binary chunks
+preview_publisher = PreviewPublisher(
+    lambda job_id, seq, data: socketio.emit(
+        'preview_chunk', {'job_id': job_id, 'seq': seq, 'data': data}, room=job_id
+    ),
+    max_rate=app.config['PREVIEW_EMIT_RATE'],
+    max_points=app.config['PREVIEW_MAX_POINTS'],
+    max_kept_points=app.config['PREVIEW_KEPT_POINTS']
+)
+preview_publisher.start()
+
+# Resumable chunked uploads
+chunked_uploads = ChunkedUploadManager(
+    app.config['UPLOAD_FOLDER'],
+    max_upload_size=app.config['MAX_UPLOAD_SIZE']
+)
+
+def update_queue_positions(queued_job_ids):
+    """Publish queue position and depth to every waiting job"""
+    depth = len(queued_job_ids)
+    for position, queued_job_id in enumerate(queued_job_ids, start=1):
+        job = job_store.get(queued_job_id)
+        if not job or job['status'] != 'queued':
+            continue
+        update_job(queued_job_id, queue_position=position, queue_depth=depth)
+
+tile_cache = TileCache()
+
+# Cancellation tokens of the jobs running in this process
+cancellations = CancellationRegistry()
+
+# Disk usage of the data folders, kept within their budgets
+storage = StorageManager(
+    {
+        'uploads': app.config['UPLOAD_FOLDER'],
+        'outputs': app.config['OUTPUT_FOLDER'],
+        'gdrive': app.config['GDRIVE_FOLDER']
+    },
+    budgets={
+        'uploads': app.config['UPLOAD_STORAGE_BUDGET'],
+        'outputs': app.config['OUTPUT_STORAGE_BUDGET'],
+        'gdrive': app.config['GDRIVE_STORAGE_BUDGET']
+    },
+    check_interval=app.config['STORAGE_CHECK_INTERVAL'],
+    rescan_interval=app.config['STORAGE_RESCAN_INTERVAL']
+)
+# Inputs this young may belong to an upload that is still being queued
+INPUT_EVICTION_MIN_AGE = 3600
+
+# Metrics of this process, served at /metrics
+metrics = Registry(prefix='cureva_')
+stage_duration = metrics.histogram(
+    'stage_duration_seconds', 'Duration of each reconstruction pipeline stage', ['stage']
+)
+job_duration = metrics.histogram(
+    'job_duration_seconds', 'Processing time of jobs, by final status', ['status']
+)
+queue_wait = metrics.histogram(
+    'queue_wait_seconds', 'Time jobs waited in the queue before a worker started them'
+)
+jobs_finished = metrics.counter(
+    'jobs_finished_total', 'Jobs that stopped processing, by final status', ['status']
+)
+metrics.gauge(
+    'active_jobs', 'Jobs running in this process', fn=lambda: len(cancellations.running())
+)
+metrics.gauge('queue_depth', 'Jobs waiting for a worker', fn=lambda: scheduler.depth())
+upload_bytes = metrics.counter(
+    'upload_bytes_total', 'Bytes received in uploads', ['kind']
+)
+upload_throughput = metrics.histogram(
+    'upload_throughput_bytes_per_second', 'Receive rate of upload requests', ['kind'],
+    buckets=THROUGHPUT_BUCKETS
+)
+download_bytes = metrics.counter(
+    'download_bytes_total', 'Bytes of outputs and tiles served', ['format']
+)
+gdrive_poll_duration = metrics.histogram(
+    'gdrive_poll_seconds', 'Latency of listing the watched Google Drive folder'
+)
+gdrive_download_bytes = metrics.counter(
+    'gdrive_download_bytes_total', 'Bytes downloaded from Google Drive'
+)
+gdrive_download_throughput = metrics.histogram(
+    'gdrive_download_throughput_bytes_per_second', 'Google Drive download rate per file',
+    buckets=THROUGHPUT_BUCKETS
+)
+socketio_connections = metrics.gauge('socketio_connections', 'Connected Socket.IO clients')
+
+# Span traces of the jobs running in this process; finished traces are stored
+active_traces = {}
+
+if app.config['RUN_JOBS_IN_PROCESS']:
+    scheduler = JobScheduler(
+        num_workers=app.config['MAX_WORKERS'],
+        max_queue_size=app.config['MAX_QUEUE_SIZE'],
+        on_queue_change=update_queue_positions
+    )
+else:
+    scheduler = SharedJobQueue(
+        job_store,
+        max_queue_size=app.config['MAX_QUEUE_SIZE'],
+        on_queue_change=update_queue_positions
+    )
+scheduler.start()
 
 # Google Drive service
 gdrive_service = None
@@ -46,92 +314,563 @@ last_checked_files = set()
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def parse_timestamp(value):
+    """Parse an epoch-seconds or ISO 8601 timestamp into epoch seconds"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def update_job(job_id, **fields):
+    """Update a job and publish the changed fields to subscribers"""
+    job_store.update(job_id, **fields)
+    progress_publisher.publish(job_id, fields)
+
+def parse_job_params(values):
+    """Validate per-job processing parameters from a form or JSON body
+
+    Raises ValueError for invalid values.
+    """
+    voxel_size = values.get('voxel_size', app.config['DEFAULT_VOXEL_SIZE'])
+    neighbors = values.get('outlier_neighbors', app.config['DEFAULT_OUTLIER_NEIGHBORS'])
+    std_ratio = values.get('outlier_std_ratio', app.config['DEFAULT_OUTLIER_STD_RATIO'])
+
+    params = {
+        'voxel_size': float(voxel_size) if voxel_size not in (None, '') else None,
+        'outlier_neighbors': int(neighbors or 0),
+        'outlier_std_ratio': float(std_ratio)
+    }
+    if params['voxel_size'] is not None and params['voxel_size'] <= 0:
+        raise ValueError('voxel_size must be positive')
+    if params['outlier_neighbors'] < 0:
+        raise ValueError('outlier_neighbors must not be negative')
+    if params['outlier_std_ratio'] <= 0:
+        raise ValueError('outlier_std_ratio must be positive')
+    return params
+
+def content_keys(job):
+    """Content-index keys identifying a job's input and the output it asked for"""
+    params = job.get('params') or {}
+    active = {key: value for key, value in params.items()
+              if value and key != 'outlier_std_ratio'}
+    if params.get('outlier_neighbors'):
+        active['outlier_std_ratio'] = params['outlier_std_ratio']
+    suffix = ''
+    if active:
+        digest = hashlib.sha1(json.dumps(active, sort_keys=True).encode()).hexdigest()
+        suffix = f':{digest[:12]}'
+    # Appended images only give the same output on top of the same job
+    prefix = f"append:{job['base_job_id']}:" if job.get('base_job_id') else ''
+
+    keys = []
+    if job.get('input_hash'):
+        keys.append(f"{prefix}sha256:{job['input_hash']}{suffix}")
+    if job.get('gdrive_md5'):
+        keys.append(f"{prefix}gdrive-md5:{job['gdrive_md5']}{suffix}")
+    return keys
+
+def record_job_output(job):
+    """Index a completed job's output under its input content keys"""
+    for key in content_keys(job):
+        job_store.record_output(key, job['job_id'], job['output_file'])
+
+def link_or_copy(source_path, destination_path):
+    """Hard-link a file, copying it if the filesystem can't link"""
+    try:
+        os.link(source_path, destination_path)
+    except OSError:
+        shutil.copyfile(source_path, destination_path)
+
+def output_file_pairs(existing_path, output_path):
+    """(existing, target) paths of an output and everything derived from it
+
+    Only files that exist are listed: the output itself, its sidecars and
+    tiles, and the splat exports with their sidecars.
+    """
+    pairs = []
+    if os.path.exists(existing_path):
+        pairs.append((existing_path, output_path))
+    for fmt in EXPORT_FORMATS:
+        if os.path.exists(export_path(existing_path, fmt)):
+            pairs.append((export_path(existing_path, fmt), export_path(output_path, fmt)))
+
+    for source, target in list(pairs):
+        for derived in list(existing_sidecars(source).values()) + tile_files(source):
+            pairs.append((derived, target + derived[len(source):]))
+    return pairs
+
+def link_output_files(existing_path, output_path):
+    """Link an output and everything derived from it (sidecars, tiles, exports)"""
+    for source, target in output_file_pairs(existing_path, output_path):
+        link_or_copy(source, target)
+        storage.track(target)
+
+def remove_output_files(output_path):
+    """Delete an output and everything derived from it, complete or partial"""
+    tile_cache.discard(output_path)
+    for path, _ in output_file_pairs(output_path, output_path):
+        try:
+            storage.remove(path)
+        except OSError:
+            pass
+
+def evict_outputs(excess):
+    """Delete least recently downloaded outputs until ``excess`` bytes are freed"""
+    target = storage.usage('outputs') - excess
+    while storage.usage('outputs') > target:
+        candidates = job_store.eviction_candidates()
+        if not candidates:
+            break
+        for job in candidates:
+            if storage.usage('outputs') <= target:
+                break
+            evict_job_output(job)
+
+def evict_job_output(job):
+    """Delete a completed job's output files and mark it evicted"""
+    fields = {'stage': 'Evicted', 'evicted_at': datetime.now().isoformat()}
+    if job_store.mark_evicted(job['job_id'], **fields) is None:
+        return
+    job_store.forget_output(job_id=job['job_id'])
+    remove_output_files(os.path.join(app.config['OUTPUT_FOLDER'], job['output_file']))
+    progress_publisher.publish(job['job_id'], dict(fields, status='evicted'))
+    print(f"🧹 Evicted output of job {job['job_id']}")
+
+def input_evictor(folder):
+    """Evictor deleting the oldest inputs of a folder that no job still needs"""
+    def evict(excess):
+        target = storage.usage(folder) - excess
+        active = job_store.active_input_files()
+        for mtime, path, _ in storage.files(folder):
+            if storage.usage(folder) <= target:
+                break
+            if os.path.basename(path) in active or time.time() - mtime < INPUT_EVICTION_MIN_AGE:
+                continue
+            storage.remove(path)
+            print(f"🧹 Evicted input {path}")
+    return evict
+
+storage.set_evictor('outputs', evict_outputs)
+storage.set_evictor('uploads', input_evictor('uploads'))
+storage.set_evictor('gdrive', input_evictor('gdrive'))
+storage.start()
+
+def reuse_existing_output(job, output_path):
+    """Complete a new job instantly if an identical input was already processed
+
+    Returns True if an earlier output was reused.
+    """
+    for key in content_keys(job):
+        existing = job_store.find_output(key)
+        if not existing:
+            continue
+
+        existing_path = os.path.join(app.config['OUTPUT_FOLDER'], existing['output_file'])
+        if not os.path.exists(existing_path):
+            job_store.forget_output(content_key=key)
+            continue
+
+        link_output_files(existing_path, output_path)
+        job.update({
+            'status': 'completed',
+            'progress': 100,
+            'stage': 'Complete',
+            'output_file': os.path.basename(output_path),
+            'reused_from': existing['job_id'],
+            'completed_at': datetime.now().isoformat()
+        })
+        job_store.create(job)
+        job_store.copy_images(existing['job_id'], job['job_id'])
+        job_store.record_access(job['job_id'])
+        record_job_output(job)
+
+        progress_publisher.publish(job['job_id'], job)
+        socketio.emit('job_complete', {
+            'job_id': job['job_id'],
+            'output_file': job['output_file'],
+            'download_url': f"/download/{job['job_id']}"
+        }, room=job['job_id'])
+        print(f"♻️ Reused output of job {existing['job_id']} for job {job['job_id']}")
+        return True
+    return False
+
+def enqueue_job(job, input_path, output_path, priority=0):
+    """Store a new job and queue it for processing on the worker pool
+
+    Jobs whose input was already processed complete immediately instead.
+    Raises QueueFullError if no queue slot is free.
+    """
+    job_id = job['job_id']
+    job['priority'] = priority
+    job['input_file'] = os.path.basename(input_path)
+    job['queued_at'] = time.time()
+    if reuse_existing_output(job, output_path):
+        # The duplicate input is not needed
+        storage.remove(input_path)
+        return job
+
+    job_store.create(job)
+    try:
+        scheduler.submit(
+            job_id,
+            process_dataset_to_ply,
+            args=(job_id, input_path, output_path),
+            priority=priority
+        )
+    except QueueFullError:
+        job_store.delete(job_id)
+        raise
+    storage.track(input_path)
+    return job
+
+def queue_full_response():
+    """503 response telling the client to retry once the queue drains"""
+    response = jsonify({
+        'error': 'Processing queue is full, please retry later',
+        'queue_depth': scheduler.depth(),
+        'max_queue_size': scheduler.max_queue_size
+    })
+    response.headers['Retry-After'] = str(app.config['QUEUE_RETRY_AFTER'])
+    return response, 503
+
+def ingest_limits():
+    """Archive safety limits from the app config"""
+    return IngestLimits(
+        max_total_bytes=app.config['MAX_EXTRACTED_SIZE'],
+        max_member_bytes=app.config['MAX_IMAGE_SIZE'],
+        max_ratio=app.config['MAX_COMPRESSION_RATIO'],
+        max_members=app.config['MAX_ARCHIVE_MEMBERS']
+    )
+
+def load_base_job(job, extractor):
+    """Feature sets and output path of the job an append builds on
+
+    The earlier images' features come straight from the cache. Raises
+    ValueError if the base job's output or features are gone.
+    """
+    base = job_store.get(job['base_job_id'])
+    if not base or base['status'] != 'completed':
+        raise ValueError('The job to append to no longer has an output; submit the full dataset')
+
+    feature_sets = []
+    for name, sha256 in job_store.get_images(base['job_id']):
+        path = extractor.cache_path(sha256)
+        if not os.path.exists(path):
+            raise ValueError(
+                'Features of the earlier images are no longer cached; submit the full dataset'
+            )
+        feature_sets.append(FeatureSet(name, sha256, path, True))
+    if not feature_sets:
+        raise ValueError('The job to append to has no recorded images; submit the full dataset')
+    return feature_sets, os.path.join(app.config['OUTPUT_FOLDER'], base['output_file'])
+
+def feature_extractor():
+    """Feature extractor configured from the app config"""
+    return FeatureExtractor(
+        app.config['FEATURE_CACHE_FOLDER'],
+        detector=app.config['FEATURE_DETECTOR'],
+        max_features=app.config['FEATURE_MAX_KEYPOINTS'],
+        max_workers=app.config['FEATURE_WORKERS'],
+        max_dimension=app.config['PREPROCESS_MAX_DIMENSION']
+    )
+
 def process_dataset_to_ply(job_id, input_path, output_path):
     """
     Process dataset images to PLY format
     This is a placeholder - you'll need to implement actual 3D reconstruction
+
+    The job stops at the next ``token.checkpoint()`` once it is cancelled
+    or preempted. A job with a ``base_job_id`` (see /append) only extracts,
+    matches and triangulates its own images and adds them to the base
+    job's point cloud.
     """
+    token = cancellations.register(job_id)
+    started = time.perf_counter()
+    trace = active_traces[job_id] = Trace(
+        job_id, on_stage_end=lambda stage, seconds: stage_duration.observe(seconds, stage=stage)
+    )
+    status = 'failed'
     try:
+        job = job_store.get(job_id) or {}
+        if job.get('queued_at'):
+            queue_wait.observe(max(0.0, time.time() - job['queued_at']))
+
+        # A cancel may have been requested before this job got a worker
+        if job.get('cancel_requested'):
+            token.cancel(job['cancel_requested'])
+        token.checkpoint()
+
         # Update job status
-        processing_jobs[job_id]['status'] = 'processing'
-        processing_jobs[job_id]['progress'] = 10
-        socketio.emit('job_update', processing_jobs[job_id], room=job_id)
-
-        # Simulate processing stages
-        import time
-
-        # Stage 1: Extract files
-        processing_jobs[job_id]['progress'] = 20
-        processing_jobs[job_id]['stage'] = 'Extracting files'
-        socketio.emit('job_update', processing_jobs[job_id], room=job_id)
-        time.sleep(2)
-
-        # Stage 2: Feature detection
-        processing_jobs[job_id]['progress'] = 40
-        processing_jobs[job_id]['stage'] = 'Detecting features'
-        socketio.emit('job_update', processing_jobs[job_id], room=job_id)
-        time.sleep(2)
-
-        # Stage 3: Point cloud generation
-        processing_jobs[job_id]['progress'] = 60
-        processing_jobs[job_id]['stage'] = 'Generating point cloud'
-        socketio.emit('job_update', processing_jobs[job_id], room=job_id)
-        time.sleep(2)
-
-        # Stage 4: Creating PLY
-        processing_jobs[job_id]['progress'] = 80
-        processing_jobs[job_id]['stage'] = 'Creating PLY file'
-        socketio.emit('job_update', processing_jobs[job_id], room=job_id)
-
-        # TODO: Implement actual PLY generation
-        # For now, create a dummy PLY file
-        create_sample_ply(output_path)
+        update_job(
+            job_id,
+            status='processing',
+            progress=10,
+            queue_position=None,
+            started_at=datetime.now().isoformat()
+        )
 
-        # Complete
-        processing_jobs[job_id]['status'] = 'completed'
-        processing_jobs[job_id]['progress'] = 100
-        processing_jobs[job_id]['stage'] = 'Complete'
-        processing_jobs[job_id]['output_file'] = os.path.basename(output_path)
-        processing_jobs[job_id]['completed_at'] = datetime.now().isoformat()
+        # Stage 1: Extract files, streamed into feature detection below
+        update_job(job_id, progress=20, stage='Extracting files')
+        frames = trace.timed_iter('extraction', iter_frames(
+            input_path,
+            limits=ingest_limits(),
+            decode_workers=app.config['DECODE_WORKERS'],
+            # Images are decoded, downscaled, in the feature process pool
+            decode=False
+        ), stage=True, bytes=os.path.getsize(input_path))
+
+        # Stage 2: Feature detection, fed straight from the archive stream
+        trace.stage('feature_detection')
+        extractor = feature_extractor()
+        base_sets, base_output = [], None
+        if job.get('base_job_id'):
+            base_sets, base_output = load_base_job(job, extractor)
+            update_job(job_id, base_images=len(base_sets))
+
+        def report_features(done, cached, images_per_sec):
+            token.checkpoint()
+            if done == 1:
+                update_job(job_id, progress=40, stage='Detecting features')
+            if done % 10 == 0:
+                update_job(
+                    job_id,
+                    images_processed=done,
+                    features_cached=cached,
+                    images_per_sec=round(images_per_sec, 2)
+                )
+
+        new_sets = list(extractor.extract(frames, progress=report_features))
+        if base_sets:
+            known = {feature_set.sha256 for feature_set in base_sets}
+            new_sets = [feature_set for feature_set in new_sets if feature_set.sha256 not in known]
+            if not new_sets:
+                raise ArchiveError('All images are already part of the job')
+        if not new_sets:
+            raise ArchiveError('No images found in dataset')
+        feature_sets = base_sets + new_sets
+        trace.add(images=len(new_sets))
+        update_job(
+            job_id,
+            images_processed=len(new_sets),
+            features_cached=sum(1 for feature_set in new_sets if feature_set.cached)
+        )
 
-        socketio.emit('job_update', processing_jobs[job_id], room=job_id)
+        # Stage 3: Pair selection and matching
+        token.checkpoint()
+        trace.stage('pair_selection')
+        update_job(job_id, progress=50, stage='Matching features')
+        pairs = select_pairs(
+            feature_sets,
+            top_k=app.config['MATCH_TOP_K'],
+            sequential_window=app.config['MATCH_SEQUENTIAL_WINDOW'],
+            vocabulary_size=app.config['MATCH_VOCABULARY_SIZE'],
+            max_workers=app.config['FEATURE_WORKERS'],
+            # Pairs among the base job's images were matched by that job
+            new_from=len(base_sets)
+        )
+        update_job(job_id, image_pairs=len(pairs))
+        trace.add(pairs=len(pairs))
+
+        def report_matching(done, total):
+            token.checkpoint()
+            if done % 50 == 0 or done == total:
+                update_job(job_id, pairs_matched=done)
+
+        trace.stage('matching', pairs=len(pairs))
+        matcher = PairMatcher(
+            app.config['FEATURE_CACHE_FOLDER'],
+            extractor.params_key,
+            max_workers=app.config['FEATURE_WORKERS']
+        )
+        matches = matcher.match(feature_sets, pairs, progress=report_matching)
+        update_job(job_id, pairs_matched=len(pairs), verified_pairs=len(matches))
+        trace.add(verified_pairs=len(matches))
+
+        # Stage 4: Point cloud generation
+        token.checkpoint()
+        trace.stage('point_cloud')
+        update_job(job_id, progress=60, stage='Generating point cloud')
+
+        # TODO: Implement actual point cloud generation
+        # For now, use a random sample cloud, produced in batches the way
+        # incremental triangulation would, so viewers get a growing preview.
+        # An append starts from the base job's points and only adds batches
+        # for its new images.
+        batches = []
+        if base_output:
+            batches.append(load_point_cloud(base_output))
+            preview_publisher.add(job_id, batches[0])
+        for batch in range(min(10, len(new_sets)) if base_sets else 10):
+            token.sleep(0.2)
+            batches.append(create_sample_cloud(10))
+            preview_publisher.add(job_id, batches[-1])
+            update_job(job_id, points_generated=10 * (batch + 1))
+        vertices = np.concatenate(batches)
+        trace.add(points=len(vertices))
+
+        # Stage 5: Optional clean-up
+        token.checkpoint()
+        params = job_store.get(job_id).get('params') or {}
+        if params.get('voxel_size') or params.get('outlier_neighbors'):
+            trace.stage('cleaning', points_in=len(vertices))
+            update_job(
+                job_id,
+                progress=70,
+                stage='Cleaning point cloud',
+                points_before_cleaning=len(vertices)
+            )
+            vertices = clean_point_cloud(vertices, **params)
+            trace.add(points_out=len(vertices))
+
+        # Stage 6: Creating PLY
+        token.checkpoint()
+        trace.stage('ply_write', points=len(vertices))
+        update_job(job_id, progress=80, stage='Creating PLY file', points=len(vertices))
+        write_ply(output_path, vertices, binary=app.config['PLY_BINARY'])
+        trace.add(bytes=os.path.getsize(output_path))
+
+        if app.config['BUILD_LOD_TILES']:
+            token.checkpoint()
+            trace.stage('lod_tiles')
+            update_job(job_id, progress=85, stage='Building LOD tiles')
+            tile_index = build_tiles(
+                vertices,
+                output_path,
+                points_per_tile=app.config['LOD_POINTS_PER_TILE'],
+                max_depth=app.config['LOD_MAX_DEPTH']
+            )
+            update_job(job_id, lod_depth=tile_index['depth'], lod_tiles=len(tile_index['nodes']))
+            trace.add(tiles=len(tile_index['nodes']),
+                      bytes=sum(os.path.getsize(path) for path in tile_files(output_path)))
+
+        # Stage 7: Compact splat formats for the web viewer
+        exports = {}
+        if app.config['SPLAT_EXPORT_FORMATS']:
+            token.checkpoint()
+            trace.stage('splat_export')
+            update_job(job_id, progress=88, stage='Exporting splats')
+            exports = export_splats(
+                read_ply(output_path, mmap=True),
+                output_path,
+                formats=app.config['SPLAT_EXPORT_FORMATS'],
+                sh_degree=app.config['SPLAT_SH_DEGREE'],
+                compression_level=app.config['KSPLAT_COMPRESSION_LEVEL']
+            )
+            update_job(job_id, formats=['ply'] + list(exports))
+            trace.add(bytes=sum(os.path.getsize(path) for path in exports.values()))
+
+        # Compress once here so downloads never compress per request
+        if app.config['PRECOMPRESS_OUTPUTS']:
+            token.checkpoint()
+            trace.stage('compression')
+            update_job(job_id, progress=90, stage='Compressing output')
+            for path in [output_path] + list(exports.values()):
+                create_sidecars(path)
+                trace.add(bytes=os.path.getsize(path))
+
+        # Complete
+        token.checkpoint()
+        trace.end_stage()
+        status = 'completed'
+        # Lets later appends reuse these images' cached features
+        job_store.save_images(
+            job_id, [(feature_set.name, feature_set.sha256) for feature_set in feature_sets]
+        )
+        update_job(
+            job_id,
+            status='completed',
+            progress=100,
+            stage='Complete',
+            output_file=os.path.basename(output_path),
+            completed_at=datetime.now().isoformat()
+        )
+        record_job_output(job_store.get(job_id))
+        job_store.record_access(job_id)
+        for path, _ in output_file_pairs(output_path, output_path):
+            storage.track(path)
+        if app.config['DELETE_CONSUMED_INPUTS']:
+            storage.remove(input_path)
+        storage.request_check()
         socketio.emit('job_complete', {
             'job_id': job_id,
             'output_file': os.path.basename(output_path),
-            'download_url': f'/download/{job_id}'
+            'download_url': f'/download/{job_id}',
+            'export_urls': {fmt: f'/download/{job_id}?format={fmt}' for fmt in exports}
         }, room=job_id)
 
+    except JobCancelled as e:
+        status = e.reason
+        remove_output_files(output_path)
+        if e.reason == PREEMPTED:
+            requeue_preempted_job(job_id, input_path, output_path)
+        else:
+            finish_cancelled_job(job_id, input_path)
     except Exception as e:
-        processing_jobs[job_id]['status'] = 'failed'
-        processing_jobs[job_id]['error'] = str(e)
+        update_job(job_id, status='failed', error=str(e))
         socketio.emit('job_error', {'job_id': job_id, 'error': str(e)}, room=job_id)
-
-def create_sample_ply(output_path):
-    """Create a sample PLY file for testing"""
-    ply_content = """ply
-format ascii 1.0
-element vertex 100
-property float x
-property float y
-property float z
-property uchar red
-property uchar green
-property uchar blue
-end_header
-"""
-    # Add some sample points
-    import random
-    for i in range(100):
-        x = random.uniform(-1, 1)
-        y = random.uniform(-1, 1)
-        z = random.uniform(-1, 1)
-        r = random.randint(0, 255)
-        g = random.randint(0, 255)
-        b = random.randint(0, 255)
-        ply_content += f"{x} {y} {z} {r} {g} {b}\n"
-
-    with open(output_path, 'w') as f:
-        f.write(ply_content)
+    finally:
+        cancellations.release(job_id)
+        preview_publisher.discard(job_id)
+        job_duration.observe(time.perf_counter() - started, status=status)
+        jobs_finished.inc(status=status)
+        trace.finish(status)
+        try:
+            job_store.save_trace(job_id, trace.to_chrome())
+        except Exception as e:
+            print(f"Error saving trace of job {job_id}: {e}")
+        active_traces.pop(job_id, None)
+
+def finish_cancelled_job(job_id, input_path):
+    """Mark a job cancelled and delete its input"""
+    storage.remove(input_path)
+    update_job(
+        job_id,
+        status='cancelled',
+        stage='Cancelled',
+        queue_position=None,
+        cancelled_at=datetime.now().isoformat()
+    )
+    socketio.emit('job_cancelled', {'job_id': job_id}, room=job_id)
+    print(f"🛑 Job {job_id} cancelled")
+
+def requeue_preempted_job(job_id, input_path, output_path):
+    """Put a preempted job back in the queue, ahead of its capacity limit"""
+    job = job_store.get(job_id) or {}
+    update_job(
+        job_id,
+        status='queued',
+        stage='Queued',
+        progress=0,
+        queued_at=time.time(),
+        cancel_requested=None,
+        preemptions=job.get('preemptions', 0) + 1
+    )
+    scheduler.submit(
+        job_id,
+        process_dataset_to_ply,
+        args=(job_id, input_path, output_path),
+        priority=job.get('priority', 0),
+        force=True
+    )
+    print(f"⏸️ Job {job_id} preempted and requeued")
+
+def load_point_cloud(path):
+    """Read a PLY written by this server into the point_cloud_dtype layout"""
+    vertices = read_ply(path)
+    points = np.empty(len(vertices), dtype=point_cloud_dtype())
+    for name in points.dtype.names:
+        points[name] = vertices[name]
+    return points
+
+def create_sample_cloud(num_points=100):
+    """Create a sample point cloud for testing"""
+    rng = np.random.default_rng()
+    vertices = np.empty(num_points, dtype=point_cloud_dtype())
+    for axis in ('x', 'y', 'z'):
+        vertices[axis] = rng.uniform(-1, 1, num_points)
+    for channel in ('red', 'green', 'blue'):
+        vertices[channel] = rng.integers(0, 256, num_points)
+    return vertices
 
 @app.route('/')
 def index():
@@ -140,6 +879,10 @@ def index():
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     """Upload dataset file for processing"""
+    # Reject before request.files reads the body to disk if nothing can take it
+    if scheduler.is_full():
+        return queue_full_response()
+
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
 
@@ -148,83 +891,679 @@ def upload_file():
         return jsonify({'error': 'No file selected'}), 400
 
     if file and allowed_file(file.filename):
+        try:
+            priority = int(request.form.get('priority', 0))
+            params = parse_job_params(request.form)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid job parameters: {e}'}), 400
+
         # Create unique job ID
         job_id = str(uuid.uuid4())
 
         # Save uploaded file
         filename = secure_filename(file.filename)
         input_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}_{filename}")
-        file.save(input_path)
+        started = time.perf_counter()
+        input_hash = save_stream(file.stream, input_path)
+        record_upload('form', os.path.getsize(input_path), time.perf_counter() - started)
+        unsupported = unsupported_dataset_response(input_path)
+        if unsupported:
+            return unsupported
+
+        # Queue for processing on the worker pool
+        try:
+            job = queue_upload_job(job_id, filename, input_path, input_hash, params, priority)
+        except QueueFullError:
+            os.remove(input_path)
+            return queue_full_response()
 
-        # Create output path
-        output_filename = f"{job_id}_output.ply"
-        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+        return jsonify(upload_response(job, 'File uploaded successfully')), 200
 
-        # Create job entry
-        processing_jobs[job_id] = {
-            'job_id': job_id,
-            'filename': filename,
-            'status': 'queued',
-            'progress': 0,
-            'stage': 'Queued',
-            'created_at': datetime.now().isoformat(),
-            'input_size': os.path.getsize(input_path)
-        }
+    return jsonify({'error': 'Invalid file type'}), 400
 
-        # Start processing in background thread
-        thread = threading.Thread(
-            target=process_dataset_to_ply,
-            args=(job_id, input_path, output_path)
-        )
-        thread.start()
+@app.route('/api/jobs/<job_id>/append', methods=['POST'])
+def append_to_job(job_id):
+    """Add images to a completed job
 
+    Multipart form like /api/upload (file, priority). A new job is created
+    with ``base_job_id`` set: it reuses the base job's cached features and
+    point cloud, and only extracts, matches and triangulates the new
+    images. Its output is the combined point cloud; the base job and its
+    output are left as they are, so appends can be chained.
+    """
+    base = job_store.get(job_id)
+    if not base:
+        return jsonify({'error': 'Job not found'}), 404
+    if base['status'] == 'evicted':
         return jsonify({
-            'job_id': job_id,
-            'status': 'queued',
-            'message': 'File uploaded successfully, processing started'
-        }), 200
+            'error': 'Output was deleted to free disk space; submit the full dataset again'
+        }), 410
+    if base['status'] != 'completed':
+        return jsonify({'error': 'Images can only be appended to a completed job'}), 409
+    if not job_store.get_images(job_id):
+        return jsonify({
+            'error': 'This job has no recorded images to build on; submit the full dataset'
+        }), 409
 
-    return jsonify({'error': 'Invalid file type'}), 400
+    # Reject before request.files reads the body to disk if nothing can take it
+    if scheduler.is_full():
+        return queue_full_response()
+
+    if 'file' not in request.files or request.files['file'].filename == '':
+        return jsonify({'error': 'No file provided'}), 400
+    file = request.files['file']
+    if not allowed_file(file.filename):
+        return jsonify({'error': 'Invalid file type'}), 400
+
+    try:
+        priority = int(request.form.get('priority', 0))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid job parameters: {e}'}), 400
+
+    append_id = str(uuid.uuid4())
+    filename = secure_filename(file.filename)
+    input_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{append_id}_{filename}")
+    started = time.perf_counter()
+    input_hash = save_stream(file.stream, input_path)
+    record_upload('form', os.path.getsize(input_path), time.perf_counter() - started)
+    unsupported = unsupported_dataset_response(input_path)
+    if unsupported:
+        return unsupported
+
+    try:
+        # The combined cloud is cleaned the same way as the base job's
+        job = queue_upload_job(append_id, filename, input_path, input_hash,
+                               base.get('params') or {}, priority, base_job_id=job_id)
+    except QueueFullError:
+        os.remove(input_path)
+        return queue_full_response()
+
+    response = upload_response(job, 'Images uploaded successfully')
+    response['base_job_id'] = job_id
+    return jsonify(response), 200
+
+def unsupported_dataset_response(path):
+    """400 response (removing the file) if ingestion cannot read a saved upload"""
+    try:
+        dataset_format(path)
+    except ArchiveError as e:
+        os.remove(path)
+        return jsonify({'error': str(e)}), 400
+    return None
+
+def record_upload(kind, size, seconds):
+    upload_bytes.inc(size, kind=kind)
+    if seconds > 0:
+        upload_throughput.observe(size / seconds, kind=kind)
+
+def upload_response(job, message):
+    """Response body for a finished upload"""
+    if job['status'] == 'completed':
+        return {
+            'job_id': job['job_id'],
+            'status': 'completed',
+            'reused_from': job.get('reused_from'),
+            'download_url': f"/download/{job['job_id']}",
+            'message': f'{message}, identical dataset already processed'
+        }
+    return {
+        'job_id': job['job_id'],
+        'status': 'queued',
+        'queue_position': scheduler.position(job['job_id']),
+        'queue_depth': scheduler.depth(),
+        'message': f'{message}, processing queued'
+    }
+
+def queue_upload_job(job_id, filename, input_path, input_hash, params, priority=0,
+                     base_job_id=None):
+    """Create a job for an uploaded file and queue it
+
+    With ``base_job_id`` the upload is appended to that completed job.
+    """
+    output_filename = f"{job_id}_output.ply"
+    output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+
+    job = {
+        'job_id': job_id,
+        'filename': filename,
+        'status': 'queued',
+        'progress': 0,
+        'stage': 'Queued',
+        'source': 'upload',
+        'created_at': datetime.now().isoformat(),
+        'input_size': os.path.getsize(input_path),
+        'input_hash': input_hash,
+        'params': params
+    }
+    if base_job_id:
+        job['base_job_id'] = base_job_id
+    return enqueue_job(job, input_path, output_path, priority)
+
+@app.errorhandler(UploadError)
+def handle_upload_error(e):
+    return jsonify({'error': str(e), **e.details}), e.status_code
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """Start a resumable chunked upload
+
+    JSON body: filename, size (bytes), optional sha256, priority and
+    processing parameters (voxel_size, outlier_neighbors, outlier_std_ratio).
+    """
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename') or '')
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': 'Invalid file type'}), 400
+
+    try:
+        size = int(data.get('size'))
+        priority = int(data.get('priority', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'size and priority must be integers'}), 400
+
+    try:
+        params = parse_job_params(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid job parameters: {e}'}), 400
+
+    session = chunked_uploads.create(filename, size, data.get('sha256'), priority, params)
+    status = chunked_uploads.status(session)
+    status['chunk_size'] = app.config['UPLOAD_CHUNK_SIZE']
+    return jsonify(status), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """Get upload progress; offset is where the next chunk must start"""
+    session = chunked_uploads.get(upload_id)
+    return jsonify(chunked_uploads.status(session)), 200
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+def put_upload_chunk(upload_id):
+    """Append a chunk; the raw request body is streamed to disk
+
+    The chunk offset is given as ?offset=N or an Upload-Offset header.
+    """
+    session = chunked_uploads.get(upload_id)
+    offset = request.args.get('offset', request.headers.get('Upload-Offset'))
+    try:
+        offset = int(offset)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'offset is required'}), 400
+
+    started = time.perf_counter()
+    new_offset = chunked_uploads.write_chunk(
+        session, offset, request.stream, request.content_length
+    )
+    record_upload('chunked', max(0, new_offset - offset), time.perf_counter() - started)
+    return jsonify({'upload_id': session.upload_id, 'offset': new_offset, 'size': session.size}), 200
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """Verify the checksum of a fully received upload and queue it"""
+    session = chunked_uploads.get(upload_id)
+    data = request.get_json(silent=True) or {}
+
+    job_id = str(uuid.uuid4())
+    input_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}_{session.filename}")
+
+    def queue_job(digest):
+        # Raises ArchiveError before queueing a file ingestion cannot read
+        dataset_format(input_path)
+        return queue_upload_job(
+            job_id, session.filename, input_path, digest, session.params, session.priority
+        )
+
+    try:
+        digest, job = chunked_uploads.finalize(
+            session, input_path, sha256=data.get('sha256'), on_complete=queue_job
+        )
+    except QueueFullError:
+        return queue_full_response()
+    except ArchiveError as e:
+        # Retrying cannot help, so drop the received bytes
+        chunked_uploads.abort(session)
+        return jsonify({'error': str(e)}), 400
+
+    response = upload_response(job, 'Upload complete')
+    response['sha256'] = digest
+    return jsonify(response), 200
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """Abort an upload and discard the received bytes"""
+    session = chunked_uploads.get(upload_id)
+    chunked_uploads.abort(session)
+    return jsonify({'upload_id': session.upload_id, 'status': 'aborted'}), 200
 
 @app.route('/api/status/<job_id>', methods=['GET'])
 def get_status(job_id):
-    """Get processing status"""
-    if job_id in processing_jobs:
-        return jsonify(processing_jobs[job_id]), 200
-    return jsonify({'error': 'Job not found'}), 404
+    """Get processing status
+
+    Responses carry an ETag. To long-poll, send it back in If-None-Match
+    with ``?wait=<seconds>``: the request returns as soon as the job
+    changes, or with 304 Not Modified once the wait runs out.
+    """
+    try:
+        wait = float(request.args.get('wait', 0))
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+    wait = max(0.0, min(wait, app.config['LONG_POLL_MAX_WAIT']))
+
+    # Take the token before reading the job, so a change in between shows
+    # up as a new token on the next request rather than being missed
+    token = job_watch.token(job_id)
+    if wait and request.if_none_match.contains_weak(token) and job_store.exists(job_id):
+        job_watch.wait({job_id: token}, wait)
+        token = job_watch.token(job_id)
+
+    job = job_store.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if request.if_none_match.contains_weak(token):
+        response = make_response('', 304)
+    else:
+        response = jsonify(job)
+    response.set_etag(token, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/status/batch', methods=['POST'])
+def get_status_batch():
+    """Get the status of many jobs in one request
+
+    JSON body: {"job_ids": [...], "fields": [...]}. ``fields`` is optional
+    and limits each job to those keys (job_id is always included).
+    Returns the jobs in the order asked for, and the IDs that do not exist.
+    """
+    data = request.get_json(silent=True) or {}
+    job_ids = data.get('job_ids')
+    if not isinstance(job_ids, list) or not all(isinstance(job_id, str) for job_id in job_ids):
+        return jsonify({'error': 'job_ids must be a list of job IDs'}), 400
+    job_ids = list(dict.fromkeys(job_ids))
+    if len(job_ids) > app.config['STATUS_BATCH_MAX_JOBS']:
+        return jsonify({
+            'error': f"At most {app.config['STATUS_BATCH_MAX_JOBS']} jobs per request"
+        }), 400
+
+    fields = data.get('fields')
+    if fields is not None and (
+            not isinstance(fields, list) or not all(isinstance(field, str) for field in fields)):
+        return jsonify({'error': 'fields must be a list of field names'}), 400
+
+    found = job_store.get_many(job_ids)
+    jobs = []
+    missing = []
+    for job_id in job_ids:
+        job = found.get(job_id)
+        if job is None:
+            missing.append(job_id)
+            continue
+        if fields is not None:
+            job = {key: job[key] for key in ['job_id', *fields] if key in job}
+        jobs.append(job)
+    return jsonify({'jobs': jobs, 'missing': missing}), 200
+
+def sse_event(event, data, event_id=None):
+    """Format one Server-Sent Events message"""
+    lines = [f'id: {event_id}'] if event_id else []
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+def job_event_stream(job_ids):
+    """Yield a job_update event whenever one of the jobs changes
+
+    The first event of each job is its current state. A job drops out of
+    the stream once it reaches a terminal status, and the stream ends with
+    an ``end`` event when no job is left.
+    """
+    known = dict.fromkeys(job_ids)
+    yield 'retry: 3000\n\n'
+    while known:
+        changed = job_watch.wait(known, app.config['EVENT_STREAM_KEEPALIVE'])
+        if not changed:
+            # Keeps proxies from closing an idle connection
+            yield ': keepalive\n\n'
+            continue
+        for job_id in sorted(changed):
+            token = job_watch.token(job_id)
+            job = job_store.get(job_id)
+            if job is None:
+                del known[job_id]
+                yield sse_event('job_missing', {'job_id': job_id})
+                continue
+            known[job_id] = token
+            yield sse_event('job_update', job, event_id=f'{job_id}:{token}')
+            if job['status'] in TERMINAL_STATUSES:
+                del known[job_id]
+    yield sse_event('end', {})
+
+@app.route('/api/events', methods=['GET'])
+def stream_job_events():
+    """Stream status updates of jobs as Server-Sent Events
+
+    Query parameters:
+        job_ids: comma-separated IDs of the jobs to watch
+
+    Each ``job_update`` event carries the job's full status, as returned
+    by /api/status. Use it with EventSource where Socket.IO is unavailable.
+    """
+    job_ids = [job_id for job_id in request.args.get('job_ids', '').split(',') if job_id]
+    if not job_ids:
+        return jsonify({'error': 'job_ids is required'}), 400
+    job_ids = list(dict.fromkeys(job_ids))
+    if len(job_ids) > app.config['EVENT_STREAM_MAX_JOBS']:
+        return jsonify({
+            'error': f"At most {app.config['EVENT_STREAM_MAX_JOBS']} jobs per stream"
+        }), 400
+
+    return Response(job_event_stream(job_ids), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Stop nginx from buffering the stream
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/jobs/<job_id>/trace', methods=['GET'])
+def get_job_trace(job_id):
+    """Get a job's stage timeline in the Chrome trace-event format
+
+    Open the response in chrome://tracing or https://ui.perfetto.dev.
+    Running jobs in this process return their trace so far.
+    """
+    if not job_store.exists(job_id):
+        return jsonify({'error': 'Job not found'}), 404
+
+    trace = active_traces.get(job_id)
+    trace = trace.to_chrome() if trace else job_store.get_trace(job_id)
+    if trace is None:
+        return jsonify({'error': 'No trace recorded for this job yet'}), 404
+    response = jsonify(trace)
+    if request.args.get('download'):
+        response.headers['Content-Disposition'] = f'attachment; filename={job_id}.trace.json'
+    return response, 200
+
+@app.route('/api/jobs/<job_id>/preview', methods=['GET'])
+def get_job_preview(job_id):
+    """Get the point-cloud preview of a running job so far
+
+    Returns the preview chunks (see preview.py for the format) with a
+    sequence number above ``?since=``, concatenated; X-Preview-Seq is the
+    last one included. New chunks arrive as preview_chunk events in the
+    job's Socket.IO room. Only jobs running in this process have one.
+    """
+    try:
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        return jsonify({'error': 'since must be an integer'}), 400
+    if not job_store.exists(job_id):
+        return jsonify({'error': 'Job not found'}), 404
+
+    chunks = preview_publisher.chunks(job_id, since)
+    if not chunks:
+        return '', 204
+    response = make_response(b''.join(data for _, data in chunks))
+    response.headers['Content-Type'] = 'application/octet-stream'
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Preview-Seq'] = str(chunks[-1][0])
+    return response
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued or running job
+
+    Queued jobs are cancelled at once (200). Running jobs stop at their
+    next checkpoint, normally well within a second (202); a job_cancelled
+    event follows.
+    """
+    job = job_store.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] in TERMINAL_STATUSES:
+        return jsonify({'error': f"Job already {job['status']}"}), 409
+
+    task = scheduler.cancel(job_id) if job['status'] == 'queued' else None
+    if task is not None:
+        _, input_path, _ = task
+        finish_cancelled_job(job_id, input_path)
+        return jsonify({'job_id': job_id, 'status': 'cancelled'}), 200
+
+    # Already claimed: workers in other processes pick the request up from
+    # the store, a job running here is signalled directly
+    job_store.update(job_id, flush=True, cancel_requested=CANCELLED)
+    cancellations.cancel(job_id, CANCELLED)
+    return jsonify({'job_id': job_id, 'status': 'cancelling'}), 202
+
+@app.route('/api/jobs/<job_id>/priority', methods=['POST'])
+def set_job_priority(job_id):
+    """Change the priority of a queued job
+
+    JSON body: {"priority": int, "preempt": bool}. With ``preempt``, a
+    lower-priority running job is stopped and requeued if no worker is
+    free, so this job starts straight away.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        priority = int(data['priority'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'priority must be an integer'}), 400
+
+    job = job_store.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] != 'queued' or not scheduler.reprioritize(job_id, priority):
+        return jsonify({'error': 'Only queued jobs can be reprioritized'}), 409
+    update_job(job_id, priority=priority)
+
+    preempted = None
+    if data.get('preempt'):
+        preempted = scheduler.preemption_candidate(priority)
+        if preempted:
+            job_store.update(preempted, flush=True, cancel_requested=PREEMPTED)
+            cancellations.cancel(preempted, PREEMPTED)
+
+    return jsonify({
+        'job_id': job_id,
+        'priority': priority,
+        'queue_position': scheduler.position(job_id),
+        'preempted': preempted
+    }), 200
+
+@app.route('/api/queue', methods=['GET'])
+def get_queue_status():
+    """Get worker pool and queue status"""
+    return jsonify(scheduler.stats()), 200
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Metrics of this process in the Prometheus text format"""
+    return metrics.render(), 200, {'Content-Type': CONTENT_TYPE}
+
+@app.route('/api/storage', methods=['GET'])
+def get_storage_status():
+    """Get disk usage and budget of the upload, output and Drive folders"""
+    return jsonify(storage.stats()), 200
 
 @app.route('/api/jobs', methods=['GET'])
 def get_all_jobs():
-    """Get all processing jobs"""
-    return jsonify(list(processing_jobs.values())), 200
+    """Get processing jobs, newest first
+
+    Query parameters:
+        status: only jobs with this status
+        source: only jobs from this source ('upload' or 'google_drive')
+        updated_since: only jobs changed at or after this time (epoch
+            seconds or ISO 8601); pass back the previous response's
+            server_time to fetch just the delta. The response then also
+            lists the IDs of jobs deleted since (e.g. rejected because the
+            queue was full) under ``deleted``, whatever the filters.
+        cursor: next_cursor from the previous page
+        limit: page size
+    """
+    status = request.args.get('status')
+    source = request.args.get('source')
+    cursor = request.args.get('cursor')
 
-@app.route('/download/<job_id>', methods=['GET'])
-def download_file(job_id):
-    """Download processed PLY file"""
-    if job_id not in processing_jobs:
-        return jsonify({'error': 'Job not found'}), 404
+    try:
+        limit = int(request.args.get('limit', app.config['JOBS_PAGE_SIZE']))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    limit = max(1, min(limit, app.config['JOBS_MAX_PAGE_SIZE']))
+
+    updated_since = request.args.get('updated_since')
+    if updated_since is not None:
+        try:
+            updated_since = parse_timestamp(updated_since)
+        except ValueError:
+            return jsonify({'error': 'updated_since must be epoch seconds or ISO 8601'}), 400
+
+    # Unchanged lists cost one indexed COUNT/MAX instead of a full dump
+    etag = job_store.fingerprint(
+        status, source, updated_since, extra=f'{cursor}:{limit}'
+    )
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+
+    try:
+        jobs, next_cursor, server_time = job_store.query_jobs(
+            status=status,
+            source=source,
+            updated_since=updated_since,
+            cursor=cursor,
+            limit=limit
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    body = {
+        'jobs': jobs,
+        'next_cursor': next_cursor,
+        'server_time': server_time
+    }
+    if updated_since is not None:
+        body['deleted'] = job_store.deleted_since(updated_since)
+    response = jsonify(body)
+    response.set_etag(etag)
+    return response, 200
+
+def completed_output(job_id):
+    """Output path of a completed job, or (None, error response)"""
+    job = job_store.get(job_id)
+    if not job:
+        return None, (jsonify({'error': 'Job not found'}), 404)
+
+    if job['status'] == 'evicted':
+        return None, (jsonify({
+            'error': 'Output was deleted to free disk space; submit the dataset again',
+            'evicted_at': job.get('evicted_at')
+        }), 410)
 
-    job = processing_jobs[job_id]
     if job['status'] != 'completed':
-        return jsonify({'error': 'Job not completed yet'}), 400
+        return None, (jsonify({'error': 'Job not completed yet'}), 400)
 
     output_file = job.get('output_file')
     if not output_file:
-        return jsonify({'error': 'Output file not found'}), 404
+        return None, (jsonify({'error': 'Output file not found'}), 404)
 
     file_path = os.path.join(app.config['OUTPUT_FOLDER'], output_file)
     if not os.path.exists(file_path):
-        return jsonify({'error': 'File does not exist'}), 404
+        return None, (jsonify({'error': 'File does not exist'}), 404)
+    # Keeps the output at the back of the eviction order
+    job_store.record_access(job_id)
+    return file_path, None
+
+@app.route('/api/jobs/<job_id>/tiles', methods=['GET'])
+def get_tile_index(job_id):
+    """Get the octree LOD tile index of a completed job
+
+    Each entry of ``nodes`` is [level, node, byte offset, point count];
+    tiles are fetched from /api/jobs/<job_id>/tiles/<level>/<node>.
+    """
+    file_path, error = completed_output(job_id)
+    if error:
+        return error
+
+    tile_set = tile_cache.get(file_path)
+    if tile_set is None:
+        return jsonify({'error': 'No LOD tiles for this job'}), 404
+    response = jsonify(tile_set.index)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response, 200
+
+@app.route('/api/jobs/<job_id>/tiles/<int:level>/<int:node>', methods=['GET'])
+def get_tile(job_id, level, node):
+    """Get one LOD tile as packed little-endian vertex records"""
+    file_path, error = completed_output(job_id)
+    if error:
+        return error
+
+    tile_set = tile_cache.get(file_path)
+    if tile_set is None:
+        return jsonify({'error': 'No LOD tiles for this job'}), 404
+    tile = tile_set.tile(level, node)
+    if tile is None:
+        return jsonify({'error': 'Tile not found'}), 404
+
+    # Job outputs never change, so tiles can be cached indefinitely
+    data, count = tile
+    response = make_response(data)
+    response.mimetype = 'application/octet-stream'
+    response.headers['X-Point-Count'] = str(count)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.set_etag(f'{job_id}-{level}-{node}')
+    response = response.make_conditional(request)
+    if response.status_code == 200:
+        download_bytes.inc(len(data), format='tile')
+    return response
 
-    return send_file(file_path, as_attachment=True, download_name=output_file)
+@app.route('/download/<job_id>', methods=['GET'])
+def download_file(job_id):
+    """Download processed PLY file
+
+    ``?format=splat`` or ``?format=ksplat`` downloads the compact splat
+    export instead.
+    """
+    file_path, error = completed_output(job_id)
+    if error:
+        return error
+
+    fmt = request.args.get('format', 'ply')
+    if fmt != 'ply':
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({'error': f'Unknown format: {fmt}'}), 400
+        file_path = export_path(file_path, fmt)
+        if not os.path.exists(file_path):
+            return jsonify({'error': f'No {fmt} export for this job'}), 404
+    output_file = os.path.basename(file_path)
+
+    # Serve a precompressed sidecar if the client accepts one. send_file
+    # handles Range, If-Range, If-None-Match and If-Modified-Since.
+    variant_path, content_encoding = choose_variant(file_path, request.accept_encodings)
+    response = send_file(
+        os.path.abspath(variant_path),
+        mimetype='application/octet-stream',
+        as_attachment=True,
+        download_name=output_file,
+        conditional=True,
+        etag=True
+    )
+    if content_encoding and response.status_code in (200, 206):
+        response.headers['Content-Encoding'] = content_encoding
+    if response.status_code in (200, 206) and request.method != 'HEAD':
+        download_bytes.inc(response.content_length or 0, format=fmt)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
 
 @socketio.on('connect')
 def handle_connect():
+    socketio_connections.inc()
     print('Client connected')
     emit('connected', {'message': 'Connected to server'})
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    socketio_connections.dec()
     print('Client disconnected')
 
 @socketio.on('subscribe')
@@ -234,6 +1573,10 @@ def handle_subscribe(data):
     if job_id:
         socketio.server.enter_room(request.sid, job_id)
         emit('subscribed', {'job_id': job_id})
+        # job_update events are deltas, so start the subscriber from a snapshot
+        job = job_store.get(job_id)
+        if job:
+            emit('job_update', job)
 
 # Google Drive Integration Functions
 def init_gdrive_service():
@@ -259,16 +1602,21 @@ def init_gdrive_service():
         return None
 
 def download_file_from_gdrive(file_id, filename, destination_folder):
-    """Download file from Google Drive"""
+    """Download file from Google Drive
+
+    Returns (file_path, sha256 hex digest), or (None, None) on failure.
+    """
     try:
         if not gdrive_service:
             print("Google Drive service not initialized")
-            return None
+            return None, None
 
         request = gdrive_service.files().get_media(fileId=file_id)
         file_path = os.path.join(destination_folder, filename)
 
-        fh = io.FileIO(file_path, 'wb')
+        # Hash while downloading so deduplication needs no second read
+        started = time.perf_counter()
+        fh = HashingWriter(io.FileIO(file_path, 'wb'))
         downloader = MediaIoBaseDownload(fh, request)
 
         done = False
@@ -278,11 +1626,16 @@ def download_file_from_gdrive(file_id, filename, destination_folder):
                 print(f"Download progress: {int(status.progress() * 100)}%")
 
         fh.close()
+        size = os.path.getsize(file_path)
+        seconds = time.perf_counter() - started
+        gdrive_download_bytes.inc(size)
+        if seconds > 0:
+            gdrive_download_throughput.observe(size / seconds)
         print(f"File downloaded successfully: {file_path}")
-        return file_path
+        return file_path, fh.hexdigest()
     except Exception as e:
         print(f"Error downloading file from Google Drive: {e}")
-        return None
+        return None, None
 
 def watch_gdrive_folder():
     """Watch Google Drive folder for new files"""
@@ -300,11 +1653,12 @@ def watch_gdrive_folder():
     try:
         # Query files in the folder
         query = f"'{folder_id}' in parents and trashed=false"
-        results = gdrive_service.files().list(
-            q=query,
-            fields="files(id, name, mimeType, createdTime, size)",
-            orderBy="createdTime desc"
-        ).execute()
+        with gdrive_poll_duration.time():
+            results = gdrive_service.files().list(
+                q=query,
+                fields="files(id, name, mimeType, createdTime, size, md5Checksum)",
+                orderBy="createdTime desc"
+            ).execute()
 
         files = results.get('files', [])
 
@@ -316,7 +1670,17 @@ def watch_gdrive_folder():
             if file_id not in last_checked_files:
                 print(f"\n🔔 New file detected in Google Drive: {file_name}")
 
+                # Copies of an already processed file need no download at all
+                if allowed_file(file_name) and reuse_gdrive_duplicate(file):
+                    last_checked_files.add(file_id)
+                    continue
+
                 # Check if file type is allowed
+                if allowed_file(file_name) and scheduler.is_full():
+                    # Leave it untracked so the next poll picks it up
+                    print(f"⏳ Processing queue full, deferring: {file_name}")
+                    continue
+
                 if allowed_file(file_name):
                     # Download the file
                     print(f"Downloading file: {file_name}")
@@ -326,19 +1690,33 @@ def watch_gdrive_folder():
                         'status': 'downloading'
                     })
 
-                    downloaded_path = download_file_from_gdrive(
+                    downloaded_path, input_hash = download_file_from_gdrive(
                         file_id,
                         file_name,
                         app.config['GDRIVE_FOLDER']
                     )
 
                     if downloaded_path:
+                        # Jobs for files ingestion cannot read would only fail
+                        try:
+                            dataset_format(downloaded_path)
+                        except ArchiveError as e:
+                            os.remove(downloaded_path)
+                            print(f"⚠️ {e}: {file_name}")
+                            socketio.emit('gdrive_notification', {
+                                'type': 'error',
+                                'filename': file_name,
+                                'error': str(e)
+                            })
+                            last_checked_files.add(file_id)
+                            continue
+
                         # Create processing job
                         job_id = str(uuid.uuid4())
                         output_filename = f"{job_id}_output.ply"
                         output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
 
-                        processing_jobs[job_id] = {
+                        job = {
                             'job_id': job_id,
                             'filename': file_name,
                             'status': 'queued',
@@ -346,24 +1724,29 @@ def watch_gdrive_folder():
                             'stage': 'Queued',
                             'source': 'google_drive',
                             'created_at': datetime.now().isoformat(),
-                            'input_size': os.path.getsize(downloaded_path)
+                            'input_size': os.path.getsize(downloaded_path),
+                            'input_hash': input_hash,
+                            'gdrive_md5': file.get('md5Checksum'),
+                            'params': parse_job_params({})
                         }
 
+                        # Queue for processing on the worker pool
+                        try:
+                            enqueue_job(job, downloaded_path, output_path)
+                        except QueueFullError:
+                            # Another producer took the last slot; retry next poll
+                            os.remove(downloaded_path)
+                            print(f"⏳ Processing queue full, deferring: {file_name}")
+                            continue
+
                         socketio.emit('gdrive_notification', {
                             'type': 'download_complete',
                             'filename': file_name,
                             'job_id': job_id,
-                            'status': 'processing_started'
+                            'status': 'processing_queued' if job['status'] == 'queued' else job['status']
                         })
 
-                        # Start processing
-                        thread = threading.Thread(
-                            target=process_dataset_to_ply,
-                            args=(job_id, downloaded_path, output_path)
-                        )
-                        thread.start()
-
-                        print(f"✅ Processing started for Google Drive file: {file_name} (Job ID: {job_id})")
+                        print(f"✅ Processing queued for Google Drive file: {file_name} (Job ID: {job_id})")
                     else:
                         socketio.emit('gdrive_notification', {
                             'type': 'error',
@@ -378,6 +1761,41 @@ def watch_gdrive_folder():
     except Exception as e:
         print(f"Error watching Google Drive folder: {e}")
 
+def reuse_gdrive_duplicate(file):
+    """Complete a job from Drive metadata alone if its content was already processed
+
+    Drive reports an MD5 for binary files; a match against the content
+    index skips both the download and the reconstruction.
+    """
+    md5 = file.get('md5Checksum')
+    if not md5:
+        return False
+
+    job_id = str(uuid.uuid4())
+    output_path = os.path.join(app.config['OUTPUT_FOLDER'], f"{job_id}_output.ply")
+    job = {
+        'job_id': job_id,
+        'filename': file['name'],
+        'status': 'queued',
+        'progress': 0,
+        'stage': 'Queued',
+        'source': 'google_drive',
+        'created_at': datetime.now().isoformat(),
+        'input_size': int(file.get('size') or 0),
+        'gdrive_md5': md5,
+        'params': parse_job_params({})
+    }
+    if not reuse_existing_output(job, output_path):
+        return False
+
+    socketio.emit('gdrive_notification', {
+        'type': 'duplicate',
+        'filename': file['name'],
+        'job_id': job_id,
+        'status': 'completed'
+    })
+    return True
+
 def gdrive_watcher_loop():
     """Background thread to continuously watch Google Drive"""
     print("🔍 Google Drive watcher started")
@@ -441,5 +1859,7 @@ if __name__ == '__main__':
     # Start Google Drive watcher
     start_gdrive_watcher()
 
-    # Start Flask-SocketIO server
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True)
+    # Start Flask-SocketIO server; run one per port behind a sticky load
+    # balancer to scale out (see worker.py)
+    port = int(os.environ.get('PORT', 5000))
+    socketio.run(app, host='0.0.0.0', port=port, debug=app.config['DEBUG'])
@@ -0,0 +1,581 @@
+"""
+Load test and benchmark harness for the reconstruction server
+
+    python benchmark.py --duration 60 --upload-rate 2 --status-rate 50 \\
+        --list-rate 5 --socket-clients 20 --gdrive-rate 0.5 --output run.json
+    python benchmark.py --compare baseline.json run.json
+
+The app is started in a child process, in a scratch directory, on a local
+port. Reconstruction is replaced by a fake stage that reports progress and
+writes a small PLY after --job-seconds, and Google Drive by a local fake
+that publishes new files at --gdrive-rate, so the run measures the
+server's own overhead: uploads, queueing, job store, progress events and
+the Drive watcher.
+
+Load is open-loop: each scenario sends requests on a fixed schedule from
+a thread pool, and latency is measured from the scheduled send time, so a
+slow server shows up as latency instead of as a lower request rate. The
+child's RSS is sampled every second. Results are written as JSON; with
+--compare, two result files are diffed and the exit status is 1 if any
+throughput or p95/p99 latency regressed by more than --tolerance.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import requests
+
+SCRIPT_PATH = os.path.abspath(__file__)
+
+
+# ---------------------------------------------------------------------------
+# Child process: the app with fake reconstruction and a fake Drive
+
+
+class FakeDriveFiles:
+    """Stands in for ``gdrive_service.files()``"""
+
+    def __init__(self, drive):
+        self.drive = drive
+
+    def list(self, **kwargs):
+        return _Executable({'files': self.drive.listing()})
+
+    def get_media(self, fileId):
+        return self.drive.contents[fileId]
+
+
+class _Executable:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+class FakeDriveService:
+    """A Drive folder that gains a new file every 1 / ``rate`` seconds"""
+
+    def __init__(self, rate, file_size):
+        self.rate = rate
+        self.file_size = file_size
+        self.published = []
+        self.contents = {}
+        self.lock = threading.Lock()
+
+    def files(self):
+        return FakeDriveFiles(self)
+
+    def start(self):
+        threading.Thread(target=self._publish_loop, daemon=True).start()
+
+    def listing(self):
+        with self.lock:
+            return list(reversed(self.published))
+
+    def _publish_loop(self):
+        while True:
+            time.sleep(1.0 / self.rate)
+            data = os.urandom(self.file_size)
+            file_id = uuid.uuid4().hex
+            with self.lock:
+                self.contents[file_id] = data
+                self.published.append({
+                    'id': file_id,
+                    'name': f'drive_{len(self.published)}.zip',
+                    'mimeType': 'application/zip',
+                    'createdTime': datetime.now().isoformat(),
+                    'size': str(len(data)),
+                    'md5Checksum': hashlib.md5(data).hexdigest()
+                })
+
+
+class FakeMediaDownload:
+    """Stands in for MediaIoBaseDownload, copying the fake file in 1 MiB chunks"""
+
+    def __init__(self, fh, data):
+        self.fh = fh
+        self.data = data
+        self.offset = 0
+
+    def next_chunk(self):
+        chunk = self.data[self.offset:self.offset + 1024 * 1024]
+        self.fh.write(chunk)
+        self.offset += len(chunk)
+        return None, self.offset >= len(self.data)
+
+
+def fake_reconstruction(server, job_seconds, steps=5):
+    """A process_dataset_to_ply replacement that only sleeps and reports"""
+
+    def process(job_id, input_path, output_path):
+        try:
+            server.update_job(job_id, status='processing', progress=10,
+                              queue_position=None, started_at=datetime.now().isoformat())
+            for step in range(steps):
+                time.sleep(job_seconds / steps)
+                server.update_job(job_id, progress=10 + 80 * (step + 1) // steps,
+                                  stage=f'Fake stage {step + 1}')
+            server.write_ply(output_path, server.create_sample_cloud(1000))
+            server.storage.remove(input_path)
+            server.update_job(job_id, status='completed', progress=100, stage='Complete',
+                              output_file=os.path.basename(output_path),
+                              completed_at=datetime.now().isoformat())
+            server.socketio.emit('job_complete', {
+                'job_id': job_id,
+                'download_url': f'/download/{job_id}'
+            }, room=job_id)
+        except Exception as e:
+            server.update_job(job_id, status='failed', error=str(e))
+
+    return process
+
+
+def serve(args):
+    """Run the app with its fakes until killed (the benchmark's child process)"""
+    os.chdir(args.workdir)
+    with open('config.json', 'w') as f:
+        json.dump({
+            'max_workers': args.max_workers,
+            'max_queue_size': args.max_queue_size,
+            'gdrive_folder_id': 'benchmark' if args.gdrive_rate else None,
+            'gdrive_poll_interval': args.gdrive_poll_interval,
+            'debug': False
+        }, f)
+
+    sys.path.insert(0, os.path.dirname(SCRIPT_PATH))
+    import app as server
+
+    server.process_dataset_to_ply = fake_reconstruction(server, args.job_seconds)
+    if args.gdrive_rate:
+        drive = FakeDriveService(args.gdrive_rate, args.gdrive_size)
+        drive.start()
+        server.gdrive_service = drive
+        server.MediaIoBaseDownload = FakeMediaDownload
+        threading.Thread(target=server.gdrive_watcher_loop, daemon=True).start()
+
+    server.socketio.run(server.app, host='127.0.0.1', port=args.port, debug=False,
+                        use_reloader=False, log_output=False, allow_unsafe_werkzeug=True)
+
+
+# ---------------------------------------------------------------------------
+# Parent process: load generation and reporting
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid):
+    """Resident set size of a process in MiB (Linux only, else None)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def percentiles(values):
+    if not values:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'max_ms': None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'p50_ms': round(float(p50) * 1000, 2),
+        'p95_ms': round(float(p95) * 1000, 2),
+        'p99_ms': round(float(p99) * 1000, 2),
+        'max_ms': round(max(values) * 1000, 2)
+    }
+
+
+class Scenario:
+    """Send ``request()`` at a fixed rate and record latency and outcomes
+
+    ``request(session)`` returns the response; 2xx/3xx count as ok, 503 as
+    rejected (backpressure), anything else or an exception as an error.
+    """
+
+    def __init__(self, name, rate, request, concurrency):
+        self.name = name
+        self.rate = rate
+        self.request = request
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=name)
+        self.latencies = []
+        self.counts = {'ok': 0, 'rejected': 0, 'errors': 0}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def run(self, duration):
+        started = time.monotonic()
+        sent = 0
+        while True:
+            scheduled = started + sent / self.rate
+            if scheduled - started >= duration:
+                break
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.pool.submit(self._send, scheduled)
+            sent += 1
+        self.pool.shutdown(wait=True)
+        self.elapsed = time.monotonic() - started
+
+    def _send(self, scheduled):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        try:
+            response = self.request(session)
+            outcome = ('ok' if response.status_code < 400 else
+                       'rejected' if response.status_code == 503 else 'errors')
+        except Exception:
+            outcome = 'errors'
+        latency = time.monotonic() - scheduled
+        with self.lock:
+            self.counts[outcome] += 1
+            self.latencies.append(latency)
+
+    def results(self):
+        total = sum(self.counts.values())
+        return {
+            'target_rate': self.rate,
+            'requests': total,
+            **self.counts,
+            'throughput_rps': round(self.counts['ok'] / self.elapsed, 2) if self.elapsed else 0,
+            **percentiles(self.latencies)
+        }
+
+
+class SocketClients:
+    """Socket.IO clients that subscribe to every job the benchmark creates"""
+
+    def __init__(self, base_url, count):
+        self.base_url = base_url
+        self.count = count
+        self.clients = []
+        self.connect_latencies = []
+        self.events = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        import socketio
+
+        for _ in range(self.count):
+            client = socketio.Client(reconnection=False)
+            client.on('job_update', self._on_event)
+            started = time.monotonic()
+            try:
+                client.connect(self.base_url, wait_timeout=10)
+            except Exception as e:
+                print(f"Socket.IO connect failed: {e}")
+                self.errors += 1
+                continue
+            self.connect_latencies.append(time.monotonic() - started)
+            self.clients.append(client)
+
+    def _on_event(self, data):
+        with self.lock:
+            self.events += 1
+
+    def subscribe(self, job_id):
+        for client in self.clients:
+            try:
+                client.emit('subscribe', {'job_id': job_id})
+            except Exception:
+                with self.lock:
+                    self.errors += 1
+
+    def stop(self):
+        for client in self.clients:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+
+    def results(self, elapsed):
+        return {
+            'clients': len(self.clients),
+            'connect_errors_or_emit_failures': self.errors,
+            'job_update_events': self.events,
+            'events_per_second': round(self.events / elapsed, 2) if elapsed else 0,
+            **{f'connect_{key}': value
+               for key, value in percentiles(self.connect_latencies).items()}
+        }
+
+
+def job_summary(base_url):
+    """Status counts and queue-to-completion latency of all jobs of the run"""
+    jobs = []
+    cursor = None
+    while True:
+        params = {'limit': 500}
+        if cursor:
+            params['cursor'] = cursor
+        page = requests.get(f'{base_url}/api/jobs', params=params, timeout=30).json()
+        jobs.extend(page['jobs'])
+        cursor = page.get('next_cursor')
+        if not cursor:
+            break
+
+    statuses = {}
+    turnaround = []
+    for job in jobs:
+        statuses[job['status']] = statuses.get(job['status'], 0) + 1
+        if job['status'] == 'completed' and job.get('completed_at'):
+            turnaround.append((datetime.fromisoformat(job['completed_at']) -
+                               datetime.fromisoformat(job['created_at'])).total_seconds())
+    return {
+        'total': len(jobs),
+        'by_status': statuses,
+        **{f'turnaround_{key}': value for key, value in percentiles(turnaround).items()}
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(SCRIPT_PATH), stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def run_benchmark(args):
+    workdir = tempfile.mkdtemp(prefix='cureva-bench-')
+    port = args.port or free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    child_args = [
+        sys.executable, SCRIPT_PATH, '--serve', '--workdir', workdir, '--port', str(port),
+        '--job-seconds', str(args.job_seconds), '--max-workers', str(args.max_workers),
+        '--max-queue-size', str(args.max_queue_size), '--gdrive-rate', str(args.gdrive_rate),
+        '--gdrive-size', str(args.gdrive_size),
+        '--gdrive-poll-interval', str(args.gdrive_poll_interval)
+    ]
+    # Never a pipe: nobody would drain it during the run
+    log_path = os.path.join(workdir, 'server.log')
+    with open(log_path, 'w') as log:
+        child = subprocess.Popen(child_args, stdout=log, stderr=subprocess.STDOUT)
+
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                requests.get(f'{base_url}/api/queue', timeout=1)
+                break
+            except requests.RequestException:
+                if child.poll() is not None or time.monotonic() > deadline:
+                    raise SystemExit(f'Server did not start, see {log_path}')
+                time.sleep(0.2)
+        print(f"🚀 Server up on {base_url} (pid {child.pid}, workdir {workdir})")
+
+        memory = []
+        stop = threading.Event()
+
+        def sample_memory():
+            started = time.monotonic()
+            while not stop.is_set():
+                memory.append((round(time.monotonic() - started, 1), rss_mb(child.pid)))
+                stop.wait(1.0)
+
+        threading.Thread(target=sample_memory, daemon=True).start()
+
+        sockets = SocketClients(base_url, args.socket_clients)
+        if args.socket_clients:
+            sockets.start()
+
+        job_ids = []
+        payload = os.urandom(args.upload_size)
+
+        def upload(session):
+            # Unique content, so no upload is completed from the dedup index
+            data = payload + uuid.uuid4().bytes
+            response = session.post(f'{base_url}/api/upload',
+                                    files={'file': ('bench.zip', io.BytesIO(data))}, timeout=60)
+            if response.status_code == 200:
+                job_id = response.json()['job_id']
+                job_ids.append(job_id)
+                sockets.subscribe(job_id)
+            return response
+
+        def status(session):
+            job_id = random.choice(job_ids) if job_ids else 'unknown'
+            response = session.get(f'{base_url}/api/status/{job_id}', timeout=60)
+            if response.status_code == 404 and not job_ids:
+                response.status_code = 200  # Nothing uploaded yet
+            return response
+
+        def listing(session):
+            return session.get(f'{base_url}/api/jobs', params={'limit': 50}, timeout=60)
+
+        scenarios = [
+            Scenario(name, rate, request, args.concurrency)
+            for name, rate, request in (('upload', args.upload_rate, upload),
+                                        ('status', args.status_rate, status),
+                                        ('list_jobs', args.list_rate, listing))
+            if rate > 0
+        ]
+        print(f"⏱️ Running {', '.join(s.name for s in scenarios)} for {args.duration}s")
+        threads = [threading.Thread(target=s.run, args=(args.duration,)) for s in scenarios]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        # Let queued jobs drain so turnaround covers the whole run
+        drain_deadline = time.monotonic() + args.drain_seconds
+        while time.monotonic() < drain_deadline:
+            queue = requests.get(f'{base_url}/api/queue', timeout=30).json()
+            if not queue.get('queued') and not queue.get('active'):
+                break
+            time.sleep(0.5)
+
+        stop.set()
+        sockets.stop()
+        rss = [value for _, value in memory if value is not None]
+        results = {
+            'started_at': datetime.now().isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parameters': {key: value for key, value in vars(args).items()
+                           if key not in ('compare', 'serve', 'workdir', 'output')},
+            'elapsed_seconds': round(elapsed, 2),
+            'scenarios': {s.name: s.results() for s in scenarios},
+            'socketio': sockets.results(elapsed),
+            'jobs': job_summary(base_url),
+            'queue': requests.get(f'{base_url}/api/queue', timeout=30).json(),
+            'memory': {
+                'rss_start_mb': round(rss[0], 1) if rss else None,
+                'rss_end_mb': round(rss[-1], 1) if rss else None,
+                'rss_peak_mb': round(max(rss), 1) if rss else None,
+                'rss_growth_mb': round(rss[-1] - rss[0], 1) if rss else None,
+                'samples': memory
+            }
+        }
+    finally:
+        child.terminate()
+        try:
+            child.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            child.kill()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print_results(results)
+    print(f"💾 Results saved to {args.output}")
+    return results
+
+
+def print_results(results):
+    for name, stats in results['scenarios'].items():
+        print(f"  {name:10} {stats['throughput_rps']:8.1f} req/s  ok={stats['ok']} "
+              f"rejected={stats['rejected']} errors={stats['errors']}  "
+              f"p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms")
+    sio = results['socketio']
+    print(f"  socket.io  {sio['clients']} clients, {sio['events_per_second']} events/s, "
+          f"connect p95={sio['connect_p95_ms']}ms")
+    jobs = results['jobs']
+    print(f"  jobs       {jobs['by_status']}  turnaround p50={jobs['turnaround_p50_ms']}ms "
+          f"p95={jobs['turnaround_p95_ms']}ms")
+    memory = results['memory']
+    print(f"  memory     {memory['rss_start_mb']} -> {memory['rss_end_mb']} MiB "
+          f"(peak {memory['rss_peak_mb']} MiB)")
+
+
+def compare(baseline_path, current_path, tolerance):
+    """Print changes between two result files; True if nothing regressed"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+
+    regressions = []
+    for name, stats in current['scenarios'].items():
+        base = baseline['scenarios'].get(name)
+        if not base:
+            continue
+        for key, higher_is_better in (('throughput_rps', True), ('p95_ms', False),
+                                      ('p99_ms', False)):
+            old, new = base.get(key), stats.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change < -tolerance if higher_is_better else change > tolerance
+            marker = '❌' if worse else '  '
+            print(f"{marker} {name:10} {key:15} {old:>10} -> {new:<10} ({change:+.1%})")
+            if worse:
+                regressions.append(f'{name}.{key}')
+
+    old, new = baseline['memory']['rss_growth_mb'], current['memory']['rss_growth_mb']
+    if old is not None and new is not None:
+        print(f"   memory     rss_growth_mb   {old:>10} -> {new}")
+
+    if regressions:
+        print(f"Regressed beyond {tolerance:.0%}: {', '.join(regressions)}")
+    return not regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--duration', type=float, default=30, help='Seconds of load')
+    parser.add_argument('--upload-rate', type=float, default=2, help='Uploads per second')
+    parser.add_argument('--upload-size', type=int, default=256 * 1024, help='Bytes per upload')
+    parser.add_argument('--status-rate', type=float, default=50, help='Status polls per second')
+    parser.add_argument('--list-rate', type=float, default=5, help='/api/jobs lists per second')
+    parser.add_argument('--socket-clients', type=int, default=10,
+                        help='Socket.IO clients subscribed to every job')
+    parser.add_argument('--concurrency', type=int, default=32,
+                        help='Client threads per scenario')
+    parser.add_argument('--job-seconds', type=float, default=2, help='Duration of a fake job')
+    parser.add_argument('--max-workers', type=int, default=4)
+    parser.add_argument('--max-queue-size', type=int, default=50)
+    parser.add_argument('--gdrive-rate', type=float, default=0,
+                        help='New fake Drive files per second (0 to disable)')
+    parser.add_argument('--gdrive-size', type=int, default=1024 * 1024)
+    parser.add_argument('--gdrive-poll-interval', type=float, default=2)
+    parser.add_argument('--drain-seconds', type=float, default=30,
+                        help='Max seconds to wait for queued jobs after the load stops')
+    parser.add_argument('--port', type=int, default=None)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--keep-workdir', action='store_true')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'))
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='Allowed relative regression for --compare')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.serve:
+        serve(args)
+    elif args.compare:
+        sys.exit(0 if compare(*args.compare, args.tolerance) else 1)
+    else:
+        run_benchmark(args)
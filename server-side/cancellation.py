@@ -0,0 +1,83 @@
+"""
+Cooperative job cancellation
+
+A running job cannot be killed safely from outside (it may hold process
+pool futures, half-written files and database updates), so the pipeline
+calls ``checkpoint`` between and inside its stages instead. Cancelling a
+job sets its token; the next checkpoint raises JobCancelled, the stage
+unwinds and the job's files are cleaned up. Preemption uses the same
+mechanism with a different reason, after which the job is queued again.
+"""
+import threading
+
+CANCELLED = 'cancelled'
+PREEMPTED = 'preempted'
+
+
+class JobCancelled(Exception):
+    """Raised at a checkpoint once a job has been cancelled or preempted"""
+
+    def __init__(self, job_id, reason=CANCELLED):
+        super().__init__(f'Job {job_id} was {reason}')
+        self.job_id = job_id
+        self.reason = reason
+
+
+class CancellationToken:
+    """Cancellation state of one running job"""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.reason = None
+        self._event = threading.Event()
+
+    def cancel(self, reason=CANCELLED):
+        if self.reason is None:
+            self.reason = reason
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def checkpoint(self):
+        """Raise JobCancelled if the job has been cancelled"""
+        if self._event.is_set():
+            raise JobCancelled(self.job_id, self.reason)
+
+    def sleep(self, seconds):
+        """Sleep, waking up and raising as soon as the job is cancelled"""
+        if self._event.wait(seconds):
+            raise JobCancelled(self.job_id, self.reason)
+
+
+class CancellationRegistry:
+    """Tokens of the jobs running in this process"""
+
+    def __init__(self):
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def register(self, job_id):
+        with self._lock:
+            token = self._tokens.get(job_id)
+            if token is None:
+                token = self._tokens[job_id] = CancellationToken(job_id)
+            return token
+
+    def release(self, job_id):
+        with self._lock:
+            self._tokens.pop(job_id, None)
+
+    def cancel(self, job_id, reason=CANCELLED):
+        """Signal a job running here; returns False if it is not running here"""
+        with self._lock:
+            token = self._tokens.get(job_id)
+        if token is None:
+            return False
+        token.cancel(reason)
+        return True
+
+    def running(self):
+        with self._lock:
+            return list(self._tokens)
@@ -0,0 +1,258 @@
+"""
+Resumable chunked uploads
+
+A client creates an upload session, PUTs the file in chunks at increasing
+offsets and then finalizes it. Chunks are streamed from the request body
+straight into the session's part file, so every byte is written to disk
+exactly once; finalizing verifies the size and SHA-256 and renames the part
+file into place. After a dropped connection the client asks for the
+session's offset and continues from there.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+from content_hash import hash_file
+
+STREAM_BLOCK_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Raised for invalid upload requests; carries an HTTP status code"""
+
+    def __init__(self, message, status_code=400, **details):
+        super().__init__(message)
+        self.status_code = status_code
+        self.details = details
+
+
+class UploadSession:
+    """State of one resumable upload"""
+
+    def __init__(self, upload_id, filename, size, sha256=None, priority=0, params=None,
+                 created_at=None):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256
+        self.priority = priority
+        self.params = params or {}
+        self.created_at = created_at or time.time()
+
+        self.lock = threading.Lock()
+        # Running hash of the bytes received so far. Lost on restart, in
+        # which case finalize re-reads the part file once.
+        self.hasher = hashlib.sha256()
+        self.hashed_bytes = 0
+
+    def to_dict(self):
+        return {
+            'upload_id': self.upload_id,
+            'filename': self.filename,
+            'size': self.size,
+            'sha256': self.sha256,
+            'priority': self.priority,
+            'params': self.params,
+            'created_at': self.created_at
+        }
+
+
+class ChunkedUploadManager:
+    """Create, append to and finalize upload sessions under ``upload_folder``"""
+
+    def __init__(self, upload_folder, max_upload_size, session_ttl=24 * 3600):
+        self.upload_folder = upload_folder
+        self.max_upload_size = max_upload_size
+        self.session_ttl = session_ttl
+        self.session_folder = os.path.join(upload_folder, '.sessions')
+        os.makedirs(self.session_folder, exist_ok=True)
+
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.session_folder, f'{upload_id}.json')
+
+    def part_path(self, upload_id):
+        return os.path.join(self.session_folder, f'{upload_id}.part')
+
+    def create(self, filename, size, sha256=None, priority=0, params=None):
+        """Start a new upload session"""
+        if size < 0 or size > self.max_upload_size:
+            raise UploadError(
+                f'size must be between 0 and {self.max_upload_size} bytes',
+                413 if size > 0 else 400
+            )
+        if sha256 is not None:
+            sha256 = sha256.lower()
+            if len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256):
+                raise UploadError('sha256 must be a hex digest')
+
+        self.cleanup_expired()
+
+        session = UploadSession(str(uuid.uuid4()), filename, size, sha256, priority, params)
+        open(self.part_path(session.upload_id), 'wb').close()
+        with open(self._meta_path(session.upload_id), 'w') as f:
+            json.dump(session.to_dict(), f)
+
+        with self._lock:
+            self._sessions[session.upload_id] = session
+        return session
+
+    def get(self, upload_id):
+        """Return an existing session, reloading it from disk after a restart"""
+        with self._lock:
+            session = self._sessions.get(upload_id)
+            if session:
+                return session
+
+            try:
+                upload_id = str(uuid.UUID(upload_id))
+            except ValueError:
+                raise UploadError('Upload session not found', 404)
+
+            meta_path = self._meta_path(upload_id)
+            if not os.path.exists(meta_path):
+                raise UploadError('Upload session not found', 404)
+            with open(meta_path) as f:
+                meta = json.load(f)
+            session = UploadSession(**meta)
+            self._sessions[upload_id] = session
+            return session
+
+    def offset(self, session):
+        """Number of bytes received so far"""
+        try:
+            return os.path.getsize(self.part_path(session.upload_id))
+        except OSError:
+            raise UploadError('Upload session not found', 404)
+
+    def status(self, session):
+        status = session.to_dict()
+        status['offset'] = self.offset(session)
+        return status
+
+    def write_chunk(self, session, offset, stream, length=None):
+        """Append a chunk read from ``stream`` at ``offset``
+
+        Chunks must arrive in order; a chunk at the wrong offset is rejected
+        with 409 and the current offset so the client can resume.
+        Returns the new offset.
+        """
+        if not session.lock.acquire(blocking=False):
+            raise UploadError('Another chunk is being written to this upload', 409)
+        try:
+            current = self.offset(session)
+            if offset != current:
+                raise UploadError(
+                    'Chunk offset does not match received bytes', 409, offset=current
+                )
+
+            remaining = session.size - current
+            if length is not None and length > remaining:
+                raise UploadError('Chunk extends past declared size', 416, offset=current)
+
+            if session.hasher is None or session.hashed_bytes != current:
+                session.hasher = None
+
+            written = 0
+            with open(self.part_path(session.upload_id), 'r+b') as f:
+                f.seek(current)
+                try:
+                    while True:
+                        block = stream.read(STREAM_BLOCK_SIZE)
+                        if not block:
+                            break
+                        if written + len(block) > remaining:
+                            # Drop this chunk so the part file stays a valid prefix
+                            f.truncate(current)
+                            session.hasher = None
+                            raise UploadError(
+                                'Chunk extends past declared size', 416, offset=current
+                            )
+                        f.write(block)
+                        written += len(block)
+                        if session.hasher is not None:
+                            session.hasher.update(block)
+                finally:
+                    # A dropped connection keeps the bytes that did arrive
+                    session.hashed_bytes = current + written
+
+            return current + written
+        finally:
+            session.lock.release()
+
+    def finalize(self, session, destination_path, sha256=None, on_complete=None):
+        """Verify a complete upload and move it to ``destination_path``
+
+        ``on_complete(digest)`` is called once the file is in place; if it
+        raises, the file is moved back so finalize can be retried.
+        Returns the SHA-256 hex digest of the uploaded file and the value
+        returned by ``on_complete``.
+        """
+        with session.lock:
+            received = self.offset(session)
+            if received != session.size:
+                raise UploadError(
+                    'Upload is incomplete', 409, offset=received, size=session.size
+                )
+
+            part_path = self.part_path(session.upload_id)
+            if session.hasher is not None and session.hashed_bytes == received:
+                digest = session.hasher.hexdigest()
+            else:
+                digest = hash_file(part_path)
+
+            expected = (sha256 or session.sha256 or '').lower()
+            if expected and expected != digest:
+                raise UploadError('Checksum mismatch', 422, expected=expected, actual=digest)
+
+            os.replace(part_path, destination_path)
+            try:
+                result = on_complete(digest) if on_complete else None
+            except Exception:
+                os.replace(destination_path, part_path)
+                raise
+            self._forget(session.upload_id)
+            return digest, result
+
+    def abort(self, session):
+        """Discard an upload session and its data"""
+        with session.lock:
+            for path in (self.part_path(session.upload_id), self._meta_path(session.upload_id)):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._forget(session.upload_id)
+
+    def cleanup_expired(self):
+        """Remove sessions that have not been finalized within the TTL"""
+        cutoff = time.time() - self.session_ttl
+        for name in os.listdir(self.session_folder):
+            if not name.endswith('.json'):
+                continue
+            upload_id = name[:-len('.json')]
+            paths = [self._meta_path(upload_id), self.part_path(upload_id)]
+            try:
+                last_activity = max(
+                    os.path.getmtime(path) for path in paths if os.path.exists(path)
+                )
+                if last_activity >= cutoff:
+                    continue
+                for path in paths:
+                    if os.path.exists(path):
+                        os.remove(path)
+            except (OSError, ValueError):
+                continue
+            with self._lock:
+                self._sessions.pop(upload_id, None)
+
+    def _forget(self, upload_id):
+        meta_path = self._meta_path(upload_id)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        with self._lock:
+            self._sessions.pop(upload_id, None)
+
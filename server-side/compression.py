@@ -0,0 +1,104 @@
+"""
+Precompressed download variants
+
+Outputs are compressed once, when a job completes, into .zst and .gz
+sidecar files next to the original. Downloads then pick a variant from
+the client's Accept-Encoding header, so no request pays for compression.
+"""
+import gzip
+import os
+import shutil
+import tempfile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Content-Encoding -> sidecar suffix, in order of preference
+SIDECARS = {'zstd': '.zst', 'gzip': '.gz'}
+BLOCK_SIZE = 1024 * 1024
+
+
+def available_encodings():
+    """Encodings this server can produce"""
+    return [encoding for encoding in SIDECARS if encoding != 'zstd' or zstandard]
+
+
+def sidecar_path(path, encoding):
+    return path + SIDECARS[encoding]
+
+
+def _write_atomic(path, write):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def create_sidecars(path, encodings=None, gzip_level=6, zstd_level=10):
+    """Write compressed sidecars for a file; returns {encoding: path}
+
+    A sidecar that would not be smaller than the original is not kept.
+    """
+    created = {}
+    original_size = os.path.getsize(path)
+    for encoding in encodings or available_encodings():
+        target = sidecar_path(path, encoding)
+        with open(path, 'rb') as source:
+            if encoding == 'gzip':
+                def write(f):
+                    # mtime=0 keeps the sidecar byte-identical across runs
+                    with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=gzip_level,
+                                       mtime=0) as compressed:
+                        shutil.copyfileobj(source, compressed, BLOCK_SIZE)
+            elif encoding == 'zstd' and zstandard:
+                def write(f):
+                    compressor = zstandard.ZstdCompressor(level=zstd_level, threads=-1)
+                    compressor.copy_stream(source, f, read_size=BLOCK_SIZE)
+            else:
+                continue
+            _write_atomic(target, write)
+
+        if os.path.getsize(target) >= original_size:
+            os.remove(target)
+        else:
+            created[encoding] = target
+    return created
+
+
+def remove_sidecars(path):
+    """Delete any sidecars of a file"""
+    for encoding in SIDECARS:
+        target = sidecar_path(path, encoding)
+        if os.path.exists(target):
+            os.remove(target)
+
+
+def existing_sidecars(path):
+    """{encoding: sidecar path} for sidecars present on disk"""
+    return {
+        encoding: sidecar_path(path, encoding)
+        for encoding in SIDECARS
+        if os.path.exists(sidecar_path(path, encoding))
+    }
+
+
+def choose_variant(path, accept_encodings):
+    """Pick the best file to serve for a request
+
+    ``accept_encodings`` is Werkzeug's parsed Accept-Encoding header.
+    Returns ``(path, content_encoding)``; content_encoding is None when
+    the original file should be sent.
+    """
+    best, best_quality = None, 0
+    for encoding, variant in existing_sidecars(path).items():
+        quality = accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = (variant, encoding), quality
+    return best or (path, None)
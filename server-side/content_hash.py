@@ -0,0 +1,46 @@
+"""
+Content hashing helpers
+
+Inputs are hashed while they are written, so deduplication never needs a
+second pass over the file.
+"""
+import hashlib
+
+BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(path, block_size=BLOCK_SIZE):
+    """SHA-256 hex digest of a file, read in blocks"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def save_stream(stream, path, block_size=BLOCK_SIZE):
+    """Copy a readable stream to ``path`` and return its SHA-256 hex digest"""
+    hasher = hashlib.sha256()
+    with open(path, 'wb') as f:
+        for block in iter(lambda: stream.read(block_size), b''):
+            hasher.update(block)
+            f.write(block)
+    return hasher.hexdigest()
+
+
+class HashingWriter:
+    """File-like writer that hashes everything written through it"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.hasher = hashlib.sha256()
+
+    def write(self, data):
+        self.hasher.update(data)
+        return self.fileobj.write(data)
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+    def close(self):
+        self.fileobj.close()
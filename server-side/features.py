@@ -0,0 +1,213 @@
+"""
+Keypoint and descriptor extraction with an on-disk cache
+
+Features are extracted with OpenCV (ORB or SIFT) on a process pool and
+cached as compressed .npz files keyed by the image's content hash plus the
+detector parameters. An image that was seen before, in this job or any
+other, is never extracted again.
+
+Frames that arrive still encoded are decoded in the pool as well, at
+reduced resolution (see preprocess.py), so only the compressed bytes
+cross the process boundary.
+"""
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from preprocess import camera_database, estimate_intrinsics, load_image
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool(max_workers=None):
+    """Shared process pool for CPU-heavy pipeline stages"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count())
+        return _pool
+
+
+class FeatureSet:
+    """Cached features of one image; arrays are loaded on demand"""
+
+    def __init__(self, name, sha256, path, cached):
+        self.name = name
+        self.sha256 = sha256
+        self.path = path
+        self.cached = cached
+
+    def load(self):
+        """Return a dict with keypoints, descriptors, colors and image_size
+
+        keypoints is an (N, 6) float32 array of x, y, size, angle, response,
+        octave; colors holds the RGB colour under each keypoint. intrinsics
+        is (fx, fy, cx, cy) in the pixels of the image the keypoints are in.
+        """
+        with np.load(self.path) as data:
+            return {key: data[key] for key in data.files}
+
+
+def detect_features(image, detector='orb', max_features=4000):
+    """Detect keypoints and compute descriptors for a BGR image"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    if detector == 'sift':
+        engine = cv2.SIFT_create(nfeatures=max_features)
+    elif detector == 'orb':
+        engine = cv2.ORB_create(nfeatures=max_features)
+    else:
+        raise ValueError(f'Unknown feature detector: {detector}')
+
+    keypoints, descriptors = engine.detectAndCompute(gray, None)
+    points = np.array(
+        [(kp.pt[0], kp.pt[1], kp.size, kp.angle, kp.response, kp.octave) for kp in keypoints],
+        dtype=np.float32
+    ).reshape(-1, 6)
+    if descriptors is None:
+        width = 128 if detector == 'sift' else 32
+        descriptors = np.empty((0, width), dtype=np.float32 if detector == 'sift' else np.uint8)
+
+    if image.ndim == 3 and len(points):
+        cols = np.clip(points[:, 0].astype(int), 0, image.shape[1] - 1)
+        rows = np.clip(points[:, 1].astype(int), 0, image.shape[0] - 1)
+        colors = image[rows, cols][:, ::-1].copy()
+    else:
+        colors = np.zeros((len(points), 3), dtype=np.uint8)
+
+    return {
+        'keypoints': points,
+        'descriptors': descriptors,
+        'colors': colors,
+        'image_size': np.array(image.shape[:2][::-1], dtype=np.int32)
+    }
+
+
+def _extract_to_cache(image, params, path, info=None):
+    # Runs in a worker process
+    features = detect_features(image, params['detector'], params['max_features'])
+    cameras = camera_database(params['camera_database']) if params['camera_database'] else None
+    features['intrinsics'], _ = estimate_intrinsics(
+        info or {}, image.shape[1::-1], cameras
+    )
+    save_npz_atomic(path, features)
+    return True
+
+
+def _preprocess_to_cache(data, params, path):
+    # Runs in a worker process; False if the image cannot be decoded
+    image, info = load_image(data, params['max_dimension'])
+    if image is None:
+        return False
+    return _extract_to_cache(image, params, path, info)
+
+
+def save_npz_atomic(path, arrays):
+    """Write a compressed .npz so readers never see a partial file"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.npz.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class FeatureExtractor:
+    """Extract features for a stream of frames, reusing the cache"""
+
+    def __init__(self, cache_folder, detector='orb', max_features=4000, max_workers=None,
+                 max_dimension=None):
+        self.cache_folder = cache_folder
+        self.params = {
+            'detector': detector,
+            'max_features': int(max_features),
+            'max_dimension': int(max_dimension) if max_dimension else None
+        }
+        self.params_key = hashlib.sha1(
+            json.dumps(self.params, sort_keys=True).encode()
+        ).hexdigest()[:12]
+        # Shared by all parameter sets, so not part of the key
+        self.params['camera_database'] = os.path.join(cache_folder, 'cameras.json')
+        self.max_workers = max_workers or os.cpu_count()
+        os.makedirs(cache_folder, exist_ok=True)
+
+    def cache_path(self, image_hash):
+        return os.path.join(
+            self.cache_folder, image_hash[:2], f'{image_hash}_{self.params_key}.npz'
+        )
+
+    def is_cached(self, image_hash):
+        return os.path.exists(self.cache_path(image_hash))
+
+    def extract(self, frames, progress=None):
+        """Yield a FeatureSet per frame, in frame order
+
+        Cache misses are extracted on the shared process pool with a
+        bounded number in flight; frames without a decoded image are
+        decoded there from their data, and skipped if that fails.
+        ``progress(done, cached, images_per_sec)`` is called after every
+        image.
+        """
+        pool = get_process_pool(self.max_workers)
+        max_in_flight = self.max_workers * 2
+        pending = collections.deque()
+        done = cached = 0
+        started = time.monotonic()
+
+        def finish(entry):
+            nonlocal done, cached
+            name, sha256, path, future = entry
+            if future is None:
+                cached += 1
+                extracted = True
+            else:
+                extracted = future.result()
+            done += 1
+            if progress:
+                elapsed = max(time.monotonic() - started, 1e-6)
+                progress(done, cached, done / elapsed)
+            if not extracted:
+                return None
+            return FeatureSet(name, sha256, path, future is None)
+
+        try:
+            for frame in frames:
+                path = self.cache_path(frame.sha256)
+                future = None
+                if not os.path.exists(path):
+                    if frame.image is not None:
+                        future = pool.submit(_extract_to_cache, frame.image, self.params, path)
+                    elif frame.data is not None:
+                        future = pool.submit(_preprocess_to_cache, frame.data, self.params, path)
+                    else:
+                        raise ValueError(f'Frame {frame.name} has no image data and no cached features')
+                pending.append((frame.name, frame.sha256, path, future))
+
+                # Hand finished results on in order while keeping the pool busy
+                while pending and (pending[0][3] is None or pending[0][3].done()
+                                   or len(pending) > max_in_flight):
+                    feature_set = finish(pending.popleft())
+                    if feature_set:
+                        yield feature_set
+
+            while pending:
+                feature_set = finish(pending.popleft())
+                if feature_set:
+                    yield feature_set
+        finally:
+            for _, _, _, future in pending:
+                if future is not None:
+                    future.cancel()
@@ -0,0 +1,236 @@
+"""
+Streaming dataset ingestion
+
+Image members are streamed out of zip and tar(.gz) archives one at a time
+and decoded on a small thread pool while the archive is still being read.
+Decoded frames are handed on through a bounded generator, so an archive
+is never extracted to disk and at most a handful of images are in memory
+at once. Archives with unsafe member paths or suspicious compression
+ratios are rejected while streaming.
+"""
+import collections
+import hashlib
+import os
+import posixpath
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+READ_BLOCK_SIZE = 1024 * 1024
+
+Frame = collections.namedtuple('Frame', ['name', 'sha256', 'data', 'image'])
+
+
+class ArchiveError(Exception):
+    """Raised for unsupported, corrupt or unsafe archives"""
+
+
+class IngestLimits:
+    """Safety limits applied while streaming an archive"""
+
+    def __init__(self, max_total_bytes=8 * 1024 ** 3, max_member_bytes=256 * 1024 ** 2,
+                 max_ratio=100, max_members=50000):
+        self.max_total_bytes = max_total_bytes
+        self.max_member_bytes = max_member_bytes
+        self.max_ratio = max_ratio
+        self.max_members = max_members
+
+
+def is_image_name(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def check_member_name(name):
+    """Reject absolute paths and parent-directory components"""
+    normalized = name.replace('\\', '/')
+    if (normalized.startswith('/') or ':' in normalized.split('/')[0]
+            or '..' in normalized.split('/')):
+        raise ArchiveError(f'Unsafe path in archive: {name!r}')
+    return posixpath.normpath(normalized)
+
+
+def _read_capped(fileobj, limit, name):
+    """Read a member fully, failing as soon as it exceeds ``limit`` bytes"""
+    chunks, total = [], 0
+    while True:
+        block = fileobj.read(min(READ_BLOCK_SIZE, limit + 1 - total))
+        if not block:
+            break
+        total += len(block)
+        if total > limit:
+            raise ArchiveError(f'Archive member {name!r} expands beyond the allowed size')
+        chunks.append(block)
+    return b''.join(chunks)
+
+
+class _Budget:
+    """Running totals across all members of one archive"""
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.members = 0
+        self.total_bytes = 0
+
+    def next_member_limit(self):
+        self.members += 1
+        if self.members > self.limits.max_members:
+            raise ArchiveError('Archive contains too many members')
+        remaining = self.limits.max_total_bytes - self.total_bytes
+        return min(self.limits.max_member_bytes, remaining)
+
+    def consume(self, size):
+        self.total_bytes += size
+
+
+def _iter_zip(path, limits):
+    budget = _Budget(limits)
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile as e:
+        raise ArchiveError(f'Corrupt zip archive: {e}')
+
+    with archive:
+        for info in archive.infolist():
+            name = check_member_name(info.filename)
+            if info.is_dir() or not is_image_name(name):
+                continue
+
+            # Declared sizes can lie, so they are checked here and the
+            # actual decompressed bytes are capped while reading
+            if info.compress_size and info.file_size / info.compress_size > limits.max_ratio:
+                raise ArchiveError(f'Suspicious compression ratio for {name!r}')
+            limit = budget.next_member_limit()
+            if info.file_size > limit:
+                raise ArchiveError(f'Archive member {name!r} is too large')
+
+            with archive.open(info) as member:
+                data = _read_capped(member, limit, name)
+            if info.compress_size and len(data) / info.compress_size > limits.max_ratio:
+                raise ArchiveError(f'Suspicious compression ratio for {name!r}')
+            budget.consume(len(data))
+            yield name, data
+
+
+def _iter_tar(path, limits):
+    budget = _Budget(limits)
+    compressed_size = os.path.getsize(path)
+    try:
+        # 'r|*' reads the archive strictly sequentially, with any compression
+        archive = tarfile.open(path, mode='r|*')
+    except tarfile.TarError as e:
+        raise ArchiveError(f'Corrupt tar archive: {e}')
+
+    with archive:
+        try:
+            for member in archive:
+                name = check_member_name(member.name)
+                if not member.isfile() or not is_image_name(name):
+                    # Directories, links and devices are never followed
+                    continue
+
+                limit = budget.next_member_limit()
+                if member.size > limit:
+                    raise ArchiveError(f'Archive member {name!r} is too large')
+
+                data = _read_capped(archive.extractfile(member), limit, name)
+                budget.consume(len(data))
+                if budget.total_bytes > limits.max_ratio * max(compressed_size, 1):
+                    raise ArchiveError('Suspicious compression ratio for archive')
+                yield name, data
+        except tarfile.TarError as e:
+            raise ArchiveError(f'Corrupt tar archive: {e}')
+
+
+def iter_image_members(path, limits=None):
+    """Yield ``(name, bytes)`` for each image in a dataset file
+
+    Supports zip and tar (optionally gzip/bz2/xz compressed) archives as
+    well as single image files.
+    """
+    limits = limits or IngestLimits()
+
+    kind = dataset_format(path)
+    if kind == 'image':
+        with open(path, 'rb') as f:
+            data = _read_capped(f, limits.max_member_bytes, os.path.basename(path))
+        yield os.path.basename(path), data
+    elif kind == 'zip':
+        yield from _iter_zip(path, limits)
+    else:
+        yield from _iter_tar(path, limits)
+
+
+def dataset_format(path):
+    """'image', 'zip' or 'tar' for a dataset file ingestion can read
+
+    Checks the content, not just the extension, so an upload can be
+    rejected before it is queued. Raises ArchiveError for anything else
+    (e.g. rar, 7z or a .gz that is not a tar archive).
+    """
+    if is_image_name(path):
+        return 'image'
+    if zipfile.is_zipfile(path):
+        return 'zip'
+    if _is_tar(path):
+        return 'tar'
+    ext = os.path.splitext(path)[1].lower()
+    raise ArchiveError(f'Unsupported dataset format: {ext or os.path.basename(path)}')
+
+
+def _is_tar(path):
+    try:
+        with tarfile.open(path, mode='r|*') as archive:
+            archive.next()
+        return True
+    except (tarfile.TarError, OSError, EOFError):
+        return False
+
+
+def decode_image(data, flags=cv2.IMREAD_COLOR):
+    """Decode an encoded image; returns None if it cannot be decoded"""
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+
+
+def _decode_frame(name, data, needs_decode, decode):
+    sha256 = hashlib.sha256(data).hexdigest()
+    if not decode or (needs_decode is not None and not needs_decode(sha256)):
+        return Frame(name, sha256, data, None)
+    image = decode_image(data)
+    if image is None:
+        return None
+    return Frame(name, sha256, data, image)
+
+
+def iter_frames(path, limits=None, decode_workers=4, max_in_flight=8, needs_decode=None,
+                decode=True):
+    """Yield decoded frames from a dataset file in archive order
+
+    Decoding runs on ``decode_workers`` threads while the archive keeps
+    streaming; at most ``max_in_flight`` frames are buffered. Members that
+    fail to decode are skipped. If ``needs_decode(sha256)`` returns False
+    for a member (e.g. its features are already cached), the frame is
+    yielded with ``image=None`` and the decode is skipped. With
+    ``decode=False`` no member is decoded here, only hashed, for consumers
+    that decode the data themselves.
+    """
+    in_flight = collections.deque()
+    with ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix='decode') as pool:
+        try:
+            for name, data in iter_image_members(path, limits):
+                in_flight.append(pool.submit(_decode_frame, name, data, needs_decode, decode))
+                if len(in_flight) >= max_in_flight:
+                    frame = in_flight.popleft().result()
+                    if frame is not None:
+                        yield frame
+
+            while in_flight:
+                frame = in_flight.popleft().result()
+                if frame is not None:
+                    yield frame
+        finally:
+            for future in in_flight:
+                future.cancel()
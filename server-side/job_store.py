@@ -0,0 +1,767 @@
+"""
+Persistent SQLite job store
+
+Jobs are kept in a WAL-mode SQLite database so they survive restarts and
+can be queried through indexes instead of scanning an in-memory dict.
+Progress updates are coalesced in memory and written in batches; terminal
+states are written immediately.
+
+The store doubles as the job queue when reconstruction runs in separate
+worker processes: queued jobs carry a task (their input and output
+paths), and workers claim them with a lease that they keep renewing, so
+a crashed worker's job is queued again once its lease runs out.
+"""
+import base64
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+TERMINAL_STATUSES = {'completed', 'failed', 'cancelled', 'evicted'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    source TEXT NOT NULL DEFAULT 'upload',
+    created_at TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs(created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_source ON jobs(source);
+CREATE INDEX IF NOT EXISTS idx_jobs_updated_at ON jobs(updated_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_source_created ON jobs(source, created_at);
+
+CREATE TABLE IF NOT EXISTS outputs (
+    content_key TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    output_file TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outputs_job_id ON outputs(job_id);
+
+CREATE TABLE IF NOT EXISTS traces (
+    job_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS job_images (
+    job_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (job_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS deleted_jobs (
+    job_id TEXT PRIMARY KEY,
+    deleted_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_deleted_jobs_deleted_at ON deleted_jobs(deleted_at);
+"""
+
+# How long deletions are remembered for delta queries (updated_since)
+TOMBSTONE_TTL = 7 * 24 * 3600
+
+# Columns used when the store is the shared job queue; added to older
+# databases on startup
+QUEUE_COLUMNS = {
+    'priority': 'INTEGER NOT NULL DEFAULT 0',
+    'task': 'TEXT',
+    'worker_id': 'TEXT',
+    'lease_until': 'REAL',
+    'attempts': 'INTEGER NOT NULL DEFAULT 1',
+}
+QUEUE_INDEX = ('CREATE INDEX IF NOT EXISTS idx_jobs_queue '
+               'ON jobs(status, priority DESC, created_at)')
+
+# When a job's output was last downloaded (or completed), for LRU eviction
+STORAGE_COLUMNS = {
+    'last_accessed': 'REAL',
+}
+STORAGE_INDEX = ('CREATE INDEX IF NOT EXISTS idx_jobs_last_accessed '
+                 'ON jobs(status, last_accessed)')
+
+
+def encode_cursor(created_at, job_id):
+    """Opaque pagination cursor pointing just past (created_at, job_id)"""
+    raw = json.dumps([created_at, job_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, job_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    return str(created_at), str(job_id)
+
+
+class JobStore:
+    """SQLite-backed store of processing jobs
+
+    Jobs are plain dicts, exactly as returned by the API. ``update`` only
+    records changed fields in memory; a background thread writes them out
+    every ``flush_interval`` seconds, so a stage reporting progress many
+    times per second costs one row write per interval.
+
+    ``on_change(job_id)``, if given, is called whenever this process
+    creates, changes or deletes a job, before the change is written out.
+    """
+
+    def __init__(self, db_path, flush_interval=1.0, on_change=None):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.on_change = on_change
+
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._pending = {}
+        self._inflight = {}
+        self._accessed = {}
+        self._pending_lock = threading.Lock()
+
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        self._migrate(conn)
+        conn.commit()
+
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+    def _conn(self):
+        # One connection per thread; sqlite3 connections are not thread safe
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self, conn):
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(jobs)')}
+        for name, definition in {**QUEUE_COLUMNS, **STORAGE_COLUMNS}.items():
+            if name not in columns:
+                conn.execute(f'ALTER TABLE jobs ADD COLUMN {name} {definition}')
+        if 'attempts' not in columns:
+            # Earlier versions only kept the count in the job data
+            conn.execute(
+                "UPDATE jobs SET attempts = json_extract(data, '$.attempts') "
+                "WHERE json_extract(data, '$.attempts') IS NOT NULL"
+            )
+        conn.execute(QUEUE_INDEX)
+        conn.execute(STORAGE_INDEX)
+        conn.execute(
+            "UPDATE jobs SET last_accessed = updated_at "
+            "WHERE status = 'completed' AND last_accessed IS NULL"
+        )
+
+    def create(self, job):
+        """Insert a new job (written immediately)"""
+        now = time.time()
+        job = dict(job)
+        job['updated_at'] = now
+        job['version'] = 0
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute(
+                'INSERT INTO jobs (job_id, status, source, created_at, updated_at, version, '
+                'priority, data) VALUES (?, ?, ?, ?, ?, 0, ?, ?)',
+                (job['job_id'], job['status'], job.get('source', 'upload'),
+                 job['created_at'], now, int(job.get('priority', 0)), json.dumps(job))
+            )
+            conn.commit()
+        self._changed(job['job_id'])
+        return job
+
+    def update(self, job_id, flush=False, **fields):
+        """Record changed fields for a job
+
+        Writes are batched unless ``flush`` is set or the job reaches a
+        terminal status.
+        """
+        with self._pending_lock:
+            pending = self._pending.setdefault(job_id, {})
+            pending.update(fields)
+        self._changed(job_id)
+        if flush or fields.get('status') in TERMINAL_STATUSES:
+            self.flush()
+
+    def _changed(self, job_id):
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(job_id)
+        except Exception as e:
+            print(f"Error reporting change of job {job_id}: {e}")
+
+    def get(self, job_id):
+        """Return a job dict, or None if the job does not exist"""
+        row = self._conn().execute(
+            'SELECT data FROM jobs WHERE job_id = ?', (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = json.loads(row[0])
+        with self._pending_lock:
+            for fields in (self._inflight.get(job_id), self._pending.get(job_id)):
+                if fields:
+                    job.update(fields)
+        return job
+
+    def get_many(self, job_ids):
+        """Return {job_id: job} for those of ``job_ids`` that exist
+
+        One query, however many jobs are asked for (up to SQLite's limit
+        on bound parameters, at least 999).
+        """
+        job_ids = list(dict.fromkeys(job_ids))
+        if not job_ids:
+            return {}
+        placeholders = ', '.join('?' * len(job_ids))
+        rows = self._conn().execute(
+            f'SELECT job_id, data FROM jobs WHERE job_id IN ({placeholders})', job_ids
+        ).fetchall()
+        jobs = {job_id: json.loads(data) for job_id, data in rows}
+        with self._pending_lock:
+            for job_id, job in jobs.items():
+                for fields in (self._inflight.get(job_id), self._pending.get(job_id)):
+                    if fields:
+                        job.update(fields)
+        return jobs
+
+    def exists(self, job_id):
+        """Return True if the job exists"""
+        row = self._conn().execute(
+            'SELECT 1 FROM jobs WHERE job_id = ?', (job_id,)
+        ).fetchone()
+        return row is not None
+
+    def query_jobs(self, status=None, source=None, updated_since=None, cursor=None, limit=50):
+        """Return one page of jobs, newest first
+
+        Returns ``(jobs, next_cursor, server_time)``. ``next_cursor`` is None
+        on the last page. Passing ``server_time`` back as ``updated_since``
+        returns only the jobs that changed in between.
+        """
+        server_time = self._settle()
+
+        clauses, params = self._filter_clauses(status, source, updated_since)
+        if cursor:
+            created_at, job_id = decode_cursor(cursor)
+            clauses.append('(created_at < ? OR (created_at = ? AND job_id < ?))')
+            params.extend([created_at, created_at, job_id])
+
+        query = 'SELECT created_at, job_id, data FROM jobs'
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        query += ' ORDER BY created_at DESC, job_id DESC LIMIT ?'
+        params.append(int(limit) + 1)
+
+        rows = self._conn().execute(query, params).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][0], rows[-1][1])
+        return [json.loads(row[2]) for row in rows], next_cursor, server_time
+
+    def fingerprint(self, status=None, source=None, updated_since=None, extra=''):
+        """Cheap indexed digest of the rows a query would return
+
+        Changes whenever a matching job is created, updated or removed, so
+        it can be used as an ETag without loading any job data.
+        """
+        self.flush()
+        clauses, params = self._filter_clauses(status, source, updated_since)
+        query = 'SELECT COUNT(*), MAX(updated_at) FROM jobs'
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        count, last_update = self._conn().execute(query, params).fetchone()
+        deleted = None
+        if updated_since is not None:
+            deleted = self._conn().execute(
+                'SELECT COUNT(*), MAX(deleted_at) FROM deleted_jobs WHERE deleted_at >= ?',
+                (float(updated_since),)
+            ).fetchone()
+        key = json.dumps([status, source, updated_since, extra, count, last_update, deleted])
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def _filter_clauses(self, status, source, updated_since):
+        clauses, params = [], []
+        if status:
+            clauses.append('status = ?')
+            params.append(status)
+        if source:
+            clauses.append('source = ?')
+            params.append(source)
+        if updated_since is not None:
+            clauses.append('updated_at >= ?')
+            params.append(float(updated_since))
+        return clauses, params
+
+    def _settle(self):
+        """Flush and return a timestamp no in-process write can predate"""
+        self.flush()
+        # Batches stamp updated_at while holding the write lock, so once we
+        # hold it every earlier batch is committed.
+        with self._write_lock:
+            return time.time()
+
+    def delete(self, job_id):
+        """Remove a job, leaving a tombstone for ``deleted_since``"""
+        with self._pending_lock:
+            self._pending.pop(job_id, None)
+        with self._write_lock:
+            now = time.time()
+            conn = self._conn()
+            conn.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+            conn.execute('DELETE FROM traces WHERE job_id = ?', (job_id,))
+            conn.execute('DELETE FROM job_images WHERE job_id = ?', (job_id,))
+            conn.execute(
+                'INSERT OR REPLACE INTO deleted_jobs (job_id, deleted_at) VALUES (?, ?)',
+                (job_id, now)
+            )
+            conn.execute('DELETE FROM deleted_jobs WHERE deleted_at < ?', (now - TOMBSTONE_TTL,))
+            conn.commit()
+        self._changed(job_id)
+
+    def deleted_since(self, since):
+        """IDs of jobs deleted at or after ``since``, for delta queries
+
+        Deletions are remembered for TOMBSTONE_TTL seconds; a client that
+        last synced before that must fetch the full list again.
+        """
+        rows = self._conn().execute(
+            'SELECT job_id FROM deleted_jobs WHERE deleted_at >= ?', (float(since),)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def find_output(self, content_key):
+        """Return the completed output recorded for an input, or None"""
+        row = self._conn().execute(
+            'SELECT job_id, output_file FROM outputs WHERE content_key = ?', (content_key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'job_id': row[0], 'output_file': row[1]}
+
+    def record_output(self, content_key, job_id, output_file):
+        """Remember that an input with this content key produced output_file"""
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute(
+                'INSERT OR REPLACE INTO outputs (content_key, job_id, output_file, created_at) '
+                'VALUES (?, ?, ?, ?)',
+                (content_key, job_id, output_file, time.time())
+            )
+            conn.commit()
+
+    def forget_output(self, content_key=None, job_id=None):
+        """Drop content index entries by key or by producing job"""
+        with self._write_lock:
+            conn = self._conn()
+            if content_key is not None:
+                conn.execute('DELETE FROM outputs WHERE content_key = ?', (content_key,))
+            if job_id is not None:
+                conn.execute('DELETE FROM outputs WHERE job_id = ?', (job_id,))
+            conn.commit()
+
+    def save_trace(self, job_id, trace):
+        """Store a job's trace, replacing the trace of an earlier attempt"""
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute(
+                'INSERT OR REPLACE INTO traces (job_id, data) VALUES (?, ?)',
+                (job_id, json.dumps(trace))
+            )
+            conn.commit()
+
+    def get_trace(self, job_id):
+        row = self._conn().execute(
+            'SELECT data FROM traces WHERE job_id = ?', (job_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_images(self, job_id, images):
+        """Store the (name, sha256) images a job's output was built from"""
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute('DELETE FROM job_images WHERE job_id = ?', (job_id,))
+            conn.executemany(
+                'INSERT INTO job_images (job_id, position, name, sha256) VALUES (?, ?, ?, ?)',
+                [(job_id, position, name, sha256)
+                 for position, (name, sha256) in enumerate(images)]
+            )
+            conn.commit()
+
+    def get_images(self, job_id):
+        """(name, sha256) of a job's images in capture order"""
+        rows = self._conn().execute(
+            'SELECT name, sha256 FROM job_images WHERE job_id = ? ORDER BY position', (job_id,)
+        ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def copy_images(self, source_job_id, job_id):
+        """Give a job the image list of another (e.g. one whose output it reused)"""
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute(
+                'INSERT OR REPLACE INTO job_images (job_id, position, name, sha256) '
+                'SELECT ?, position, name, sha256 FROM job_images WHERE job_id = ?',
+                (job_id, source_job_id)
+            )
+            conn.commit()
+
+    def record_access(self, job_id):
+        """Note that a job's output was just used; written with the next flush"""
+        with self._pending_lock:
+            self._accessed[job_id] = time.time()
+
+    def eviction_candidates(self, limit=20):
+        """Completed jobs whose output was used least recently, oldest first"""
+        self.flush()
+        rows = self._conn().execute(
+            "SELECT data FROM jobs WHERE status = 'completed' "
+            'ORDER BY last_accessed LIMIT ?', (int(limit),)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def mark_evicted(self, job_id, **fields):
+        """Move a completed job to 'evicted'
+
+        Returns the updated job, or None if it is no longer completed (e.g.
+        another process evicted it first).
+        """
+        self.flush()
+        with self._write_lock:
+            conn = self._conn()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                row = conn.execute(
+                    "SELECT data FROM jobs WHERE job_id = ? AND status = 'completed'", (job_id,)
+                ).fetchone()
+                if row is None:
+                    conn.rollback()
+                    return None
+                now = time.time()
+                job = json.loads(row[0])
+                job.update(fields)
+                job['status'] = 'evicted'
+                job['updated_at'] = now
+                job['version'] = job.get('version', 0) + 1
+                conn.execute(
+                    'UPDATE jobs SET status = ?, updated_at = ?, version = ?, data = ? '
+                    'WHERE job_id = ?',
+                    (job['status'], now, job['version'], json.dumps(job), job_id)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        self._changed(job_id)
+        return job
+
+    def recent_versions(self, since):
+        """Return {job_id: version} of jobs written at or after ``since``"""
+        rows = self._conn().execute(
+            'SELECT job_id, version FROM jobs WHERE updated_at >= ?', (since,)
+        ).fetchall()
+        return dict(rows)
+
+    def active_input_files(self):
+        """Input files of jobs that are queued or running"""
+        self.flush()
+        rows = self._conn().execute(
+            "SELECT json_extract(data, '$.input_file') FROM jobs "
+            "WHERE status IN ('queued', 'processing')"
+        ).fetchall()
+        return {row[0] for row in rows if row[0]}
+
+    def fail_interrupted(self, error='Server restarted while job was running'):
+        """Mark jobs left queued/processing by a previous run as failed"""
+        rows = self._conn().execute(
+            "SELECT job_id FROM jobs WHERE status IN ('queued', 'processing')"
+        ).fetchall()
+        for (job_id,) in rows:
+            self.update(job_id, status='failed', error=error)
+        return len(rows)
+
+    def enqueue(self, job_id, task, priority=0, max_queue_size=None):
+        """Hand a created job to the worker processes
+
+        ``task`` is a JSON-serializable list of arguments for the worker.
+        Returns False, without queueing, if ``max_queue_size`` jobs are
+        already waiting.
+        """
+        # The worker must see the job's current status when it claims it
+        self.flush()
+        with self._write_lock:
+            conn = self._conn()
+            try:
+                # IMMEDIATE takes the database write lock, so the depth check
+                # and the insert are atomic across processes
+                conn.execute('BEGIN IMMEDIATE')
+                if max_queue_size is not None and self._queue_depth(conn) >= max_queue_size:
+                    conn.rollback()
+                    return False
+                conn.execute(
+                    'UPDATE jobs SET task = ?, priority = ? WHERE job_id = ?',
+                    (json.dumps(task), int(priority), job_id)
+                )
+                conn.commit()
+                return True
+            except Exception:
+                conn.rollback()
+                raise
+
+    def dequeue(self, job_id):
+        """Take a queued job away from the workers
+
+        Returns its task, or None if it is not waiting (e.g. already claimed).
+        """
+        with self._write_lock:
+            conn = self._conn()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                row = conn.execute(
+                    "SELECT task FROM jobs WHERE job_id = ? AND status = 'queued' "
+                    'AND task IS NOT NULL', (job_id,)
+                ).fetchone()
+                if row is None:
+                    conn.rollback()
+                    return None
+                conn.execute('UPDATE jobs SET task = NULL WHERE job_id = ?', (job_id,))
+                conn.commit()
+                return json.loads(row[0])
+            except Exception:
+                conn.rollback()
+                raise
+
+    def set_queued_priority(self, job_id, priority):
+        """Change the queue priority of a job that is still waiting"""
+        with self._write_lock:
+            conn = self._conn()
+            cursor = conn.execute(
+                "UPDATE jobs SET priority = ? WHERE job_id = ? AND status = 'queued' "
+                'AND task IS NOT NULL', (int(priority), job_id)
+            )
+            conn.commit()
+            return cursor.rowcount == 1
+
+    def cancel_requests(self, job_ids):
+        """Return {job_id: reason} for the given jobs that should stop"""
+        if not job_ids:
+            return {}
+        self.flush()
+        placeholders = ', '.join('?' * len(job_ids))
+        rows = self._conn().execute(
+            f"SELECT job_id, json_extract(data, '$.cancel_requested') FROM jobs "
+            f'WHERE job_id IN ({placeholders})', list(job_ids)
+        ).fetchall()
+        return {job_id: reason for job_id, reason in rows if reason}
+
+    def _queue_depth(self, conn):
+        return conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND task IS NOT NULL"
+        ).fetchone()[0]
+
+    def queue_depth(self):
+        """Number of queued jobs waiting for a worker process"""
+        return self._queue_depth(self._conn())
+
+    def queued_job_ids(self):
+        """IDs of jobs waiting for a worker process, in the order they will run"""
+        rows = self._conn().execute(
+            "SELECT job_id FROM jobs WHERE status = 'queued' AND task IS NOT NULL "
+            'ORDER BY priority DESC, created_at, job_id'
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def queue_stats(self):
+        """Active jobs and live workers, as seen in the shared queue"""
+        active, workers = self._conn().execute(
+            "SELECT COUNT(*), COUNT(DISTINCT worker_id) FROM jobs "
+            "WHERE status = 'processing' AND lease_until >= ?", (time.time(),)
+        ).fetchone()
+        return {'active': active, 'workers': workers}
+
+    def claim_next(self, worker_id, lease_seconds):
+        """Atomically take the next queued job for a worker process
+
+        Returns ``(job, task)``, or None if nothing is queued.
+        """
+        with self._write_lock:
+            conn = self._conn()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                row = conn.execute(
+                    "SELECT job_id, task, data FROM jobs WHERE status = 'queued' "
+                    'AND task IS NOT NULL ORDER BY priority DESC, created_at, job_id LIMIT 1'
+                ).fetchone()
+                if row is None:
+                    conn.rollback()
+                    return None
+
+                job_id, task, data = row
+                now = time.time()
+                job = json.loads(data)
+                job.update({'status': 'processing', 'worker_id': worker_id})
+                job['updated_at'] = now
+                job['version'] = job.get('version', 0) + 1
+                conn.execute(
+                    'UPDATE jobs SET status = ?, worker_id = ?, lease_until = ?, '
+                    'updated_at = ?, version = ?, data = ? WHERE job_id = ?',
+                    ('processing', worker_id, now + lease_seconds, now, job['version'],
+                     json.dumps(job), job_id)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        self._changed(job_id)
+        return job, json.loads(task)
+
+    def renew_leases(self, job_ids, worker_id, lease_seconds):
+        """Extend a worker's leases on the jobs it is still running"""
+        if not job_ids:
+            return
+        with self._write_lock:
+            conn = self._conn()
+            conn.executemany(
+                "UPDATE jobs SET lease_until = ? WHERE job_id = ? AND worker_id = ? "
+                "AND status = 'processing'",
+                [(time.time() + lease_seconds, job_id, worker_id) for job_id in job_ids]
+            )
+            conn.commit()
+
+    def requeue_expired(self, max_attempts=3):
+        """Queue jobs again whose worker stopped renewing its lease
+
+        A job that has already been attempted ``max_attempts`` times is
+        failed instead. Returns the number of jobs requeued or failed.
+
+        Every worker sweeps, so each change is a single UPDATE that only
+        applies while the lease is still expired and the attempt count is
+        the one read: a job whose worker renewed in the meantime, or that
+        another sweeper already handled, is left alone.
+        """
+        now = time.time()
+        rows = self._conn().execute(
+            "SELECT job_id, attempts FROM jobs WHERE status = 'processing' "
+            'AND lease_until IS NOT NULL AND lease_until < ?', (now,)
+        ).fetchall()
+
+        changed = []
+        with self._write_lock:
+            conn = self._conn()
+            for job_id, attempts in rows:
+                guard = ("WHERE job_id = ? AND status = 'processing' "
+                         'AND lease_until < ? AND attempts = ?')
+                if attempts >= max_attempts:
+                    cursor = conn.execute(
+                        "UPDATE jobs SET status = 'failed', lease_until = NULL, "
+                        'updated_at = ?, version = version + 1, '
+                        "data = json_set(data, '$.status', 'failed', '$.error', ?, "
+                        "'$.updated_at', ?, '$.version', version + 1) " + guard,
+                        (now, f'Worker stopped responding ({attempts} attempts)', now,
+                         job_id, now, attempts)
+                    )
+                else:
+                    cursor = conn.execute(
+                        "UPDATE jobs SET status = 'queued', attempts = attempts + 1, "
+                        'lease_until = NULL, updated_at = ?, version = version + 1, '
+                        "data = json_set(data, '$.status', 'queued', '$.stage', 'Queued', "
+                        "'$.progress', 0, '$.attempts', attempts + 1, "
+                        "'$.updated_at', ?, '$.version', version + 1) " + guard,
+                        (now, now, job_id, now, attempts)
+                    )
+                # Committed per job, so other processes see each change at once
+                conn.commit()
+                if cursor.rowcount == 1:
+                    changed.append(job_id)
+        for job_id in changed:
+            self._changed(job_id)
+        return len(changed)
+
+    def flush(self):
+        """Write all pending updates in a single transaction"""
+        with self._write_lock:
+            self._write_accesses()
+            with self._pending_lock:
+                if not self._pending:
+                    return
+                # Keep the batch visible to readers until it is committed
+                pending, self._pending = self._pending, {}
+                self._inflight = pending
+
+            try:
+                self._write_batch(pending)
+            except Exception:
+                # Put the batch back underneath anything newer
+                with self._pending_lock:
+                    for job_id, fields in pending.items():
+                        merged = dict(fields)
+                        merged.update(self._pending.get(job_id, {}))
+                        self._pending[job_id] = merged
+                raise
+            finally:
+                with self._pending_lock:
+                    self._inflight = {}
+
+    def _write_accesses(self):
+        # Caller must hold self._write_lock
+        with self._pending_lock:
+            accessed, self._accessed = self._accessed, {}
+        if not accessed:
+            return
+        conn = self._conn()
+        conn.executemany(
+            'UPDATE jobs SET last_accessed = ? WHERE job_id = ?',
+            [(accessed_at, job_id) for job_id, accessed_at in accessed.items()]
+        )
+        conn.commit()
+
+    def _write_batch(self, pending):
+        # Caller must hold self._write_lock
+        now = time.time()
+        conn = self._conn()
+        try:
+            # Other processes may update the same rows; read-modify-write
+            # under the database write lock so no update is lost
+            conn.execute('BEGIN IMMEDIATE')
+            for job_id, fields in pending.items():
+                row = conn.execute(
+                    'SELECT data FROM jobs WHERE job_id = ?', (job_id,)
+                ).fetchone()
+                if row is None:
+                    continue
+                job = json.loads(row[0])
+                job.update(fields)
+                job['updated_at'] = now
+                job['version'] = job.get('version', 0) + 1
+                conn.execute(
+                    'UPDATE jobs SET status = ?, updated_at = ?, version = ?, data = ? '
+                    'WHERE job_id = ?',
+                    (job['status'], now, job['version'], json.dumps(job), job_id)
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing job store: {e}")
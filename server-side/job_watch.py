@@ -0,0 +1,166 @@
+"""
+Change notification for job status long-polls and event streams
+
+Every job has a version counter that is bumped whenever the job changes.
+A request waiting for changes registers a waiter on the jobs it watches
+and blocks on it; a change wakes only the waiters of that job, so waiting
+costs nothing until something happens.
+
+Versions are per process and are exposed to clients as opaque tokens
+(``<boot id>.<version>``), which are only compared for equality. Changes
+made by this process are reported by the job store directly. ``start``
+runs a background thread that forgets finished jobs nobody has watched
+for a while, so the version map does not grow with every job ever run.
+When jobs run in other processes, the same thread also queries the store
+once per interval to pick up their writes.
+
+Versions come from one counter for all jobs, so a job that is forgotten
+and changes again never gets a token a client saw before.
+"""
+import itertools
+import threading
+import time
+import uuid
+
+from job_store import TERMINAL_STATUSES
+
+# Jobs checked per query when pruning (SQLite allows at least 999 parameters)
+PRUNE_BATCH_SIZE = 500
+
+
+class _Waiter:
+    def __init__(self):
+        self.event = threading.Event()
+        self.changed = set()
+
+
+class JobWatch:
+    """Per-job version counters with blocking waits"""
+
+    def __init__(self):
+        self.boot_id = uuid.uuid4().hex[:8]
+        self._versions = {}
+        self._counter = itertools.count(1)
+        self._touched = {}  # job_id -> monotonic time of the last change or waiter
+        self._waiters = {}  # job_id -> set of waiters
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def token(self, job_id):
+        """Opaque token that changes whenever the job changes"""
+        with self._lock:
+            return f'{self.boot_id}.{self._versions.get(job_id, 0)}'
+
+    def notify(self, job_id):
+        """Record a change of a job and wake everyone waiting on it"""
+        with self._lock:
+            self._versions[job_id] = next(self._counter)
+            self._touched[job_id] = time.monotonic()
+            for waiter in self._waiters.get(job_id, ()):
+                waiter.changed.add(job_id)
+                waiter.event.set()
+
+    def wait(self, known, timeout):
+        """Block until a job's token differs from ``known[job_id]``
+
+        ``known`` maps the watched job IDs to the tokens the caller has
+        (None for "nothing yet"). Returns the set of changed job IDs, empty
+        if ``timeout`` seconds passed without a change.
+        """
+        waiter = _Waiter()
+        with self._lock:
+            changed = {job_id for job_id, token in known.items()
+                       if token != f'{self.boot_id}.{self._versions.get(job_id, 0)}'}
+            if changed:
+                return changed
+            for job_id in known:
+                self._waiters.setdefault(job_id, set()).add(waiter)
+
+        try:
+            waiter.event.wait(timeout)
+        finally:
+            with self._lock:
+                now = time.monotonic()
+                for job_id in known:
+                    waiters = self._waiters.get(job_id)
+                    if waiters is not None:
+                        waiters.discard(waiter)
+                        if not waiters:
+                            del self._waiters[job_id]
+                    if job_id in self._versions:
+                        self._touched[job_id] = now
+        return waiter.changed
+
+    def prune(self, job_store, idle):
+        """Forget the versions of finished or deleted jobs idle for ``idle`` seconds
+
+        A job is idle when it has neither changed nor had a waiter for that
+        long. A forgotten job's token changes, so a client still holding
+        the old one gets one full response instead of a 304.
+        Returns the number of jobs forgotten.
+        """
+        cutoff = time.monotonic() - idle
+        with self._lock:
+            candidates = [job_id for job_id, touched in self._touched.items()
+                          if touched < cutoff and job_id not in self._waiters]
+        forgotten = 0
+        for start in range(0, len(candidates), PRUNE_BATCH_SIZE):
+            batch = candidates[start:start + PRUNE_BATCH_SIZE]
+            jobs = job_store.get_many(batch)
+            finished = [job_id for job_id in batch
+                        if job_id not in jobs or jobs[job_id].get('status') in TERMINAL_STATUSES]
+            with self._lock:
+                for job_id in finished:
+                    # Skip jobs that changed or gained a waiter meanwhile
+                    if self._touched.get(job_id, cutoff) >= cutoff or job_id in self._waiters:
+                        continue
+                    del self._touched[job_id]
+                    self._versions.pop(job_id, None)
+                    forgotten += 1
+        return forgotten
+
+    def start(self, job_store, feed=False, interval=0.5, window=10.0, retention=60.0):
+        """Start the background thread (idempotent)
+
+        Finished jobs are forgotten once idle for ``retention`` seconds (see
+        ``prune``); checked every ``retention / 4`` seconds (at least 1).
+
+        With ``feed`` set, the store is polled for jobs changed by other
+        processes: one query per ``interval`` covers every watcher in this
+        process. Rows updated within the last ``window`` seconds are
+        compared with the versions seen by the previous query, so clock
+        skew between nodes of up to ``window`` seconds loses nothing.
+        """
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(
+                target=self._loop, args=(job_store, feed, interval, window, retention),
+                name='job-watch', daemon=True
+            )
+        self._thread.start()
+
+    def _loop(self, job_store, feed, interval, window, retention):
+        prune_interval = max(1.0, retention / 4)
+        next_prune = time.monotonic() + prune_interval
+        seen = {}
+        while True:
+            if feed:
+                try:
+                    recent = job_store.recent_versions(time.time() - interval - window)
+                except Exception as e:
+                    print(f"Error reading job changes: {e}")
+                    recent = seen
+                for job_id, version in recent.items():
+                    if seen.get(job_id) != version:
+                        self.notify(job_id)
+                seen = recent
+
+            if time.monotonic() >= next_prune:
+                try:
+                    self.prune(job_store, retention)
+                except Exception as e:
+                    print(f"Error pruning job versions: {e}")
+                next_prune = time.monotonic() + prune_interval
+
+            time.sleep(interval if feed else max(0.0, next_prune - time.monotonic()))
@@ -0,0 +1,249 @@
+"""
+Image pair selection and feature matching
+
+Matching every image against every other grows quadratically, so pairs
+are picked by image retrieval instead: each image gets a bag-of-visual-
+words vector built from its cached descriptors, an LSH index returns its
+top-k most similar images, and neighbours in capture order are added
+because drone frames are taken in sequence. Only the selected pairs are
+matched, so matching cost grows roughly linearly with the dataset.
+"""
+import hashlib
+import json
+import os
+import re
+
+import cv2
+import numpy as np
+
+from features import get_process_pool, save_npz_atomic
+
+MIN_INLIERS = 15
+
+
+def _descriptor_vectors(descriptors):
+    """Descriptors as float32 vectors; binary (ORB) descriptors are unpacked to bits"""
+    if descriptors.dtype == np.uint8:
+        return np.unpackbits(descriptors, axis=1).astype(np.float32)
+    return descriptors.astype(np.float32)
+
+
+def _sample_descriptors(path, max_samples, seed):
+    # Runs in a worker process
+    with np.load(path) as data:
+        vectors = _descriptor_vectors(data['descriptors'])
+    if len(vectors) > max_samples:
+        rng = np.random.default_rng(seed)
+        vectors = vectors[rng.choice(len(vectors), max_samples, replace=False)]
+    return vectors
+
+
+def _nearest_words(vectors, vocabulary, block_size=4096):
+    words = np.empty(len(vectors), dtype=np.int64)
+    vocab_sq = (vocabulary ** 2).sum(axis=1)
+    for start in range(0, len(vectors), block_size):
+        block = vectors[start:start + block_size]
+        distances = vocab_sq[None, :] - 2.0 * block @ vocabulary.T
+        words[start:start + block_size] = distances.argmin(axis=1)
+    return words
+
+
+def _word_histogram(path, vocabulary):
+    # Runs in a worker process
+    with np.load(path) as data:
+        vectors = _descriptor_vectors(data['descriptors'])
+    histogram = np.zeros(len(vocabulary), dtype=np.float32)
+    if len(vectors):
+        np.add.at(histogram, _nearest_words(vectors, vocabulary), 1.0)
+    return histogram
+
+
+def build_global_descriptors(feature_sets, vocabulary_size=256, samples_per_image=100,
+                             max_workers=None):
+    """tf-idf weighted bag-of-visual-words vector per image (L2 normalized)"""
+    pool = get_process_pool(max_workers)
+    paths = [feature_set.path for feature_set in feature_sets]
+
+    samples = list(pool.map(
+        _sample_descriptors, paths,
+        [samples_per_image] * len(paths), range(len(paths))
+    ))
+    samples = np.concatenate([sample for sample in samples if len(sample)] or
+                             [np.zeros((0, 1), dtype=np.float32)])
+    if len(samples) == 0:
+        return np.zeros((len(paths), 1), dtype=np.float32)
+
+    k = int(min(vocabulary_size, max(1, len(samples) // 10)))
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 1e-3)
+    _, _, vocabulary = cv2.kmeans(samples, k, None, criteria, 1, cv2.KMEANS_PP_CENTERS)
+
+    histograms = np.stack(list(pool.map(_word_histogram, paths, [vocabulary] * len(paths))))
+    document_frequency = (histograms > 0).sum(axis=0)
+    idf = np.log((len(paths) + 1) / (document_frequency + 1)).astype(np.float32)
+    vectors = histograms * idf
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class LSHIndex:
+    """Random-hyperplane LSH for approximate cosine nearest neighbours"""
+
+    def __init__(self, vectors, num_tables=8, num_bits=None, seed=0):
+        self.vectors = vectors
+        n, dim = vectors.shape
+        num_bits = num_bits or max(1, min(16, int(np.log2(max(n, 2))) - 2))
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((num_tables, dim, num_bits)).astype(np.float32)
+        self.weights = 1 << np.arange(num_bits)
+
+        self.tables = []
+        self.codes = []
+        for planes in self.planes:
+            codes = ((vectors @ planes) > 0).astype(np.int64) @ self.weights
+            table = {}
+            for i, code in enumerate(codes):
+                table.setdefault(int(code), []).append(i)
+            self.tables.append(table)
+            self.codes.append(codes)
+
+    def query(self, i, k):
+        """Indices of up to k approximate nearest neighbours of vector i"""
+        candidates = set()
+        for table, codes in zip(self.tables, self.codes):
+            candidates.update(table[int(codes[i])])
+        candidates.discard(i)
+        if len(candidates) < k:
+            # Sparse buckets: fall back to exact search for this query
+            candidates = set(range(len(self.vectors))) - {i}
+        candidates = np.fromiter(candidates, dtype=np.int64)
+        scores = self.vectors[candidates] @ self.vectors[i]
+        top = np.argsort(-scores)[:k]
+        return candidates[top]
+
+
+def _natural_key(name):
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
+
+
+def sequential_pairs(names, window=2):
+    """Pairs of images within ``window`` of each other in capture order
+
+    Drone captures are named with timestamps or counters, so a natural
+    sort of the names recovers the capture order.
+    """
+    order = sorted(range(len(names)), key=lambda i: _natural_key(names[i]))
+    pairs = set()
+    for position, i in enumerate(order):
+        for j in order[position + 1:position + 1 + window]:
+            pairs.add((min(i, j), max(i, j)))
+    return pairs
+
+
+def select_pairs(feature_sets, top_k=10, sequential_window=2, vocabulary_size=256,
+                 max_workers=None, new_from=0):
+    """Candidate image pairs to match, as a sorted list of (i, j) with i < j
+
+    With ``new_from`` set, images before it are taken as already matched
+    with each other (e.g. by the job being appended to): only images from
+    ``new_from`` on are looked up in the index, and only pairs with at
+    least one of them are returned.
+    """
+    n = len(feature_sets)
+    if n < 2:
+        return []
+
+    pairs = {(i, j) for i, j in sequential_pairs(
+        [feature_set.name for feature_set in feature_sets], sequential_window
+    ) if j >= new_from}
+    if n - 1 <= top_k:
+        # Small dataset: retrieval would return everything anyway
+        pairs.update((i, j) for i in range(n) for j in range(max(i + 1, new_from), n))
+        return sorted(pairs)
+
+    vectors = build_global_descriptors(feature_sets, vocabulary_size, max_workers=max_workers)
+    index = LSHIndex(vectors)
+    for i in range(new_from, n):
+        for j in index.query(i, top_k):
+            j = int(j)
+            pairs.add((min(i, j), max(i, j)))
+    return sorted(pairs)
+
+
+def _match_pair(path_a, path_b, ratio, cache_path):
+    # Runs in a worker process
+    with np.load(path_a) as a, np.load(path_b) as b:
+        keypoints_a, descriptors_a = a['keypoints'], a['descriptors']
+        keypoints_b, descriptors_b = b['keypoints'], b['descriptors']
+
+    matches = np.zeros((0, 2), dtype=np.int32)
+    if len(descriptors_a) >= 2 and len(descriptors_b) >= 2:
+        norm = cv2.NORM_HAMMING if descriptors_a.dtype == np.uint8 else cv2.NORM_L2
+        matcher = cv2.BFMatcher(norm)
+        candidates = [
+            (m.queryIdx, m.trainIdx)
+            for m, n in (pair for pair in matcher.knnMatch(descriptors_a, descriptors_b, k=2)
+                         if len(pair) == 2)
+            if m.distance < ratio * n.distance
+        ]
+        if len(candidates) >= 8:
+            candidates = np.array(candidates, dtype=np.int32)
+            _, mask = cv2.findFundamentalMat(
+                keypoints_a[candidates[:, 0], :2], keypoints_b[candidates[:, 1], :2],
+                cv2.FM_RANSAC, 3.0, 0.99
+            )
+            if mask is not None:
+                matches = candidates[mask.ravel().astype(bool)]
+
+    save_npz_atomic(cache_path, {'matches': matches})
+    return matches
+
+
+class PairMatcher:
+    """Match selected image pairs, caching results per image-hash pair"""
+
+    def __init__(self, cache_folder, features_key, ratio=0.8, max_workers=None):
+        self.cache_folder = os.path.join(cache_folder, 'matches')
+        self.ratio = ratio
+        self.max_workers = max_workers
+        self.params_key = hashlib.sha1(
+            json.dumps({'features': features_key, 'ratio': ratio}).encode()
+        ).hexdigest()[:12]
+
+    def cache_path(self, sha_a, sha_b):
+        key = hashlib.sha1(f'{sha_a}:{sha_b}'.encode()).hexdigest()
+        return os.path.join(self.cache_folder, key[:2], f'{key}_{self.params_key}.npz')
+
+    def match(self, feature_sets, pairs, progress=None):
+        """Return {(i, j): matches} for pairs with enough verified inliers
+
+        ``matches`` is an (M, 2) array of keypoint indices into image i and
+        image j. ``progress(done, total)`` is called as pairs finish.
+        """
+        pool = get_process_pool(self.max_workers)
+        results = {}
+        futures = []
+        for i, j in pairs:
+            a, b = feature_sets[i], feature_sets[j]
+            cache_path = self.cache_path(a.sha256, b.sha256)
+            if os.path.exists(cache_path):
+                with np.load(cache_path) as data:
+                    results[(i, j)] = data['matches']
+            else:
+                futures.append(((i, j), pool.submit(_match_pair, a.path, b.path,
+                                                    self.ratio, cache_path)))
+
+        done = len(results)
+        try:
+            for pair, future in futures:
+                results[pair] = future.result()
+                done += 1
+                if progress:
+                    progress(done, len(pairs))
+        except BaseException:
+            # E.g. the job was cancelled: don't leave its pairs in the shared pool
+            for _, future in futures:
+                future.cancel()
+            raise
+
+        return {pair: matches for pair, matches in results.items()
+                if len(matches) >= MIN_INLIERS}
@@ -0,0 +1,270 @@
+"""
+Prometheus-style metrics in the text exposition format
+
+Counters, gauges and histograms are updated without taking a lock: every
+thread writes to its own shard, and a scrape sums the shards. Shards of
+threads that have exited (e.g. one-off request threads) are folded into a
+single retired shard during a scrape, so their counts are kept without the
+shard list growing.
+"""
+import bisect
+import http.server
+import math
+import threading
+import time
+import weakref
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds, from a fast pipeline stage up to a long reconstruction
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+# Bytes per second, 64 KiB/s to 1 GiB/s
+THROUGHPUT_BUCKETS = tuple(float(2 ** n) for n in range(16, 31, 2))
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Shard:
+    """Values written by one thread"""
+
+    def __init__(self, thread=None):
+        self._thread = weakref.ref(thread) if thread else None
+        self.values = {}  # (metric name, label values) -> float
+        self.histograms = {}  # (metric name, label values) -> [bucket counts..., sum]
+
+    def alive(self):
+        if self._thread is None:
+            return True
+        thread = self._thread()
+        return thread is not None and thread.is_alive()
+
+    def merge(self, other):
+        for key, value in other.values.items():
+            self.values[key] = self.values.get(key, 0) + value
+        for key, counts in other.histograms.items():
+            mine = self.histograms.get(key)
+            if mine is None:
+                self.histograms[key] = list(counts)
+            else:
+                for i, count in enumerate(counts):
+                    mine[i] += count
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels):
+        return self.name, tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, value=1, **labels):
+        values = self.registry._shard().values
+        key = self._key(labels)
+        values[key] = values.get(key, 0) + value
+
+
+class Gauge(_Metric):
+    """A gauge that is moved with inc/dec, or read from ``fn`` at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(self, registry, name, documentation, labelnames=(), fn=None):
+        super().__init__(registry, name, documentation, labelnames)
+        self.fn = fn
+
+    def inc(self, value=1, **labels):
+        values = self.registry._shard().values
+        key = self._key(labels)
+        values[key] = values.get(key, 0) + value
+
+    def dec(self, value=1, **labels):
+        self.inc(-value, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        histograms = self.registry._shard().histograms
+        key = self._key(labels)
+        counts = histograms.get(key)
+        if counts is None:
+            # One count per bucket plus +Inf, then the sum
+            counts = histograms[key] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block"""
+        return _Timer(self, labels)
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Registry:
+    """A set of metrics rendered together by ``render``"""
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self._metrics = []
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard()
+        self._lock = threading.Lock()
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, self.prefix + name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), fn=None):
+        return self._register(Gauge(self, self.prefix + name, documentation, labelnames, fn))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        return self._register(
+            Histogram(self, self.prefix + name, documentation, labelnames, buckets)
+        )
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def _collect(self):
+        """Sum of all shards, retiring those of exited threads"""
+        total = _Shard()
+        with self._lock:
+            live = []
+            for shard in self._shards:
+                if shard.alive():
+                    live.append(shard)
+                else:
+                    # Its thread is gone, so nothing writes to it any more
+                    self._retired.merge(shard)
+            self._shards = live
+            total.merge(self._retired)
+            metrics = list(self._metrics)
+
+        for shard in live:
+            # Copies are taken under the GIL; a concurrent update may be
+            # missed until the next scrape, never corrupted
+            snapshot = _Shard()
+            snapshot.values = dict(shard.values)
+            snapshot.histograms = {key: list(counts)
+                                   for key, counts in list(shard.histograms.items())}
+            total.merge(snapshot)
+        return total, metrics
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        total, metrics = self._collect()
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+
+            if isinstance(metric, Gauge) and metric.fn is not None:
+                try:
+                    value = metric.fn()
+                except Exception as e:
+                    print(f"Error reading metric {metric.name}: {e}")
+                    continue
+                lines.append(f'{metric.name} {_format_value(value)}')
+                continue
+
+            if isinstance(metric, Histogram):
+                for (name, labels), counts in sorted(total.histograms.items()):
+                    if name != metric.name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets + (math.inf,), counts):
+                        cumulative += count
+                        label_text = _format_labels(
+                            metric.labelnames, labels, [('le', _format_value(bound))]
+                        )
+                        lines.append(f'{name}_bucket{label_text} {cumulative}')
+                    label_text = _format_labels(metric.labelnames, labels)
+                    lines.append(f'{name}_sum{label_text} {_format_value(counts[-1])}')
+                    lines.append(f'{name}_count{label_text} {cumulative}')
+                continue
+
+            samples = [(labels, value) for (name, labels), value in sorted(total.values.items())
+                       if name == metric.name]
+            if not samples and not metric.labelnames:
+                # Report zero rather than leaving an unlabelled series absent
+                samples = [((), 0)]
+            for labels, value in samples:
+                label_text = _format_labels(metric.labelnames, labels)
+                lines.append(f'{metric.name}{label_text} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def serve(registry, port, host='0.0.0.0'):
+    """Serve ``/metrics`` on a background thread, for processes without Flask"""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
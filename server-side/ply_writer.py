@@ -0,0 +1,235 @@
+"""
+PLY reading and writing backed by NumPy structured arrays
+
+Each vertex property is a field of a structured dtype, so any property set
+(plain xyz/rgb clouds or full Gaussian-splat attributes) is written with a
+single buffer write per chunk. Binary little-endian is the default; ASCII
+is available for debugging and old tools.
+"""
+import numpy as np
+
+# NumPy dtype code -> PLY property type
+PLY_TYPES = {
+    'i1': 'char', 'u1': 'uchar',
+    'i2': 'short', 'u2': 'ushort',
+    'i4': 'int', 'u4': 'uint',
+    'f4': 'float', 'f8': 'double',
+}
+NUMPY_TYPES = {ply_type: code for code, ply_type in PLY_TYPES.items()}
+NUMPY_TYPES.update({
+    'int8': 'i1', 'uint8': 'u1', 'int16': 'i2', 'uint16': 'u2',
+    'int32': 'i4', 'uint32': 'u4', 'float32': 'f4', 'float64': 'f8',
+})
+
+# Width of the zero-padded vertex count, so a streaming writer can patch
+# the header in place once the final count is known
+COUNT_WIDTH = 12
+
+
+def point_cloud_dtype():
+    """dtype for a coloured point cloud (x, y, z, red, green, blue)"""
+    return np.dtype([
+        ('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+        ('red', 'u1'), ('green', 'u1'), ('blue', 'u1'),
+    ])
+
+
+def gaussian_splat_dtype(sh_degree=0):
+    """dtype for 3D Gaussian splats in the INRIA PLY layout
+
+    Includes normals, DC and higher-order spherical-harmonics colour
+    coefficients, opacity, log-scales and a rotation quaternion.
+    """
+    rest_count = 3 * ((sh_degree + 1) ** 2 - 1)
+    fields = [('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+              ('nx', '<f4'), ('ny', '<f4'), ('nz', '<f4'),
+              ('f_dc_0', '<f4'), ('f_dc_1', '<f4'), ('f_dc_2', '<f4')]
+    fields += [(f'f_rest_{i}', '<f4') for i in range(rest_count)]
+    fields += [('opacity', '<f4'),
+               ('scale_0', '<f4'), ('scale_1', '<f4'), ('scale_2', '<f4'),
+               ('rot_0', '<f4'), ('rot_1', '<f4'), ('rot_2', '<f4'), ('rot_3', '<f4')]
+    return np.dtype(fields)
+
+
+def _property_lines(dtype):
+    lines = []
+    for name in dtype.names:
+        field = dtype.fields[name][0]
+        if field.subdtype is not None:
+            raise ValueError(f'Property {name!r} must be a scalar field')
+        code = field.str[1:]
+        if code not in PLY_TYPES:
+            raise ValueError(f'Unsupported PLY property type for {name!r}: {field}')
+        lines.append(f'property {PLY_TYPES[code]} {name}')
+    return lines
+
+
+def _header(dtype, count, binary, comments=(), padded=False):
+    fmt = 'binary_little_endian' if binary else 'ascii'
+    lines = ['ply', f'format {fmt} 1.0']
+    lines += [f'comment {comment}' for comment in comments]
+    lines.append(f'element vertex {count:0{COUNT_WIDTH}d}' if padded else f'element vertex {count}')
+    lines += _property_lines(dtype)
+    lines.append('end_header')
+    return ('\n'.join(lines) + '\n').encode('ascii')
+
+
+def little_endian_dtype(dtype):
+    return np.dtype([(name, dtype.fields[name][0].newbyteorder('<')) for name in dtype.names])
+
+
+def _ascii_formats(dtype):
+    return ['%d' if dtype.fields[name][0].kind in 'iu' else '%.7g' for name in dtype.names]
+
+
+class PlyWriter:
+    """Write vertices to a PLY file chunk by chunk
+
+    Use as a context manager and call ``write`` with structured arrays of
+    the same dtype. If ``count`` is not known up front, the header gets a
+    fixed-width vertex count that is filled in on close, so clouds larger
+    than memory can be streamed.
+    """
+
+    def __init__(self, path, dtype, binary=True, comments=(), count=None):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.binary = binary
+        self.comments = comments
+        self.expected_count = count
+        self.count = 0
+        self._file_dtype = little_endian_dtype(self.dtype)
+        self._file = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self):
+        self._file = open(self.path, 'wb')
+        if self.expected_count is None:
+            self._file.write(_header(self.dtype, 0, self.binary, self.comments, padded=True))
+        else:
+            self._file.write(_header(self.dtype, self.expected_count, self.binary, self.comments))
+
+    def write(self, vertices):
+        """Append a structured array of vertices"""
+        vertices = np.asarray(vertices)
+        if vertices.dtype.names != self.dtype.names:
+            raise ValueError('Vertex fields do not match the writer dtype')
+        if self.binary:
+            # Contiguous little-endian input is written from its own buffer, no copies
+            data = np.ascontiguousarray(vertices.astype(self._file_dtype, copy=False))
+            self._file.write(memoryview(data))
+        else:
+            columns = np.column_stack([vertices[name] for name in self.dtype.names])
+            np.savetxt(self._file, columns, fmt=_ascii_formats(self.dtype))
+        self.count += len(vertices)
+
+    def close(self):
+        if self._file is None:
+            return
+        try:
+            if self.expected_count is None:
+                # Patch in the final vertex count; the padded header has a fixed length
+                self._file.seek(0)
+                self._file.write(
+                    _header(self.dtype, self.count, self.binary, self.comments, padded=True)
+                )
+            elif self.count != self.expected_count:
+                raise ValueError(
+                    f'Wrote {self.count} vertices, header declares {self.expected_count}'
+                )
+        finally:
+            self._file.close()
+            self._file = None
+
+
+def write_ply(path, vertices, binary=True, comments=(), chunk_size=1_000_000):
+    """Write a structured array of vertices to a PLY file"""
+    vertices = np.asarray(vertices)
+    with PlyWriter(path, vertices.dtype, binary=binary, comments=comments,
+                   count=len(vertices)) as writer:
+        if binary:
+            writer.write(vertices)
+        else:
+            for start in range(0, len(vertices), chunk_size):
+                writer.write(vertices[start:start + chunk_size])
+    return path
+
+
+def read_ply_header(path):
+    """Parse a PLY header
+
+    Returns ``(format, vertex_count, dtype, header_size)``. Only the vertex
+    element is supported.
+    """
+    with open(path, 'rb') as f:
+        if f.readline().strip() != b'ply':
+            raise ValueError(f'{path} is not a PLY file')
+
+        fmt, count, fields, element = None, 0, [], None
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(f'{path} has no end_header')
+            parts = line.decode('ascii').split()
+            if not parts or parts[0] == 'comment':
+                continue
+            if parts[0] == 'format':
+                fmt = parts[1]
+            elif parts[0] == 'element':
+                element = parts[1]
+                if element == 'vertex':
+                    count = int(parts[2])
+                elif int(parts[2]):
+                    raise ValueError(f'Unsupported PLY element: {element}')
+            elif parts[0] == 'property' and element == 'vertex':
+                if parts[1] == 'list':
+                    raise ValueError('List properties are not supported')
+                code = NUMPY_TYPES.get(parts[1])
+                if code is None:
+                    raise ValueError(f'Unsupported PLY property type: {parts[1]}')
+                fields.append((parts[2], code))
+            elif parts[0] == 'end_header':
+                header_size = f.tell()
+                break
+
+    if fmt not in ('binary_little_endian', 'binary_big_endian', 'ascii'):
+        raise ValueError(f'Unsupported PLY format: {fmt}')
+    order = '>' if fmt == 'binary_big_endian' else '<'
+    dtype = np.dtype([(name, order + code) for name, code in fields])
+    return fmt, count, dtype, header_size
+
+
+def read_ply(path, mmap=False):
+    """Read the vertices of a PLY file into a structured array
+
+    Binary files can be memory-mapped instead of loaded.
+    """
+    fmt, count, dtype, header_size = read_ply_header(path)
+    if fmt == 'ascii':
+        with open(path, 'rb') as f:
+            f.seek(header_size)
+            columns = np.loadtxt(f, ndmin=2, max_rows=count)
+        vertices = np.empty(count, dtype=dtype)
+        for i, name in enumerate(dtype.names):
+            vertices[name] = columns[:, i]
+        return vertices
+
+    if mmap:
+        return np.memmap(path, dtype=dtype, mode='r', offset=header_size, shape=(count,))
+    with open(path, 'rb') as f:
+        f.seek(header_size)
+        return np.fromfile(f, dtype=dtype, count=count)
+
+
+def iter_ply_chunks(path, chunk_size=1_000_000):
+    """Yield a binary PLY's vertices in chunks without loading it whole"""
+    vertices = read_ply(path, mmap=True)
+    for start in range(0, len(vertices), chunk_size):
+        yield np.array(vertices[start:start + chunk_size])
+
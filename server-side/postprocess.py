@@ -0,0 +1,70 @@
+"""
+Point cloud post-processing
+
+Voxel-grid downsampling and statistical outlier removal, vectorized with
+NumPy and a KD-tree. Both work on structured vertex arrays (see
+ply_writer), so every vertex property is carried through.
+"""
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def positions(vertices):
+    """(N, 3) float64 array of vertex positions"""
+    return np.column_stack([vertices['x'], vertices['y'], vertices['z']]).astype(np.float64)
+
+
+def voxel_downsample(vertices, voxel_size):
+    """Replace all vertices inside each voxel with their average
+
+    Integer properties (e.g. colours) are averaged and rounded.
+    """
+    if voxel_size <= 0 or len(vertices) == 0:
+        return vertices
+
+    xyz = positions(vertices)
+    cells = np.floor((xyz - xyz.min(axis=0)) / voxel_size).astype(np.int64)
+    extent = cells.max(axis=0) + 1
+    if np.prod(extent.astype(np.float64)) < 2 ** 62:
+        # Linearize the cell index so np.unique works on a flat array
+        keys = (cells[:, 0] * extent[1] + cells[:, 1]) * extent[2] + cells[:, 2]
+        _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    else:
+        _, inverse, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+
+    result = np.empty(len(counts), dtype=vertices.dtype)
+    for name in vertices.dtype.names:
+        field = vertices.dtype.fields[name][0]
+        mean = np.bincount(inverse, weights=vertices[name].astype(np.float64)) / counts
+        if field.kind in 'iu':
+            info = np.iinfo(field)
+            mean = np.clip(np.rint(mean), info.min, info.max)
+        result[name] = mean
+    return result
+
+
+def remove_statistical_outliers(vertices, neighbors=16, std_ratio=2.0):
+    """Drop vertices whose mean distance to their neighbours is unusually large
+
+    A vertex is kept if its mean distance to its ``neighbors`` nearest
+    neighbours is within ``std_ratio`` standard deviations of the mean
+    over the whole cloud.
+    """
+    if neighbors < 1 or len(vertices) <= neighbors:
+        return vertices
+
+    xyz = positions(vertices)
+    distances, _ = cKDTree(xyz).query(xyz, k=neighbors + 1, workers=-1)
+    mean_distances = distances[:, 1:].mean(axis=1)
+    threshold = mean_distances.mean() + std_ratio * mean_distances.std()
+    return vertices[mean_distances <= threshold]
+
+
+def clean_point_cloud(vertices, voxel_size=None, outlier_neighbors=0, outlier_std_ratio=2.0):
+    """Apply the configured post-processing steps in order"""
+    if voxel_size:
+        vertices = voxel_downsample(vertices, voxel_size)
+    if outlier_neighbors:
+        vertices = remove_statistical_outliers(vertices, outlier_neighbors, outlier_std_ratio)
+    return vertices
@@ -0,0 +1,250 @@
+"""
+Image preprocessing before feature extraction
+
+JPEGs are decoded straight at reduced resolution: libjpeg can skip most of
+the inverse DCT work when scaling by 1/2, 1/4 or 1/8 during decoding, so
+a 12 MP photo needed at 2000 px is never fully decoded. The size and EXIF
+fields come from the JPEG header, without decoding anything.
+
+Focal lengths are turned into pixel intrinsics with the sensor width of
+the camera model. The sensor width is learned once per model from images
+that have both FocalLength and FocalLengthIn35mmFilm, and kept in a small
+JSON database. Later images of that model only need FocalLength.
+"""
+import json
+import os
+import struct
+import tempfile
+import threading
+
+import cv2
+import numpy as np
+
+# Largest reduction first
+REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+# Focal length in units of the long image side when EXIF has none
+DEFAULT_FOCAL_FACTOR = 1.2
+FULL_FRAME_WIDTH_MM = 36.0
+
+# SOF markers carry the frame size (C4, C8 and CC are not frames)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8}
+_IFD0_TAGS = {0x010F: 'make', 0x0110: 'model'}
+_EXIF_TAGS = {0x920A: 'focal_length', 0xA405: 'focal_length_35mm'}
+_EXIF_IFD_POINTER = 0x8769
+
+
+def read_jpeg_info(data):
+    """Frame size and camera EXIF fields from a JPEG header
+
+    Returns a dict with any of width, height, make, model, focal_length
+    (mm) and focal_length_35mm; empty for data that is not a JPEG.
+    """
+    info = {}
+    if data[:2] != b'\xff\xd8':
+        return info
+    offset = 2
+    try:
+        while offset + 4 <= len(data):
+            if data[offset] != 0xFF:
+                break
+            marker = data[offset + 1]
+            if marker == 0xFF:
+                # Fill byte
+                offset += 1
+                continue
+            if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+                # Markers without a length
+                offset += 2
+                continue
+            if marker == 0xDA:
+                # Start of scan: the header is over
+                break
+            length = struct.unpack_from('>H', data, offset + 2)[0]
+            segment = data[offset + 4:offset + 2 + length]
+            if marker == 0xE1 and segment[:6] == b'Exif\x00\x00':
+                info.update(_parse_exif(segment[6:]))
+            elif marker in _SOF_MARKERS:
+                info['height'], info['width'] = struct.unpack_from('>HH', segment, 1)
+            offset += 2 + length
+    except struct.error:
+        pass
+    return info
+
+
+def _parse_exif(tiff):
+    try:
+        endian = {b'II': '<', b'MM': '>'}[bytes(tiff[:2])]
+        first_ifd = struct.unpack_from(endian + 'I', tiff, 4)[0]
+    except (KeyError, struct.error):
+        return {}
+
+    def read_ifd(offset, tags):
+        values = {}
+        count = struct.unpack_from(endian + 'H', tiff, offset)[0]
+        for index in range(count):
+            entry = offset + 2 + 12 * index
+            tag, kind, n = struct.unpack_from(endian + 'HHI', tiff, entry)
+            if tag not in tags or kind not in _TYPE_SIZES:
+                continue
+            size = _TYPE_SIZES[kind] * n
+            start = entry + 8
+            if size > 4:
+                start = struct.unpack_from(endian + 'I', tiff, entry + 8)[0]
+            raw = tiff[start:start + size]
+            if kind == 2:
+                value = bytes(raw).split(b'\x00', 1)[0].decode('ascii', 'replace').strip()
+            elif kind == 3:
+                value = struct.unpack_from(endian + 'H', raw)[0]
+            elif kind == 4:
+                value = struct.unpack_from(endian + 'I', raw)[0]
+            elif kind in (5, 10):
+                numerator, denominator = struct.unpack_from(
+                    endian + ('II' if kind == 5 else 'ii'), raw
+                )
+                value = numerator / denominator if denominator else None
+            else:
+                continue
+            values[tags[tag]] = value
+        return values
+
+    info = {}
+    try:
+        info.update(read_ifd(first_ifd, {**_IFD0_TAGS, _EXIF_IFD_POINTER: 'exif_ifd'}))
+        exif_ifd = info.pop('exif_ifd', None)
+        if exif_ifd:
+            info.update(read_ifd(exif_ifd, _EXIF_TAGS))
+    except struct.error:
+        pass
+    return {key: value for key, value in info.items() if value}
+
+
+def load_image(data, max_dimension=None):
+    """Decode an image with its long side at most ``max_dimension``
+
+    Returns ``(image, info)`` where info is from ``read_jpeg_info``;
+    image is None if the data cannot be decoded.
+    """
+    info = read_jpeg_info(data)
+    flags = cv2.IMREAD_COLOR
+    if max_dimension and info.get('width'):
+        long_side = max(info['width'], info['height'])
+        for factor, flag in REDUCED_FLAGS:
+            if long_side / factor >= max_dimension:
+                flags = flag
+                break
+
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+    if image is None:
+        return None, info
+    height, width = image.shape[:2]
+    if max_dimension and max(height, width) > max_dimension:
+        scale = max_dimension / max(height, width)
+        image = cv2.resize(
+            image, (max(1, round(width * scale)), max(1, round(height * scale))),
+            interpolation=cv2.INTER_AREA
+        )
+    return image, info
+
+
+def camera_key(info):
+    """'Make Model' of the camera that took an image, or None"""
+    name = ' '.join(part for part in (info.get('make'), info.get('model')) if part)
+    return name or None
+
+
+class CameraDatabase:
+    """Sensor widths per camera model, learned from EXIF and kept on disk
+
+    Each process keeps the file in memory and only reads it again for a
+    model it does not know, which another process may have learned since,
+    or one whose sensor width it is about to write. A new or changed model
+    is written back straight away; concurrent writers may drop
+    each other's entries, which only means those models are learned again
+    from their next image.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._models = None
+        self._lock = threading.Lock()
+
+    def _load(self, reload=False):
+        # Caller must hold self._lock
+        if self._models is None or reload:
+            try:
+                with open(self.path) as f:
+                    self._models = json.load(f)
+            except (OSError, ValueError):
+                self._models = self._models or {}
+        return self._models
+
+    def sensor_width(self, camera):
+        with self._lock:
+            if camera not in self._load():
+                self._load(reload=True)
+            return self._models.get(camera)
+
+    def learn(self, camera, sensor_width):
+        sensor_width = round(sensor_width, 3)
+        with self._lock:
+            if self._load().get(camera) == sensor_width:
+                return
+            # Pick up what other processes learned before writing it all back
+            models = self._load(reload=True)
+            if models.get(camera) == sensor_width:
+                return
+            models[camera] = sensor_width
+            directory = os.path.dirname(self.path) or '.'
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.json.tmp')
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(models, f, indent=2, sort_keys=True)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Failed to save camera database {self.path}: {e}")
+
+
+_databases = {}
+
+
+def camera_database(path):
+    """The CameraDatabase of ``path`` for this process"""
+    database = _databases.get(path)
+    if database is None:
+        database = _databases.setdefault(path, CameraDatabase(path))
+    return database
+
+
+def estimate_intrinsics(info, image_size, cameras=None):
+    """Pinhole intrinsics of a (possibly downscaled) image
+
+    ``image_size`` is the (width, height) of the decoded image. Returns
+    ``(fx, fy, cx, cy)`` in its pixels as float32, and whether the focal
+    length came from EXIF or is the default guess.
+    """
+    width, height = image_size
+    focal_mm = info.get('focal_length')
+    focal_35mm = info.get('focal_length_35mm')
+    camera = camera_key(info)
+
+    sensor_width = None
+    if focal_mm and focal_35mm:
+        sensor_width = FULL_FRAME_WIDTH_MM * focal_mm / focal_35mm
+        if cameras is not None and camera:
+            cameras.learn(camera, sensor_width)
+    elif focal_mm and cameras is not None and camera:
+        sensor_width = cameras.sensor_width(camera)
+
+    if focal_mm and sensor_width:
+        focal = focal_mm / sensor_width * max(width, height)
+        from_exif = True
+    else:
+        focal = DEFAULT_FOCAL_FACTOR * max(width, height)
+        from_exif = False
+    intrinsics = np.array([focal, focal, width / 2, height / 2], dtype=np.float32)
+    return intrinsics, from_exif
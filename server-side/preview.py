@@ -0,0 +1,189 @@
+"""
+Progressive point-cloud previews while a job is reconstructing
+
+The pipeline hands over points as it produces them with ``add``, which
+only takes a strided view and returns, so it never waits on encoding or
+on the network. A background thread sends each job at most ``max_rate``
+chunks per second. A chunk holds the points added since the previous one,
+subsampled to ``max_points`` and packed with ``encode_chunk``:
+
+    header   '<4sIII3f3f'  magic b'CPV2', seq, count, padding,
+                           origin xyz, scale xyz
+    xyz      count * 3 int16, interleaved; point = origin + q * scale
+    rgb      count * 3 uint8, interleaved
+    padding  zero bytes up to a multiple of 4
+
+Chunks are self-contained and only ever add points, so a viewer appends
+each one to what it already shows. The header is 40 bytes and every
+chunk is padded to a multiple of 4 bytes, so chunks can be concatenated
+(as /api/jobs/<id>/preview does) and each int16 block still viewed in
+place from JavaScript as an Int16Array. The next chunk starts at
+40 + 9 * count + padding.
+"""
+import heapq
+import math
+import struct
+import threading
+import time
+
+import numpy as np
+
+MAGIC = b'CPV2'
+HEADER = struct.Struct('<4sIII3f3f')
+QUANT_MAX = 32767
+
+
+def encode_chunk(vertices, seq):
+    """Pack points (x, y, z, red, green, blue) into a preview chunk"""
+    count = len(vertices)
+    xyz = np.stack([vertices['x'], vertices['y'], vertices['z']], axis=1).astype(np.float64)
+    if count:
+        low = xyz.min(axis=0)
+        high = xyz.max(axis=0)
+    else:
+        low = high = np.zeros(3)
+    origin = (low + high) / 2
+    scale = (high - low) / (2 * QUANT_MAX)
+    scale[scale == 0] = 1.0
+
+    quantized = np.clip(np.rint((xyz - origin) / scale), -QUANT_MAX, QUANT_MAX).astype('<i2')
+    rgb = np.stack([vertices['red'], vertices['green'], vertices['blue']], axis=1).astype('u1')
+    padding = -(HEADER.size + 9 * count) % 4
+    header = HEADER.pack(MAGIC, seq, count, padding,
+                         *origin.astype(np.float32), *scale.astype(np.float32))
+    return header + quantized.tobytes() + rgb.tobytes() + b'\x00' * padding
+
+
+def decode_chunk(data, offset=0):
+    """Inverse of encode_chunk; returns ``(seq, xyz, rgb, next offset)``"""
+    magic, seq, count, padding, *values = HEADER.unpack_from(data, offset)
+    if magic != MAGIC:
+        raise ValueError('Not a preview chunk')
+    origin = np.array(values[:3], dtype=np.float32)
+    scale = np.array(values[3:], dtype=np.float32)
+    offset += HEADER.size
+    quantized = np.frombuffer(data, dtype='<i2', count=count * 3, offset=offset).reshape(-1, 3)
+    offset += count * 6
+    rgb = np.frombuffer(data, dtype='u1', count=count * 3, offset=offset).reshape(-1, 3)
+    offset += count * 3 + padding
+    return seq, origin + quantized * scale, rgb, offset
+
+
+class _JobPreview:
+    def __init__(self):
+        self.pending = []
+        self.pending_points = 0
+        self.chunks = []
+        self.kept_points = 0
+        self.seq = 0
+        self.last_emit = 0.0
+        self.scheduled = False
+
+
+class PreviewPublisher:
+    """Throttle and subsample per-job preview points before ``emit``
+
+    ``emit(job_id, seq, data)`` is called from the background thread only.
+    The first ``max_kept_points`` points sent for a job are also kept as
+    chunks, so a viewer that joins late can fetch them with ``chunks``.
+    """
+
+    def __init__(self, emit, max_rate=1.0, max_points=20000, max_kept_points=200000):
+        self.emit = emit
+        self.interval = 1.0 / max_rate
+        self.max_points = max_points
+        self.max_kept_points = max_kept_points
+
+        self._jobs = {}
+        self._due = []
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        """Start the background send thread (idempotent)"""
+        with self._cond:
+            if self._thread:
+                return
+            self._thread = threading.Thread(
+                target=self._send_loop, name='preview-publisher', daemon=True
+            )
+            self._thread.start()
+
+    def add(self, job_id, vertices):
+        """Queue newly produced points of a job; cheap enough to call per batch"""
+        if not len(vertices):
+            return
+        # A strided view costs nothing and bounds what one call can queue
+        step = math.ceil(len(vertices) / self.max_points)
+        vertices = vertices[::step]
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                job = self._jobs[job_id] = _JobPreview()
+            job.pending.append(vertices)
+            job.pending_points += len(vertices)
+            if job.pending_points > 4 * self.max_points:
+                # Far more than one chunk: thin what is queued so far
+                step = math.ceil(job.pending_points / self.max_points)
+                job.pending = [part[::step] for part in job.pending]
+                job.pending_points = sum(len(part) for part in job.pending)
+            if not job.scheduled:
+                job.scheduled = True
+                due = max(time.monotonic(), job.last_emit + self.interval)
+                heapq.heappush(self._due, (due, job_id))
+                self._cond.notify()
+
+    def chunks(self, job_id, since=0):
+        """Kept ``(seq, data)`` chunks of a job with ``seq`` above ``since``"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return []
+            return [(seq, data) for seq, data in job.chunks if seq > since]
+
+    def discard(self, job_id):
+        """Forget a job's preview, e.g. once its real output exists"""
+        with self._cond:
+            self._jobs.pop(job_id, None)
+
+    def _send(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or not job.pending:
+                return
+            pending, job.pending, job.pending_points = job.pending, [], 0
+            job.seq += 1
+            seq = job.seq
+            job.last_emit = time.monotonic()
+
+        vertices = np.concatenate(pending)
+        if len(vertices) > self.max_points:
+            vertices = vertices[::math.ceil(len(vertices) / self.max_points)]
+        data = encode_chunk(vertices, seq)
+
+        with self._cond:
+            keep = job.kept_points + len(vertices) <= self.max_kept_points
+            if self._jobs.get(job_id) is job and keep:
+                job.chunks.append((seq, data))
+                job.kept_points += len(vertices)
+        try:
+            self.emit(job_id, seq, data)
+        except Exception as e:
+            print(f"Failed to emit preview for job {job_id}: {e}")
+
+    def _send_loop(self):
+        while True:
+            with self._cond:
+                while not self._due or self._due[0][0] > time.monotonic():
+                    timeout = self._due[0][0] - time.monotonic() if self._due else None
+                    self._cond.wait(timeout)
+                _, job_id = heapq.heappop(self._due)
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                job.scheduled = False
+
+            try:
+                self._send(job_id)
+            except Exception as e:
+                print(f"Error sending preview for job {job_id}: {e}")
@@ -0,0 +1,118 @@
+"""
+Coalesced, rate-limited job progress events
+
+Pipeline stages may report progress as often as they like. Updates are
+merged per job, and only fields whose value changed since the last event
+are sent, as a delta. Each job room gets at most ``max_rate`` events per
+second; a background thread sends whatever accumulated in between. Terminal
+states (completed / failed / cancelled) are sent immediately so clients
+never wait on the final state.
+"""
+import heapq
+import threading
+import time
+
+_MISSING = object()
+
+
+class _JobState:
+    def __init__(self):
+        self.pending = {}
+        self.sent = {}
+        self.last_emit = 0.0
+        self.scheduled = False
+
+
+class ProgressPublisher:
+    """Merge and throttle per-job updates before handing them to ``emit``
+
+    ``emit(job_id, delta)`` is called with a dict of changed fields that
+    always includes ``job_id``. Events for all jobs are emitted one at a
+    time, so a job's deltas arrive in order.
+    """
+
+    def __init__(self, emit, max_rate=2.0, terminal_statuses=('completed', 'failed', 'cancelled')):
+        self.emit = emit
+        self.interval = 1.0 / max_rate
+        self.terminal_statuses = set(terminal_statuses)
+
+        self._states = {}
+        self._due = []
+        self._cond = threading.Condition()
+        self._emit_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start the background flush thread (idempotent)"""
+        with self._cond:
+            if self._thread:
+                return
+            self._thread = threading.Thread(
+                target=self._flush_loop, name='progress-publisher', daemon=True
+            )
+            self._thread.start()
+
+    def publish(self, job_id, fields):
+        """Queue changed fields of a job; sent now or within one interval"""
+        terminal = fields.get('status') in self.terminal_statuses
+        with self._cond:
+            state = self._states.get(job_id)
+            if state is None:
+                state = self._states[job_id] = _JobState()
+
+            for key, value in fields.items():
+                if state.sent.get(key, _MISSING) == value:
+                    # Back to the value clients already have
+                    state.pending.pop(key, None)
+                else:
+                    state.pending[key] = value
+
+            if not state.pending:
+                return
+            if not terminal and time.monotonic() - state.last_emit < self.interval:
+                if not state.scheduled:
+                    state.scheduled = True
+                    heapq.heappush(self._due, (state.last_emit + self.interval, job_id))
+                    self._cond.notify()
+                return
+
+        self._flush(job_id, terminal)
+
+    def discard(self, job_id):
+        """Drop any unsent updates of a job"""
+        with self._cond:
+            self._states.pop(job_id, None)
+
+    def _flush(self, job_id, terminal=False):
+        with self._emit_lock:
+            with self._cond:
+                state = self._states.get(job_id)
+                if state is None or not state.pending:
+                    return
+                delta = state.pending
+                state.pending = {}
+                state.sent.update(delta)
+                state.last_emit = time.monotonic()
+                if terminal:
+                    # Nothing follows a terminal state; don't keep its history
+                    del self._states[job_id]
+
+            delta['job_id'] = job_id
+            try:
+                self.emit(job_id, delta)
+            except Exception as e:
+                print(f"Failed to emit progress for job {job_id}: {e}")
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._due or self._due[0][0] > time.monotonic():
+                    timeout = self._due[0][0] - time.monotonic() if self._due else None
+                    self._cond.wait(timeout)
+                _, job_id = heapq.heappop(self._due)
+                state = self._states.get(job_id)
+                if state is None:
+                    continue
+                state.scheduled = False
+
+            self._flush(job_id)
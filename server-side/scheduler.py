@@ -0,0 +1,255 @@
+"""
+Bounded worker-pool scheduler for dataset processing jobs
+
+A fixed number of worker threads pull jobs from a bounded priority queue,
+so a burst of uploads queues up instead of spawning one reconstruction
+thread per job. SharedJobQueue offers the same interface on top of the
+job store for deployments where separate worker processes run the jobs.
+"""
+import heapq
+import itertools
+import threading
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class JobScheduler:
+    """Run submitted jobs on a fixed pool of worker threads
+
+    Jobs with a higher priority run first; jobs with equal priority run in
+    submission order. ``on_queue_change`` is called with a list of queued
+    job IDs (in run order) whenever the queue changes, so callers can
+    publish queue positions.
+    """
+
+    def __init__(self, num_workers=2, max_queue_size=20, on_queue_change=None):
+        self.num_workers = max(1, int(num_workers))
+        self.max_queue_size = max(1, int(max_queue_size))
+        self.on_queue_change = on_queue_change
+
+        self._heap = []
+        self._entries = {}
+        self._running = {}  # job_id -> priority
+        self._preempting = set()  # running jobs already chosen for preemption
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._workers = []
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        with self._cond:
+            if self._workers:
+                return
+            for i in range(self.num_workers):
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    name=f'job-worker-{i}',
+                    daemon=True
+                )
+                self._workers.append(worker)
+                worker.start()
+
+    def submit(self, job_id, target, args=(), priority=0, force=False):
+        """Queue ``target(*args)`` for execution
+
+        Raises QueueFullError if the queue is already at capacity, unless
+        ``force`` is set (used to put a preempted job back).
+        """
+        with self._cond:
+            if not force and len(self._entries) >= self.max_queue_size:
+                raise QueueFullError(
+                    f'Processing queue is full ({self.max_queue_size} jobs waiting)'
+                )
+            entry = [-int(priority), next(self._counter), job_id, target, args]
+            self._entries[job_id] = entry
+            heapq.heappush(self._heap, entry)
+            self._cond.notify()
+            queued = self._queued_ids()
+
+        self._notify_queue_change(queued)
+
+    def cancel(self, job_id):
+        """Remove a job from the queue
+
+        Returns the args it was submitted with, or None if it is not queued.
+        """
+        with self._cond:
+            entry = self._entries.pop(job_id, None)
+            if entry is None:
+                return None
+            self._heap.remove(entry)
+            heapq.heapify(self._heap)
+            queued = self._queued_ids()
+
+        self._notify_queue_change(queued)
+        return entry[4]
+
+    def reprioritize(self, job_id, priority):
+        """Change the priority of a queued job; returns False if it is not queued"""
+        with self._cond:
+            entry = self._entries.get(job_id)
+            if entry is None:
+                return False
+            entry[0] = -int(priority)
+            heapq.heapify(self._heap)
+            queued = self._queued_ids()
+
+        self._notify_queue_change(queued)
+        return True
+
+    def preemption_candidate(self, priority):
+        """Running job to preempt so a job of ``priority`` can start now
+
+        Returns the lowest-priority running job if every worker is busy and
+        that job's priority is lower, otherwise None. A preempted job keeps
+        its worker until its next checkpoint, so a returned job is not
+        returned again until its worker is free.
+        """
+        with self._cond:
+            if len(self._running) < self.num_workers:
+                return None
+            candidates = [job_id for job_id in self._running if job_id not in self._preempting]
+            if not candidates:
+                return None
+            job_id = min(candidates, key=self._running.get)
+            if self._running[job_id] < int(priority):
+                self._preempting.add(job_id)
+                return job_id
+            return None
+
+    def is_full(self):
+        """Return True if a submit would currently be rejected"""
+        with self._cond:
+            return len(self._entries) >= self.max_queue_size
+
+    def depth(self):
+        """Number of jobs waiting for a worker"""
+        with self._cond:
+            return len(self._entries)
+
+    def position(self, job_id):
+        """1-based queue position of a waiting job, or None"""
+        with self._cond:
+            queued = self._queued_ids()
+        try:
+            return queued.index(job_id) + 1
+        except ValueError:
+            return None
+
+    def stats(self):
+        """Snapshot of scheduler state for status endpoints"""
+        with self._cond:
+            return {
+                'workers': self.num_workers,
+                'active': len(self._running),
+                'queued': len(self._entries),
+                'max_queue_size': self.max_queue_size
+            }
+
+    def _queued_ids(self):
+        # Caller must hold self._cond. The queue is bounded, so sorting a
+        # copy of the heap is cheap.
+        return [entry[2] for entry in sorted(self._heap)]
+
+    def _notify_queue_change(self, queued):
+        if self.on_queue_change:
+            try:
+                self.on_queue_change(queued)
+            except Exception as e:
+                print(f"Error publishing queue positions: {e}")
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                entry = heapq.heappop(self._heap)
+                negative_priority, _, job_id, target, args = entry
+                del self._entries[job_id]
+                self._running[job_id] = -negative_priority
+                queued = self._queued_ids()
+
+            self._notify_queue_change(queued)
+
+            try:
+                target(*args)
+            except Exception as e:
+                print(f"Unhandled error in job {job_id}: {e}")
+            finally:
+                with self._cond:
+                    self._running.pop(job_id, None)
+                    self._preempting.discard(job_id)
+
+
+class SharedJobQueue:
+    """Scheduler interface backed by the shared job store
+
+    Used when reconstruction runs in separate worker processes (see
+    worker.py). ``submit`` only records the job's arguments in the store;
+    the worker processes claim and run them, so any web process can queue
+    jobs and report queue state.
+    """
+
+    def __init__(self, job_store, max_queue_size=20, on_queue_change=None):
+        self.job_store = job_store
+        self.max_queue_size = max(1, int(max_queue_size))
+        self.on_queue_change = on_queue_change
+
+    def start(self):
+        """Nothing to start; jobs run in the worker processes"""
+
+    def submit(self, job_id, target, args=(), priority=0, force=False):
+        """Queue a stored job for the worker processes
+
+        ``target`` is not sent anywhere: workers always run the dataset
+        pipeline, with ``args`` as stored here. Raises QueueFullError if
+        the queue is already at capacity, unless ``force`` is set.
+        """
+        max_queue_size = None if force else self.max_queue_size
+        if not self.job_store.enqueue(job_id, list(args), priority, max_queue_size):
+            raise QueueFullError(
+                f'Processing queue is full ({self.max_queue_size} jobs waiting)'
+            )
+        self.notify_queue_change()
+
+    def cancel(self, job_id):
+        task = self.job_store.dequeue(job_id)
+        if task is not None:
+            self.notify_queue_change()
+        return task
+
+    def reprioritize(self, job_id, priority):
+        if not self.job_store.set_queued_priority(job_id, priority):
+            return False
+        self.notify_queue_change()
+        return True
+
+    def preemption_candidate(self, priority):
+        """Always None: worker capacity is not visible from here"""
+        return None
+
+    def is_full(self):
+        return self.job_store.queue_depth() >= self.max_queue_size
+
+    def depth(self):
+        return self.job_store.queue_depth()
+
+    def position(self, job_id):
+        try:
+            return self.job_store.queued_job_ids().index(job_id) + 1
+        except ValueError:
+            return None
+
+    def stats(self):
+        stats = self.job_store.queue_stats()
+        stats.update({'queued': self.depth(), 'max_queue_size': self.max_queue_size})
+        return stats
+
+    def notify_queue_change(self):
+        if self.on_queue_change:
+            try:
+                self.on_queue_change(self.job_store.queued_job_ids())
+            except Exception as e:
+                print(f"Error publishing queue positions: {e}")
@@ -0,0 +1,294 @@
+"""
+Gaussian-splat exports (.splat and .ksplat)
+
+The viewer's gaussian-splats-3d library loads its own compact formats much
+faster than a float PLY. Vertices are decoded into linear splat attributes
+once and then quantized in bulk with NumPy:
+
+* ``.splat`` - 32 bytes per splat: float32 position and scale, RGBA bytes
+  and a byte-quantized rotation, ordered by visual importance.
+* ``.ksplat`` - the library's bucketed format. At compression level 1 or 2
+  positions are 16-bit offsets from the centre of their bucket, scales and
+  rotations are half floats, and spherical harmonics are half floats
+  (level 1) or bytes (level 2), truncated to at most degree 2.
+
+Plain coloured point clouds are exported as isotropic splats sized from
+the typical spacing between points.
+"""
+import os
+import tempfile
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from postprocess import positions
+
+EXPORT_FORMATS = ('splat', 'ksplat')
+SH_C0 = 0.28209479177387814
+MAX_SH_DEGREE = 2  # Highest degree the .ksplat format stores
+
+SPLAT_DTYPE = np.dtype([
+    ('position', '<f4', 3), ('scale', '<f4', 3), ('color', 'u1', 4), ('rotation', 'u1', 4),
+])
+
+KSPLAT_HEADER_SIZE = 4096
+KSPLAT_SECTION_HEADER_SIZE = 1024
+KSPLAT_BUCKET_STORAGE_SIZE = 12
+KSPLAT_SCALE_RANGE = 32767
+KSPLAT_SH_RANGE = 1.5  # Default 8-bit SH range used by the viewer
+
+
+def export_path(output_path, fmt):
+    return os.path.splitext(output_path)[0] + '.' + fmt
+
+
+def _sh_fields(names, degree):
+    """f_rest_* names in the viewer's order: per degree, all of R, then G, then B"""
+    rest_count = sum(1 for name in names if name.startswith('f_rest_'))
+    per_channel = rest_count // 3
+    fields = []
+    if degree >= 1:
+        fields += [f'f_rest_{i + per_channel * rgb}' for rgb in range(3) for i in range(3)]
+    if degree >= 2:
+        fields += [f'f_rest_{i + per_channel * rgb + 3}' for rgb in range(3) for i in range(5)]
+    return fields
+
+
+def available_sh_degree(names):
+    per_channel = sum(1 for name in names if name.startswith('f_rest_')) // 3
+    return 2 if per_channel >= 8 else 1 if per_channel >= 3 else 0
+
+
+def splat_attributes(vertices, sh_degree=0, default_scale=None):
+    """Decode PLY vertices into linear splat attributes
+
+    Returns a dict of ``positions`` (N, 3), ``scales`` (N, 3, linear),
+    ``rotations`` (N, 4, normalized w x y z), ``colors`` (N, 4 uint8 RGBA)
+    and ``sh`` (N, K) higher-order coefficients, truncated to
+    ``sh_degree``.
+    """
+    names = vertices.dtype.names
+    count = len(vertices)
+    xyz = positions(vertices).astype(np.float32)
+
+    if 'scale_0' in names:
+        scales = np.exp(np.column_stack(
+            [vertices[f'scale_{i}'] for i in range(3)]
+        ).astype(np.float32))
+    else:
+        if default_scale is None:
+            default_scale = _point_spacing(xyz)
+        scales = np.full((count, 3), default_scale, dtype=np.float32)
+
+    if 'rot_0' in names:
+        rotations = np.column_stack([vertices[f'rot_{i}'] for i in range(4)]).astype(np.float32)
+        norms = np.linalg.norm(rotations, axis=1, keepdims=True)
+        rotations = np.where(norms > 0, rotations / np.maximum(norms, 1e-12), [1, 0, 0, 0])
+    else:
+        rotations = np.tile(np.array([1, 0, 0, 0], dtype=np.float32), (count, 1))
+
+    colors = np.empty((count, 4), dtype=np.uint8)
+    if 'f_dc_0' in names:
+        dc = np.column_stack([vertices[f'f_dc_{i}'] for i in range(3)]).astype(np.float32)
+        colors[:, :3] = np.clip(np.floor((0.5 + SH_C0 * dc) * 255), 0, 255)
+    elif 'red' in names:
+        colors[:, :3] = np.column_stack([vertices['red'], vertices['green'], vertices['blue']])
+    else:
+        colors[:, :3] = 255
+    if 'opacity' in names:
+        alpha = 1 / (1 + np.exp(-vertices['opacity'].astype(np.float32)))
+        colors[:, 3] = np.clip(np.floor(alpha * 255), 0, 255)
+    else:
+        colors[:, 3] = 255
+
+    sh_degree = min(sh_degree, available_sh_degree(names), MAX_SH_DEGREE)
+    fields = _sh_fields(names, sh_degree)
+    if fields:
+        sh = np.column_stack([vertices[name] for name in fields]).astype(np.float32)
+    else:
+        sh = np.zeros((count, 0), dtype=np.float32)
+
+    return {
+        'positions': xyz,
+        'scales': scales,
+        'rotations': rotations.astype(np.float32),
+        'colors': colors,
+        'sh': sh,
+        'sh_degree': sh_degree
+    }
+
+
+def _point_spacing(xyz, sample_size=10000):
+    """Half the median nearest-neighbour distance, from a sample of points"""
+    if len(xyz) < 2:
+        return 0.01
+    rng = np.random.default_rng(0)
+    sample = xyz[rng.choice(len(xyz), min(sample_size, len(xyz)), replace=False)]
+    distances, _ = cKDTree(xyz).query(sample, k=2, workers=-1)
+    spacing = float(np.median(distances[:, 1])) / 2
+    return spacing if spacing > 0 else 0.01
+
+
+def _write_atomic(path, chunks):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_splat(path, attributes):
+    """Write attributes as a .splat file, most visible splats first"""
+    scales, colors = attributes['scales'], attributes['colors']
+    importance = scales.prod(axis=1) * (colors[:, 3] / 255.0)
+    order = np.argsort(-importance, kind='stable')
+
+    records = np.empty(len(order), dtype=SPLAT_DTYPE)
+    records['position'] = attributes['positions'][order]
+    records['scale'] = scales[order]
+    records['color'] = colors[order]
+    records['rotation'] = np.clip(
+        np.round(attributes['rotations'][order] * 128 + 128), 0, 255
+    )
+    _write_atomic(path, [records.tobytes()])
+    return path
+
+
+def _buckets(xyz, block_size, bucket_size):
+    """Group splats into buckets of at most ``bucket_size`` per spatial block
+
+    Returns the splat order, bucket centres, the number of full buckets and
+    the lengths of the partially filled ones (which follow the full ones).
+    """
+    if not len(xyz):
+        return np.arange(0), np.zeros((0, 3), np.float32), 0, np.zeros(0, np.uint32)
+
+    lower = xyz.min(axis=0)
+    blocks = np.floor((xyz - lower) / block_size).astype(np.int64)
+    _, block_ids = np.unique(blocks, axis=0, return_inverse=True)
+    block_ids = block_ids.ravel()
+    order = np.argsort(block_ids, kind='stable')
+    sorted_ids = block_ids[order]
+
+    starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+    counts = np.diff(np.r_[starts, len(sorted_ids)])
+    rank = np.arange(len(order)) - np.repeat(starts, counts)
+    chunk = rank // bucket_size
+    full_chunks = np.repeat(counts // bucket_size, counts)
+    is_full = chunk < full_chunks
+
+    # Full buckets first, each holding exactly bucket_size splats
+    full_order = order[is_full]
+    partial_order = order[~is_full]
+    full_blocks = blocks[full_order][::bucket_size]
+    partial_starts = np.flatnonzero(~is_full & (rank % bucket_size == 0))
+    partial_lengths = (counts % bucket_size)[counts % bucket_size > 0].astype(np.uint32)
+    partial_blocks = blocks[order[partial_starts]]
+
+    bucket_blocks = np.concatenate([full_blocks, partial_blocks])
+    centers = (bucket_blocks * block_size + lower + block_size / 2).astype(np.float32)
+    return (np.concatenate([full_order, partial_order]), centers,
+            len(full_blocks), partial_lengths)
+
+
+def write_ksplat(path, attributes, compression_level=1, block_size=5.0, bucket_size=256):
+    """Write attributes as a single-section .ksplat file"""
+    if compression_level not in (0, 1, 2):
+        raise ValueError('compression_level must be 0, 1 or 2')
+    xyz = attributes['positions']
+    sh = attributes['sh']
+    sh_degree = attributes['sh_degree']
+    count = len(xyz)
+
+    sh_min, sh_max = -KSPLAT_SH_RANGE, KSPLAT_SH_RANGE
+    if sh.size and sh.min() < sh.max():
+        sh_min, sh_max = float(sh.min()), float(sh.max())
+
+    if compression_level == 0:
+        order = np.arange(count)
+        centers = np.zeros((0, 3), np.float32)
+        full_count, partial_lengths = 0, np.zeros(0, np.uint32)
+        dtype = np.dtype([('position', '<f4', 3), ('scale', '<f4', 3),
+                          ('rotation', '<f4', 4), ('color', 'u1', 4),
+                          ('sh', '<f4', sh.shape[1])])
+    else:
+        order, centers, full_count, partial_lengths = _buckets(xyz, block_size, bucket_size)
+        sh_type = '<f2' if compression_level == 1 else 'u1'
+        dtype = np.dtype([('position', '<u2', 3), ('scale', '<f2', 3),
+                          ('rotation', '<f2', 4), ('color', 'u1', 4),
+                          ('sh', sh_type, sh.shape[1])])
+
+    records = np.zeros(count, dtype=dtype)
+    records['color'] = attributes['colors'][order]
+    if compression_level == 0:
+        records['position'] = xyz[order]
+        records['scale'] = attributes['scales'][order]
+        records['rotation'] = attributes['rotations'][order]
+        records['sh'] = sh[order]
+    else:
+        bucket_of_splat = np.concatenate([
+            np.repeat(np.arange(full_count), bucket_size),
+            np.repeat(np.arange(full_count, full_count + len(partial_lengths)), partial_lengths)
+        ]).astype(np.int64)
+        factor = KSPLAT_SCALE_RANGE / (block_size / 2)
+        offsets = np.round((xyz[order] - centers[bucket_of_splat]) * factor) + KSPLAT_SCALE_RANGE
+        records['position'] = np.clip(offsets, 0, 2 * KSPLAT_SCALE_RANGE + 1)
+        records['scale'] = np.clip(attributes['scales'][order], 0, np.finfo(np.float16).max)
+        records['rotation'] = attributes['rotations'][order]
+        if compression_level == 1:
+            records['sh'] = sh[order]
+        else:
+            scaled = (np.clip(sh[order], sh_min, sh_max) - sh_min) / (sh_max - sh_min)
+            records['sh'] = np.clip(np.floor(scaled * 255), 0, 255)
+
+    bucket_data = b''
+    if compression_level >= 1:
+        bucket_data = partial_lengths.astype('<u4').tobytes() + centers.astype('<f4').tobytes()
+    section_size = len(bucket_data) + records.nbytes
+
+    header = bytearray(KSPLAT_HEADER_SIZE)
+    header[0], header[1] = 0, 1  # version 0.1
+    scene_center = xyz.mean(axis=0) if count else np.zeros(3)
+    np.frombuffer(header, '<u4')[1:5] = [1, 1, count, count]
+    np.frombuffer(header, '<u2')[10] = compression_level
+    np.frombuffer(header, '<f4')[6:11] = [*scene_center, sh_min, sh_max]
+
+    section = bytearray(KSPLAT_SECTION_HEADER_SIZE)
+    section_u32 = np.frombuffer(section, '<u4')
+    section_u32[0:2] = [count, count]
+    if compression_level >= 1:
+        section_u32[2:4] = [bucket_size, len(centers)]
+        np.frombuffer(section, '<f4')[4] = block_size
+        np.frombuffer(section, '<u2')[10] = KSPLAT_BUCKET_STORAGE_SIZE
+        section_u32[6] = KSPLAT_SCALE_RANGE
+        section_u32[8:10] = [full_count, len(partial_lengths)]
+    section_u32[7] = section_size
+    np.frombuffer(section, '<u2')[20] = sh_degree
+
+    _write_atomic(path, [bytes(header), bytes(section), bucket_data, records.tobytes()])
+    return path
+
+
+def export_splats(vertices, output_path, formats=EXPORT_FORMATS, sh_degree=0,
+                  compression_level=1):
+    """Write the requested splat formats next to a PLY output
+
+    Returns {format: path}.
+    """
+    attributes = splat_attributes(vertices, sh_degree=sh_degree)
+    exported = {}
+    for fmt in formats:
+        path = export_path(output_path, fmt)
+        if fmt == 'splat':
+            write_splat(path, attributes)
+        elif fmt == 'ksplat':
+            write_ksplat(path, attributes, compression_level=compression_level)
+        else:
+            raise ValueError(f'Unknown splat format: {fmt}')
+        exported[fmt] = path
+    return exported
@@ -0,0 +1,180 @@
+"""
+Disk usage accounting and quota enforcement for the data folders
+
+The manager keeps a running byte count per folder: files are tracked when
+they are written and untracked when they are removed, so checking a
+budget never walks a directory. A background thread compares each folder
+with its budget and, when it is over, calls that folder's evictor to free
+the excess. The folders are scanned once at startup and then only every
+``rescan_interval`` seconds, to pick up files written by other processes
+(e.g. worker.py) or behind the server's back.
+
+Hard links (reused outputs) are counted once per inode. Only files
+directly inside a folder are counted; subdirectories such as the chunked
+upload sessions manage their own lifetime.
+"""
+import os
+import threading
+import time
+
+
+class StorageManager:
+    """Track per-folder disk usage and evict once a folder is over budget
+
+    ``folders`` maps a name to a directory and ``budgets`` maps names to a
+    byte limit (None for no limit). ``set_evictor(name, fn)`` registers
+    ``fn(excess_bytes)``, which should delete files through ``remove``
+    until at least ``excess_bytes`` are freed.
+    """
+
+    def __init__(self, folders, budgets=None, check_interval=30, rescan_interval=3600):
+        self.folders = {name: os.path.abspath(path) for name, path in folders.items()}
+        self.budgets = dict(budgets or {})
+        self.check_interval = check_interval
+        self.rescan_interval = rescan_interval
+
+        self._files = {}  # path -> (folder name, inode key, size, mtime)
+        self._links = {}  # inode key -> number of tracked paths
+        self._usage = {name: 0 for name in self.folders}
+        self._evictors = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def set_evictor(self, name, evict):
+        self._evictors[name] = evict
+
+    def start(self):
+        """Scan the folders and start the background thread (idempotent)"""
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='storage-manager', daemon=True
+            )
+        self._thread.start()
+
+    def folder_of(self, path):
+        """Name of the tracked folder directly containing ``path``, or None"""
+        directory = os.path.dirname(os.path.abspath(path))
+        for name, folder in self.folders.items():
+            if directory == folder:
+                return name
+        return None
+
+    def track(self, path):
+        """Count a newly written file (no-op outside the tracked folders)"""
+        name = self.folder_of(path)
+        if name is None:
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        with self._lock:
+            self._untrack(os.path.abspath(path))
+            self._track(os.path.abspath(path), name, stat)
+        budget = self.budgets.get(name)
+        if budget is not None and self._usage[name] > budget:
+            self._wakeup.set()
+
+    def remove(self, path):
+        """Delete a file and stop counting it; missing files are ignored"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._untrack(os.path.abspath(path))
+
+    def usage(self, name):
+        with self._lock:
+            return self._usage[name]
+
+    def files(self, name):
+        """Tracked files of a folder as (mtime, path, size), oldest first"""
+        with self._lock:
+            entries = [(mtime, path, size)
+                       for path, (folder, _, size, mtime) in self._files.items()
+                       if folder == name]
+        return sorted(entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: {
+                    'bytes': self._usage[name],
+                    'budget': self.budgets.get(name),
+                    'files': sum(1 for entry in self._files.values() if entry[0] == name)
+                }
+                for name in self.folders
+            }
+
+    def request_check(self):
+        """Check the budgets now instead of at the next interval"""
+        self._wakeup.set()
+
+    def _track(self, path, name, stat):
+        # Caller must hold self._lock
+        key = (stat.st_dev, stat.st_ino)
+        self._files[path] = (name, key, stat.st_size, stat.st_mtime)
+        self._links[key] = self._links.get(key, 0) + 1
+        if self._links[key] == 1:
+            self._usage[name] += stat.st_size
+
+    def _untrack(self, path):
+        # Caller must hold self._lock
+        entry = self._files.pop(path, None)
+        if entry is None:
+            return
+        name, key, size, _ = entry
+        self._links[key] -= 1
+        if not self._links[key]:
+            del self._links[key]
+            self._usage[name] -= size
+
+    def rescan(self):
+        """Rebuild the counts from the folders' contents"""
+        scanned = []
+        for name, folder in self.folders.items():
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_file(follow_symlinks=False):
+                                scanned.append((entry.path, name, entry.stat()))
+                        except OSError:
+                            continue
+            except OSError as e:
+                print(f"Error scanning {folder}: {e}")
+
+        with self._lock:
+            self._files = {}
+            self._links = {}
+            self._usage = {name: 0 for name in self.folders}
+            for path, name, stat in scanned:
+                self._track(path, name, stat)
+
+    def enforce(self):
+        """Run the evictor of every folder that is over its budget"""
+        for name, budget in self.budgets.items():
+            evict = self._evictors.get(name)
+            if budget is None or evict is None:
+                continue
+            excess = self.usage(name) - budget
+            if excess <= 0:
+                continue
+            try:
+                evict(excess)
+            except Exception as e:
+                print(f"Error evicting from {name}: {e}")
+
+    def _run(self):
+        last_scan = None
+        while True:
+            if last_scan is None or time.monotonic() - last_scan >= self.rescan_interval:
+                self.rescan()
+                last_scan = time.monotonic()
+            self.enforce()
+            self._wakeup.wait(self.check_interval)
+            self._wakeup.clear()
@@ -0,0 +1,225 @@
+"""
+Octree level-of-detail tiles for progressive point cloud loading
+
+A finished cloud is partitioned into an octree. Every node keeps a random
+subsample of the points inside its cell and passes the rest on to its
+eight children, so a viewer can draw the root tile straight away and
+refine by fetching deeper tiles; the union of all tiles is the full cloud.
+
+Tiles of one cloud are stored back to back in a single binary file
+(``<output>.tiles``) with a JSON index (``<output>.tiles.json``) holding
+each tile's offset and point count. Nodes are addressed by level and by
+the Morton code of their cell at that level, so the children of node
+``n`` at level ``L`` are nodes ``8n .. 8n+7`` at level ``L + 1``.
+"""
+import collections
+import json
+import mmap
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from ply_writer import little_endian_dtype
+from postprocess import positions
+
+TILES_SUFFIX = '.tiles'
+INDEX_SUFFIX = '.tiles.json'
+MAX_DEPTH_LIMIT = 10  # 3 * 10 bits of Morton code per point
+
+
+def tiles_path(output_path):
+    return output_path + TILES_SUFFIX
+
+
+def index_path(output_path):
+    return output_path + INDEX_SUFFIX
+
+
+def tile_files(output_path):
+    """Paths of the tile data and index files that exist for an output"""
+    return [path for path in (tiles_path(output_path), index_path(output_path))
+            if os.path.exists(path)]
+
+
+def _spread_bits(values):
+    """Insert two zero bits between each of the low 10 bits"""
+    values = values.astype(np.uint64) & np.uint64(0x3ff)
+    values = (values | (values << np.uint64(16))) & np.uint64(0x30000ff)
+    values = (values | (values << np.uint64(8))) & np.uint64(0x300f00f)
+    values = (values | (values << np.uint64(4))) & np.uint64(0x30c30c3)
+    values = (values | (values << np.uint64(2))) & np.uint64(0x9249249)
+    return values
+
+
+def morton_codes(points, origin, size, depth):
+    """Morton code of each point's cell at ``depth`` in the cube (origin, size)"""
+    cells = 1 << depth
+    scaled = (points - origin) / size * cells
+    grid = np.clip(np.floor(scaled), 0, cells - 1).astype(np.uint64)
+    return (_spread_bits(grid[:, 0]) << np.uint64(2) |
+            _spread_bits(grid[:, 1]) << np.uint64(1) |
+            _spread_bits(grid[:, 2]))
+
+
+def octree_depth(count, points_per_tile, max_depth):
+    """Shallowest depth at which leaves hold about ``points_per_tile`` points"""
+    depth = 0
+    while depth < max_depth and count > points_per_tile * 8 ** depth:
+        depth += 1
+    return depth
+
+
+def build_tiles(vertices, output_path, points_per_tile=20000, max_depth=8, seed=0):
+    """Partition a structured vertex array into octree tiles
+
+    Writes the tile data and index next to ``output_path`` and returns
+    the index.
+    """
+    vertices = np.asarray(vertices)
+    max_depth = min(max_depth, MAX_DEPTH_LIMIT)
+    xyz = positions(vertices)
+
+    if len(xyz):
+        lower, upper = xyz.min(axis=0), xyz.max(axis=0)
+    else:
+        lower = upper = np.zeros(3)
+    size = float(max((upper - lower).max(), 1e-9))
+    depth = octree_depth(len(vertices), points_per_tile, max_depth)
+
+    # Shuffle once so the first points of every cell are a random subsample
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(vertices))
+    codes = morton_codes(xyz[order], lower, size, depth)
+
+    nodes = []
+    selected = []
+    remaining = np.arange(len(order))
+    for level in range(depth + 1):
+        if not len(remaining):
+            break
+        node_ids = codes[remaining] >> np.uint64(3 * (depth - level))
+        # A stable sort groups points by cell and keeps the random order inside each
+        grouping = np.argsort(node_ids, kind='stable')
+        remaining, node_ids = remaining[grouping], node_ids[grouping]
+
+        starts = np.flatnonzero(np.r_[True, node_ids[1:] != node_ids[:-1]])
+        counts = np.diff(np.r_[starts, len(node_ids)])
+        if level == depth:
+            take = np.ones(len(remaining), dtype=bool)
+        else:
+            rank = np.arange(len(remaining)) - np.repeat(starts, counts)
+            take = rank < points_per_tile
+
+        kept_ids = node_ids[take]
+        kept_starts = np.flatnonzero(np.r_[True, kept_ids[1:] != kept_ids[:-1]])
+        kept_counts = np.diff(np.r_[kept_starts, len(kept_ids)])
+        for node_id, count in zip(kept_ids[kept_starts], kept_counts):
+            nodes.append([level, int(node_id), int(count)])
+        selected.append(remaining[take])
+        remaining = remaining[~take]
+
+    file_dtype = little_endian_dtype(vertices.dtype)
+    point_size = file_dtype.itemsize
+    offset = 0
+    for node in nodes:
+        node.insert(2, offset)
+        offset += node[3] * point_size
+
+    index = {
+        'version': 1,
+        'points': int(len(vertices)),
+        'depth': depth,
+        'points_per_tile': points_per_tile,
+        'origin': [float(v) for v in lower],
+        'size': size,
+        'point_size': point_size,
+        'fields': [[name, file_dtype.fields[name][0].str[1:]] for name in file_dtype.names],
+        # [level, node, byte offset, point count]
+        'nodes': nodes
+    }
+
+    data_path = tiles_path(output_path)
+    directory = os.path.dirname(data_path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for indices in selected:
+                f.write(vertices[order[indices]].astype(file_dtype, copy=False).tobytes())
+        os.replace(tmp_path, data_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path(output_path))
+    return index
+
+
+class TileSet:
+    """Memory-mapped tiles of one output"""
+
+    def __init__(self, output_path):
+        with open(index_path(output_path)) as f:
+            self.index = json.load(f)
+        self.nodes = {(level, node): (offset, count)
+                      for level, node, offset, count in self.index['nodes']}
+        self.point_size = self.index['point_size']
+
+        self._mmap = None
+        with open(tiles_path(output_path), 'rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def tile(self, level, node):
+        """Raw little-endian vertex records of a tile and their count, or None"""
+        entry = self.nodes.get((level, node))
+        if entry is None:
+            return None
+        offset, count = entry
+        if not count:
+            return b'', 0
+        return self._mmap[offset:offset + count * self.point_size], count
+
+
+class TileCache:
+    """Keep the most recently used tile sets open"""
+
+    def __init__(self, capacity=32):
+        self.capacity = capacity
+        self._tile_sets = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, output_path):
+        """Open (or reuse) the tile set of an output; None if it has no tiles"""
+        try:
+            key = (output_path, os.path.getmtime(index_path(output_path)))
+        except OSError:
+            return None
+
+        with self._lock:
+            tile_set = self._tile_sets.get(key)
+            if tile_set is not None:
+                self._tile_sets.move_to_end(key)
+                return tile_set
+
+            try:
+                tile_set = TileSet(output_path)
+            except (OSError, ValueError):
+                return None
+            self._tile_sets[key] = tile_set
+            while len(self._tile_sets) > self.capacity:
+                # Not closed explicitly: a request may still be reading it, and
+                # the mapping is released with the last reference
+                self._tile_sets.popitem(last=False)
+            return tile_set
+
+    def discard(self, output_path):
+        """Drop any open tile set of an output, e.g. before deleting it"""
+        with self._lock:
+            for key in [key for key in self._tile_sets if key[0] == output_path]:
+                del self._tile_sets[key]
@@ -0,0 +1,257 @@
+"""
+Per-job span traces
+
+A Trace records a tree of spans for one job: a root span for the whole
+job, one span per pipeline stage, and optional child spans inside a stage.
+Each span keeps its wall time, the CPU time of the job's thread and of the
+whole process, memory, and whatever counts (bytes, images, pairs) the
+stage adds. Work done in the shared process pools is not attributed to a
+job's CPU time; it shows up as wall time.
+
+Memory is the process's current RSS, sampled when a span starts and ends
+and whenever counts are added to it or a child span ends: a span records
+its RSS at the end, the change since its start and the highest sample
+taken while it was open. RSS is shared by concurrent jobs, so this shows
+which stage grew memory rather than exactly how much each job used. The
+root span also records the process-lifetime peak.
+
+``to_chrome`` exports the trace in the Chrome trace-event format, which
+chrome://tracing and https://ui.perfetto.dev open directly.
+"""
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def current_rss_mb():
+    """Resident set size of this process right now in MiB, or None if unknown"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * _PAGE_SIZE / (1024 * 1024)
+
+
+def process_peak_rss_mb():
+    """Peak resident set size over this process's lifetime in MiB, or None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class Span:
+    """One timed section of a job"""
+
+    def __init__(self, name, parent=None, **args):
+        self.name = name
+        self.parent = parent
+        self.args = dict(args)
+        self.children = []
+        self.start = time.time()
+        self.end = None
+        self._perf_start = time.perf_counter()
+        self._thread_cpu_start = time.thread_time()
+        self._process_cpu_start = time.process_time()
+        self.duration = None
+        self.thread_cpu = None
+        self.process_cpu = None
+        self.rss_start_mb = self.rss_high_mb = current_rss_mb()
+        self.rss_mb = None
+
+    def add(self, **counts):
+        """Add to numeric counts of this span (e.g. bytes=...)"""
+        for key, value in counts.items():
+            self.args[key] = self.args.get(key, 0) + value
+        self.sample_rss()
+
+    def sample_rss(self, rss=None):
+        """Raise the RSS high-water mark of this span and its parents"""
+        rss = current_rss_mb() if rss is None else rss
+        if rss is None:
+            return None
+        span = self
+        while span is not None:
+            if span.end is None and (span.rss_high_mb is None or rss > span.rss_high_mb):
+                span.rss_high_mb = rss
+            span = span.parent
+        return rss
+
+    def finish(self):
+        if self.end is not None:
+            return
+        self.duration = time.perf_counter() - self._perf_start
+        self.end = self.start + self.duration
+        self.thread_cpu = time.thread_time() - self._thread_cpu_start
+        self.process_cpu = time.process_time() - self._process_cpu_start
+        self.rss_mb = self.sample_rss()
+
+
+class Trace:
+    """Span tree of one job
+
+    ``stage(name)`` starts a pipeline stage and ends the previous one, so
+    stages never overlap (except streamed ones, see ``timed_iter``);
+    ``span(name)`` opens a nested span inside the current stage. ``on_stage_end(name, seconds)`` is called as each stage
+    completes, e.g. to feed a metrics histogram.
+    """
+
+    def __init__(self, job_id, on_stage_end=None):
+        self.job_id = job_id
+        self.on_stage_end = on_stage_end
+        self.thread_id = threading.get_ident() % 2 ** 31
+        self.root = Span('job', job_id=job_id)
+        self.stage_span = None
+        self._current = None
+
+    @property
+    def current(self):
+        return self._current or self.stage_span or self.root
+
+    def stage(self, name, **args):
+        """End the current stage and start the next one"""
+        self.end_stage()
+        self.stage_span = Span(name, self.root, **args)
+        self.root.children.append(self.stage_span)
+        return self.stage_span
+
+    def end_stage(self, notify=True):
+        span = self.stage_span
+        if span is None:
+            return
+        self.stage_span = self._current = None
+        span.finish()
+        if notify and self.on_stage_end:
+            self.on_stage_end(span.name, span.duration)
+
+    def add(self, **counts):
+        """Add counts (bytes, images, ...) to the current span"""
+        self.current.add(**counts)
+
+    def span(self, name, **args):
+        """Context manager for a nested span inside the current stage"""
+        return _SpanContext(self, name, args)
+
+    def timed_iter(self, name, iterable, stage=False, **args):
+        """Yield from ``iterable``, recording the time spent waiting on it
+
+        Streaming stages interleave producing and consuming, so the
+        producer's share is recorded as one span (marked ``aggregated``)
+        whose wall and CPU times are the totals spent blocked on ``next``,
+        placed where the first item was requested. It is a child of the
+        current span, or with ``stage`` set a stage of its own that overlaps
+        the stage consuming it and is reported to ``on_stage_end`` once the
+        iterable is exhausted.
+        """
+        parent = self.root if stage else self.current
+        span = Span(name, parent, aggregated=True, items=0, **args)
+        span.duration = span.thread_cpu = span.process_cpu = 0.0
+        first = True
+        exhausted = False
+        iterator = iter(iterable)
+        try:
+            while True:
+                if first:
+                    span.start = time.time()
+                    span.rss_start_mb = span.rss_high_mb = current_rss_mb()
+                    first = False
+                started = time.perf_counter()
+                thread_started = time.thread_time()
+                process_started = time.process_time()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    exhausted = True
+                    break
+                finally:
+                    span.duration += time.perf_counter() - started
+                    span.thread_cpu += time.thread_time() - thread_started
+                    span.process_cpu += time.process_time() - process_started
+                span.args['items'] += 1
+                span.sample_rss()
+                yield item
+        finally:
+            span.end = span.start + span.duration
+            span.rss_mb = current_rss_mb()
+            if span.rss_mb is not None and span.rss_mb > (span.rss_high_mb or 0):
+                span.rss_high_mb = span.rss_mb
+            parent.children.append(span)
+            if stage and exhausted and self.on_stage_end:
+                self.on_stage_end(name, span.duration)
+
+    def finish(self, status):
+        """End the job; an unfinished stage of a failed job is not reported"""
+        self.end_stage(notify=status == 'completed')
+        self.root.args['status'] = status
+        self.root.finish()
+        self.root.args['process_peak_rss_mb'] = process_peak_rss_mb()
+
+    def to_chrome(self):
+        """The trace as a Chrome trace-event JSON object"""
+        pid = os.getpid()
+        tid = self.thread_id
+        events = [
+            {'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+             'args': {'name': f'job {self.job_id}'}},
+        ]
+
+        def visit(span, depth):
+            # Open spans (e.g. of a running job) are shown up to now
+            end = span.end if span.end is not None else time.time()
+            args = dict(span.args)
+            if span.thread_cpu is not None:
+                args['thread_cpu_ms'] = round(span.thread_cpu * 1000, 3)
+                args['process_cpu_ms'] = round(span.process_cpu * 1000, 3)
+            if span.rss_mb is not None:
+                args['rss_mb'] = round(span.rss_mb, 1)
+                args['rss_high_mb'] = round(span.rss_high_mb, 1)
+                if span.rss_start_mb is not None:
+                    args['rss_delta_mb'] = round(span.rss_mb - span.rss_start_mb, 1)
+            events.append({
+                'name': span.name,
+                'cat': 'job' if depth == 0 else 'stage' if depth == 1 else 'span',
+                'ph': 'X',
+                'ts': round(span.start * 1e6),
+                'dur': round((end - span.start) * 1e6),
+                'pid': pid,
+                'tid': tid,
+                'args': args
+            })
+            for child in span.children:
+                visit(child, depth + 1)
+
+        visit(self.root, 0)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+class _SpanContext:
+    def __init__(self, trace, name, args):
+        self.trace = trace
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        parent = self.trace.current
+        self.span = Span(self.name, parent, **self.args)
+        parent.children.append(self.span)
+        self.previous, self.trace._current = self.trace._current, self.span
+        return self.span
+
+    def __exit__(self, *exc_info):
+        self.span.finish()
+        self.trace._current = self.previous
+        return False
@@ -0,0 +1,130 @@
+"""
+Standalone reconstruction worker
+
+For production, set ``run_jobs_in_process`` to false and ``message_queue``
+to a Redis URL in config.json, then run:
+
+    python app.py           # one or more web processes (PORT=5001 python app.py, ...)
+    python worker.py        # one or more worker processes, on any node
+
+Web processes only accept uploads and serve status; they put jobs in the
+shared job database and workers claim them from there. Progress events
+from workers reach browsers through the Socket.IO message queue, whichever
+web process they are connected to. All processes must share the job
+database and the upload/output folders, and a load balancer in front of
+the web processes must use sticky sessions for Socket.IO.
+
+Set ``worker_metrics_port`` to have each worker serve its own /metrics
+(pipeline stage timings are recorded where the jobs run).
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+
+import app as server
+from metrics import serve
+
+
+class Worker:
+    """Claim queued jobs from the job store and run them on local threads"""
+
+    def __init__(self, num_threads, lease_seconds, poll_interval):
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self.num_threads = max(1, int(num_threads))
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def run(self):
+        print(f"🛠️ Worker {self.worker_id} started with {self.num_threads} thread(s)")
+        threads = [
+            threading.Thread(target=self._heartbeat_loop, daemon=True),
+            threading.Thread(target=self._cancel_loop, daemon=True)
+        ]
+        threads += [
+            threading.Thread(target=self._job_loop, name=f'job-worker-{i}', daemon=True)
+            for i in range(self.num_threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _job_loop(self):
+        job_store = server.job_store
+        while True:
+            try:
+                claimed = job_store.claim_next(self.worker_id, self.lease_seconds)
+            except Exception as e:
+                print(f"Error claiming job: {e}")
+                claimed = None
+            if claimed is None:
+                time.sleep(self.poll_interval)
+                continue
+
+            job, task = claimed
+            job_id = job['job_id']
+            with self._lock:
+                self._running.add(job_id)
+            server.scheduler.notify_queue_change()
+            print(f"▶️ Worker {self.worker_id} running job {job_id}")
+            try:
+                server.process_dataset_to_ply(*task)
+            except Exception as e:
+                print(f"Unhandled error in job {job_id}: {e}")
+            finally:
+                with self._lock:
+                    self._running.discard(job_id)
+
+    def _heartbeat_loop(self):
+        # Renew leases well before they expire and recover jobs of dead workers
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            with self._lock:
+                running = list(self._running)
+            try:
+                server.job_store.flush()
+                server.job_store.renew_leases(running, self.worker_id, self.lease_seconds)
+                if server.job_store.requeue_expired():
+                    server.scheduler.notify_queue_change()
+            except Exception as e:
+                print(f"Error renewing job leases: {e}")
+
+    def _cancel_loop(self):
+        # Cancel and preempt requests are written to the job store by the
+        # web processes; pass them on to the jobs running here
+        while True:
+            time.sleep(self.poll_interval)
+            running = server.cancellations.running()
+            try:
+                requests = server.job_store.cancel_requests(running)
+            except Exception as e:
+                print(f"Error polling cancel requests: {e}")
+                continue
+            for job_id, reason in requests.items():
+                server.cancellations.cancel(job_id, reason)
+
+
+if __name__ == '__main__':
+    if server.app.config['RUN_JOBS_IN_PROCESS']:
+        raise SystemExit(
+            'Set "run_jobs_in_process": false in config.json so web processes '
+            'leave jobs to the workers'
+        )
+    if not server.app.config['SOCKETIO_MESSAGE_QUEUE']:
+        print("⚠️ No message_queue configured; progress events from this worker "
+              "will not reach browsers (status polling still works)")
+
+    if server.app.config['WORKER_METRICS_PORT']:
+        serve(server.metrics, int(server.app.config['WORKER_METRICS_PORT']))
+        print(f"📈 Serving metrics on port {server.app.config['WORKER_METRICS_PORT']}")
+
+    Worker(
+        num_threads=server.app.config['MAX_WORKERS'],
+        lease_seconds=server.app.config['WORKER_LEASE_SECONDS'],
+        poll_interval=server.app.config['WORKER_POLL_INTERVAL']
+    ).run()